@@ -0,0 +1,181 @@
+"""
+accuracy_harness.py
+-------------------
+Field-level accuracy regression between two model configurations.
+
+Runs the full KTP / SIM pipelines over a labelled image set twice (baseline
+FP32 models, candidate INT8 recognition by default) and reports per-field
+exact-match rates and their delta.  This decides whether a faster model can
+be adopted for a field without losing accuracy.
+
+Labels are a JSON object of filename → expected ``data`` (the response's
+``data`` block; fields left ``null`` are not scored).  ``--write-labels``
+bootstraps that file from the baseline's output for hand correction.
+
+Scored fields: ``nomor`` (NIK / SIM number), ``nama``, ``tgl_lahir`` and the
+``alamat`` parts.  Values are compared after trimming, upper-casing and
+collapsing whitespace.
+
+Usage
+-----
+    python accuracy_harness.py uploads labels.json --candidate int8 --backend onnx
+    python accuracy_harness.py uploads labels.json --candidate int8 \\
+        --int8-rec-model-dir models/latin_PP-OCRv5_mobile_rec_int8 --max-drop 0.01
+    python accuracy_harness.py uploads labels.json --write-labels
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+from typing import Any, Dict, List, Optional, Tuple
+
+FIELDS = (
+    "nomor", "nama", "tgl_lahir",
+    "alamat.name", "alamat.rt_rw", "alamat.kel_desa",
+    "alamat.kecamatan", "alamat.kabupaten", "alamat.provinsi",
+)
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png"}
+
+
+def _field(data: Optional[dict], path: str) -> Any:
+    for part in path.split("."):
+        if not isinstance(data, dict):
+            return None
+        data = data.get(part)
+    return data
+
+
+def _norm(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return " ".join(str(value).upper().split())
+
+
+def run_config(
+    images: List[str], precision: str, options: Dict[str, Any]
+) -> Tuple[Dict[str, Optional[dict]], List[float]]:
+    """``(filename → data or None, per-image seconds)`` for one configuration."""
+    import cv2
+    from document_processor import DocumentProcessor
+    from request_context import RequestContext
+
+    processor = DocumentProcessor(precision=precision, **options)
+    outputs, seconds = {}, []
+    for path in images:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        start  = time.perf_counter()
+        result = processor.process_array(image, use_cache=False, ctx=RequestContext())
+        seconds.append(time.perf_counter() - start)
+        outputs[os.path.basename(path)] = result.get("data") if result.get("status") == 200 else None
+    return outputs, seconds
+
+
+def score(
+    labels: Dict[str, dict], outputs: Dict[str, Optional[dict]]
+) -> Dict[str, Dict[str, bool]]:
+    """``field → {filename: exact match}`` over the labelled (non-null) fields."""
+    table: Dict[str, Dict[str, bool]] = {field: {} for field in FIELDS}
+    for name, expected in labels.items():
+        if name not in outputs:
+            continue
+        for field in FIELDS:
+            want = _norm(_field(expected, field))
+            if want is None:
+                continue
+            table[field][name] = _norm(_field(outputs[name], field)) == want
+    return table
+
+
+def _rate(matches: Dict[str, bool]) -> Optional[float]:
+    return sum(matches.values()) / len(matches) if matches else None
+
+
+def report(
+    base: Dict[str, Dict[str, bool]],
+    cand: Dict[str, Dict[str, bool]],
+    names: Tuple[str, str],
+    timing: Tuple[List[float], List[float]],
+) -> Dict[str, float]:
+    deltas = {}
+    print(f"\n{'field':<18}{'n':>5}{names[0]:>10}{names[1]:>10}{'delta':>9}")
+    for field in FIELDS:
+        b, c = _rate(base[field]), _rate(cand[field])
+        if b is None:
+            print(f"{field:<18}{0:>5}{'—':>10}{'—':>10}{'':>9}")
+            continue
+        deltas[field] = c - b
+        print(f"{field:<18}{len(base[field]):>5}{b:>10.3f}{c:>10.3f}{c - b:>+9.3f}")
+
+    for (label, seconds) in zip(names, timing):
+        if seconds:
+            print(f"{label}: median {statistics.median(seconds) * 1000:.1f} ms / image")
+
+    regressions = [
+        (field, name) for field in FIELDS
+        for name, ok in base[field].items() if ok and not cand[field].get(name, False)
+    ]
+    if regressions:
+        print(f"\nRegressions ({names[0]} right, {names[1]} wrong):")
+        for field, name in regressions:
+            print(f"  {name}: {field}")
+    return deltas
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Field accuracy: baseline vs candidate models.")
+    parser.add_argument("images", help="directory of labelled images")
+    parser.add_argument("labels", help="JSON of filename -> expected data")
+    parser.add_argument("--baseline", default="fp32", choices=["fp32", "int8"])
+    parser.add_argument("--candidate", default="int8", choices=["fp32", "int8"])
+    parser.add_argument("--backend", default=os.environ.get("OCR_BACKEND", "paddle"))
+    parser.add_argument("--onnx-model-dir", default=os.environ.get("OCR_ONNX_MODEL_DIR", "models/onnx"))
+    parser.add_argument("--int8-rec-model-dir", default=os.environ.get("OCR_INT8_REC_MODEL_DIR"))
+    parser.add_argument("--max-drop", type=float, default=None,
+                        help="exit 1 if any field's exact-match rate drops by more than this")
+    parser.add_argument("--write-labels", action="store_true",
+                        help="write the baseline's output as a labels file and exit")
+    args = parser.parse_args(argv)
+
+    images = sorted(
+        os.path.join(args.images, name) for name in os.listdir(args.images)
+        if os.path.splitext(name)[1].lower() in IMAGE_EXTS
+    )
+    if not images:
+        print(f"No images found in '{args.images}'.")
+        return 1
+
+    options = dict(
+        ocr_backend=args.backend,
+        onnx_model_dir=args.onnx_model_dir,
+        int8_rec_model_dir=args.int8_rec_model_dir,
+    )
+
+    base_out, base_s = run_config(images, args.baseline, options)
+    if args.write_labels:
+        with open(args.labels, "w", encoding="utf-8") as f:
+            json.dump({k: v for k, v in base_out.items() if v}, f, ensure_ascii=False, indent=2)
+        print(f"Wrote {sum(1 for v in base_out.values() if v)} label(s) to {args.labels}")
+        return 0
+
+    with open(args.labels, encoding="utf-8") as f:
+        labels = json.load(f)
+    cand_out, cand_s = run_config(images, args.candidate, options)
+
+    deltas = report(
+        score(labels, base_out), score(labels, cand_out),
+        (args.baseline, args.candidate), (base_s, cand_s),
+    )
+    if args.max_drop is not None and any(d < -args.max_drop for d in deltas.values()):
+        print(f"\nField accuracy dropped by more than {args.max_drop}.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
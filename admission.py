@@ -0,0 +1,129 @@
+"""
+admission.py
+------------
+Queue-depth based admission control for the synchronous OCR endpoints.
+
+Every admitted document holds one unit until it finishes.  The expected
+wait for a new arrival is the work already ahead of it divided by the
+number of documents the service processes in parallel, multiplied by an
+exponentially weighted moving average of the recent per-document service
+time.  When that estimate exceeds the wait budget the request is rejected
+immediately, with a ``Retry-After`` hint of how long the backlog needs to
+drain back under the budget.  Overload therefore turns into fast 429s
+instead of connections that sit in a queue until they time out.
+
+Usage
+-----
+    admission = AdmissionController(concurrency=4, max_wait=5.0)
+    ticket, retry_after = admission.try_acquire(units=1)
+    if ticket is None:
+        ...                                  # 429, Retry-After: retry_after
+    try:
+        ...
+    finally:
+        ticket.release(service_seconds)
+"""
+
+import math
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+
+class Ticket:
+    """Units held by one admitted request; release exactly once."""
+
+    def __init__(self, controller: "AdmissionController", units: int):
+        self._controller = controller
+        self.units       = units
+        self._released   = False
+
+    def release(self, service_seconds: Optional[float] = None, documents: Optional[int] = None) -> None:
+        """
+        Return the units.  ``service_seconds`` is the processing time of the
+        whole request and feeds the service-time estimate; pass ``None`` when
+        the request did no representative work (e.g. it failed validation or
+        was answered from the cache).  ``documents`` is how many of the units
+        that time was spent on (default: all of them).
+        """
+        if self._released:
+            return
+        self._released = True
+        self._controller._release(self.units, service_seconds,
+                                  self.units if documents is None else documents)
+
+
+class AdmissionController:
+    """
+    Thread-safe admission gate.
+
+    ``concurrency`` is how many documents execute at once (pre-fork workers,
+    or the request and job threads in threaded mode).  Service-time samples
+    must be measured under that same concurrency, so queueing is counted once.
+    """
+
+    def __init__(
+        self,
+        concurrency: int,
+        max_wait: float,
+        initial_service_time: float = 2.0,
+        alpha: float = 0.2,
+    ):
+        self.concurrency  = max(1, concurrency)
+        self.max_wait     = max_wait
+        self.alpha        = alpha
+        self.service_time = initial_service_time      # EWMA, seconds per document
+
+        self._in_flight = 0
+        self._lock      = threading.Lock()
+        self._counts    = {"admitted": 0, "rejected": 0}
+
+    # ------------------------------------------------------------------
+    def try_acquire(self, units: int = 1, enforce: bool = True) -> Tuple[Optional[Ticket], int]:
+        """
+        Admit ``units`` documents or refuse them.
+
+        Returns ``(ticket, 0)`` on admission and ``(None, retry_after)``
+        otherwise.  With ``enforce=False`` the work is always admitted but
+        still counted, for callers with their own bound (the job queue).
+        """
+        with self._lock:
+            wait = self._estimated_wait(units)
+            if enforce and wait > self.max_wait and self._in_flight > 0:
+                self._counts["rejected"] += 1
+                return None, max(1, math.ceil(wait - self.max_wait))
+            self._in_flight += units
+            self._counts["admitted"] += 1
+        return Ticket(self, units), 0
+
+    def observe(self, seconds_per_document: float) -> None:
+        """Fold one per-document service-time sample into the estimate."""
+        with self._lock:
+            self._observe(seconds_per_document)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight":       self._in_flight,
+                "concurrency":     self.concurrency,
+                "service_time":    round(self.service_time, 3),
+                "estimated_wait":  round(self._estimated_wait(1), 3),
+                "max_wait":        self.max_wait,
+                **self._counts,
+            }
+
+    # ------------------------------------------------------------------
+    def _estimated_wait(self, units: int) -> float:
+        """Seconds until the last of ``units`` new documents would start."""
+        ahead = self._in_flight + units - self.concurrency
+        if ahead <= 0:
+            return 0.0
+        return math.ceil(ahead / self.concurrency) * self.service_time
+
+    def _observe(self, sample: float) -> None:
+        self.service_time += self.alpha * (sample - self.service_time)
+
+    def _release(self, units: int, service_seconds: Optional[float], documents: int) -> None:
+        with self._lock:
+            self._in_flight -= units
+            if service_seconds is not None and documents > 0:
+                self._observe(service_seconds / documents)
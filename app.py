@@ -1,18 +1,186 @@
+import io
 import os
 import json
-import shutil
 from datetime import datetime
-from flask import Flask, request, jsonify, Response
+from flask import Flask, Request, request, jsonify, Response
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 from flask_cors import CORS
 from document_processor import DocumentProcessor
+from job_queue import JobQueue
+from prefork_pool import PreforkPool
+from archive_writer import ArchiveWriter, build_storage_backend
+from result_cache import ResultCache, content_digest
+from admission import AdmissionController
+from doc_classifier import DocumentClassifier
+from autotune import load_profile
+from ingest import Ingestor, ImageTooLarge
+from request_context import RequestContext
+import metrics
+import atexit
+import queue
+import threading
+import time
 import uuid
 
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
 LOGGING_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ocr_logs')
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 
+# Host profile written by autotune.py; it supplies defaults for the worker
+# count and engine settings below, explicit environment variables still win
+TUNING_PROFILE = os.environ.get('OCR_TUNING_PROFILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'autotune_profile.json'))
+TUNED          = load_profile(TUNING_PROFILE) or {}
+
+# Pre-fork mode: N worker processes sharing the parent's models (0 = threaded).
+# Waitress gets spare threads beyond the workers so overload can be rejected.
+PREFORK_WORKERS = int(os.environ.get('OCR_PREFORK_WORKERS', str(TUNED.get('prefork_workers', 0))))
+HTTP_THREADS    = int(os.environ.get('OCR_HTTP_THREADS', str(max(4, PREFORK_WORKERS + 4))))
+
+# Pixel-only document classifier (skipped when the model file does not exist)
+CLASSIFIER_MODEL          = os.environ.get('OCR_DOC_CLASSIFIER_MODEL', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'doc_classifier.npz'))
+CLASSIFIER_MIN_CONFIDENCE = float(os.environ.get('OCR_DOC_CLASSIFIER_MIN_CONFIDENCE', '0.9'))
+
+# Speculative smart SIM path overlapping the std pass: off | preprocess | ocr
+SIM_SPECULATION = os.environ.get('OCR_SIM_SPECULATION', 'off').strip().lower()
+if SIM_SPECULATION not in ('preprocess', 'ocr'):
+    SIM_SPECULATION = None
+
+# Template KTP mode: recognise fixed field crops instead of full-card detection
+KTP_TEMPLATE           = os.environ.get('OCR_KTP_TEMPLATE', '0') == '1'
+KTP_TEMPLATE_REC_MODEL = os.environ.get('OCR_KTP_TEMPLATE_REC_MODEL') or None
+
+# Tiered OCR engines: mobile models first, the default engine only when the
+# fast answer's OCR confidence or field completeness is below threshold
+OCR_TIERS                 = os.environ.get('OCR_TIERS', '0') == '1'
+TIER_FAST_DET_MODEL       = os.environ.get('OCR_TIER_FAST_DET_MODEL') or None
+TIER_FAST_REC_MODEL       = os.environ.get('OCR_TIER_FAST_REC_MODEL') or None
+TIER_MIN_CONF             = float(os.environ.get('OCR_TIER_MIN_CONF', '0.85'))
+TIER_MIN_COMPLETENESS     = float(os.environ.get('OCR_TIER_MIN_COMPLETENESS', '0.70'))
+
+# Text-line orientation classifier: "auto" skips it on images whose rotation is
+# already known (face found, or the client sent X-Image-Upright / upright=1)
+# and re-runs with it below OCR_TEXTLINE_MIN_CONF; "always" keeps it on
+TEXTLINE_ORIENTATION = os.environ.get('OCR_TEXTLINE_ORIENTATION', 'auto').strip().lower()
+if TEXTLINE_ORIENTATION not in ('auto', 'always'):
+    TEXTLINE_ORIENTATION = 'auto'
+TEXTLINE_MIN_CONF    = float(os.environ.get('OCR_TEXTLINE_MIN_CONF', '0.80'))
+
+# Card orientation search: threads for the concurrent rotations (1 = serial;
+# use 1 with many pre-fork workers) and the coarse pyramid level in pixels
+ORIENTATION_THREADS     = int(os.environ.get('OCR_ORIENTATION_THREADS', '3'))
+ORIENTATION_COARSE_SIDE = int(os.environ.get('OCR_ORIENTATION_COARSE_SIDE', '320'))
+
+# SIM smart-path denoising: nlmeans (colour NL-means, the original), l_nlmeans,
+# guided, bilateral, none, or auto (per image from the noise estimate)
+ENHANCE_MODE    = os.environ.get('OCR_ENHANCE_MODE', 'nlmeans').strip().lower()
+if ENHANCE_MODE not in ('nlmeans', 'l_nlmeans', 'guided', 'bilateral', 'none', 'auto'):
+    ENHANCE_MODE = 'nlmeans'
+ENHANCE_THREADS = int(os.environ.get('OCR_ENHANCE_THREADS', '4'))
+
+# OCR backend: "paddle", "onnx" (ONNX exports on onnxruntime CPU), "record"
+# (paddle + persist raw OCR output per image digest) or "replay" (serve
+# recordings, no models loaded)
+OCR_BACKEND    = os.environ.get('OCR_BACKEND', 'paddle').strip().lower()
+RECORDING_DIR  = os.environ.get('OCR_RECORDING_DIR', 'ocr_recordings')
+ONNX_MODEL_DIR = os.environ.get('OCR_ONNX_MODEL_DIR', 'models/onnx')
+ONNX_THREADS   = int(os.environ.get('OCR_ONNX_THREADS', '0'))
+
+# Recognition model precision: "fp32" or "int8" (quantised recognition model;
+# ONNX: inference_int8.onnx, Paddle: the model in OCR_INT8_REC_MODEL_DIR)
+OCR_PRECISION      = os.environ.get('OCR_PRECISION', 'fp32').strip().lower()
+INT8_REC_MODEL_DIR = os.environ.get('OCR_INT8_REC_MODEL_DIR') or None
+
+# Cross-request micro-batching of OCR calls (threaded mode; 1 = off).  Pre-fork
+# workers handle one request at a time, so there is nothing to batch there.
+INFER_MAX_BATCH  = int(os.environ.get('OCR_INFER_MAX_BATCH', '1')) if PREFORK_WORKERS == 0 else 1
+INFER_LINGER_MS  = float(os.environ.get('OCR_INFER_LINGER_MS', '5'))
+
+# Per-request time budget when the client sends no X-Deadline-Ms / deadline_ms (0 = none)
+DEFAULT_DEADLINE_MS = int(os.environ.get('OCR_DEFAULT_DEADLINE_MS', '0'))
+
+# Result cache for repeated submissions (0 entries = disabled)
+CACHE_MAX_ENTRIES  = int(os.environ.get('OCR_RESULT_CACHE_SIZE', '512'))
+CACHE_TTL          = float(os.environ.get('OCR_RESULT_CACHE_TTL', '300'))
+
+# Async job mode: number of DocumentProcessor workers and pending-job bound
+JOB_WORKERS   = int(os.environ.get('OCR_JOB_WORKERS', str(max(1, PREFORK_WORKERS))))
+JOB_QUEUE_MAX = int(os.environ.get('OCR_JOB_QUEUE_MAX', '32'))
+
+# Admission control: reject with 429 once the estimated queue wait exceeds this.
+# Concurrency is how many documents actually execute at once: the pre-fork
+# workers, or in threaded mode every waitress thread plus the job workers
+# (their per-request times are measured while they share the engine).
+MAX_QUEUE_WAIT_S      = float(os.environ.get('OCR_MAX_QUEUE_WAIT_S', '5'))
+ADMISSION_CONCURRENCY = int(os.environ.get(
+    'OCR_ADMISSION_CONCURRENCY',
+    str(PREFORK_WORKERS if PREFORK_WORKERS > 0 else HTTP_THREADS + JOB_WORKERS),
+))
+
+# Batch mode: images accepted per /ocr/batch call, total upload bytes per
+# call (every part is held in memory) and images per OCR batch
+BATCH_MAX_IMAGES = int(os.environ.get('OCR_BATCH_MAX_IMAGES', '200'))
+BATCH_MAX_BYTES  = int(os.environ.get('OCR_BATCH_MAX_BYTES', str(256 * 1024 * 1024)))
+BATCH_CHUNK_SIZE = int(os.environ.get('OCR_BATCH_CHUNK_SIZE', '8'))
+
+# Largest accepted image upload; multipart overhead gets a small allowance
+MAX_UPLOAD_BYTES = int(os.environ.get('OCR_MAX_UPLOAD_BYTES', str(20 * 1024 * 1024)))
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+# Ingestion: JPEGs are decoded at 1/2, 1/4 or 1/8 scale while the long side
+# stays >= OCR_DECODE_TARGET_SIDE (0 = always full size); uploads above
+# OCR_MAX_IMAGE_PIXELS (from the header, before decoding) get a 413
+DECODE_TARGET_SIDE = int(os.environ.get('OCR_DECODE_TARGET_SIDE', '2000'))
+MAX_IMAGE_PIXELS   = int(os.environ.get('OCR_MAX_IMAGE_PIXELS', str(50_000_000)))
+UPLOAD_CHUNK_BYTES  = 64 * 1024
+
+# Archival of uploads + predictions (background writer, pluggable storage)
+ARCHIVE_BACKEND     = os.environ.get('OCR_ARCHIVE_BACKEND', 'local')
+ARCHIVE_QUEUE_MAX   = int(os.environ.get('OCR_ARCHIVE_QUEUE_MAX', '256'))
+ARCHIVE_BATCH_SIZE  = int(os.environ.get('OCR_ARCHIVE_BATCH_SIZE', '16'))
+ARCHIVE_PUT_TIMEOUT = float(os.environ.get('OCR_ARCHIVE_PUT_TIMEOUT', '0.05'))
+ARCHIVE_FSYNC       = os.environ.get('OCR_ARCHIVE_FSYNC', '1') == '1'
+
+# Startup warm-up: /readyz only reports ready once these have been processed
+WARMUP_ENABLED = os.environ.get('OCR_WARMUP', '1') == '1'
+WARMUP_DIR     = os.environ.get('OCR_WARMUP_DIR', UPLOAD_FOLDER)
+WARMUP_IMAGES  = [
+    name.strip()
+    for name in os.environ.get('OCR_WARMUP_IMAGES', 'ktp_test_image.jpg,sim_test_image.jpg').split(',')
+    if name.strip()
+]
+
+
+class UploadPartTooLarge(RequestEntityTooLarge):
+    """A single multipart file grew past MAX_UPLOAD_BYTES while being parsed."""
+
+
+class CappedBytesIO(io.BytesIO):
+    """In-memory file part that refuses to grow past MAX_UPLOAD_BYTES."""
+
+    def write(self, data):
+        if self.tell() + len(data) > MAX_UPLOAD_BYTES:
+            raise UploadPartTooLarge()
+        return super().write(data)
+
+
+class InMemoryRequest(Request):
+    """
+    Keep multipart uploads in memory instead of spooling them to a temp file.
+    Each part is capped at MAX_UPLOAD_BYTES as it is parsed, so an oversized
+    file is rejected before it is buffered in full.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return CappedBytesIO()
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
 app = Flask(__name__)
+app.request_class = InMemoryRequest
 
 allowed_origins = [
     "http://localhost:3000",
@@ -21,70 +189,566 @@ allowed_origins = [
 
 CORS(app, origins=allowed_origins)
 
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['JSON_SORT_KEYS'] = False
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + FORM_OVERHEAD_BYTES
+
+# The cache lives in this (parent) process, in front of dispatch: exact
+# duplicates are answered from the upload digest before any decode.
+result_cache = None
+if CACHE_MAX_ENTRIES > 0:
+    result_cache = ResultCache(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+
+classifier = DocumentClassifier.load_if_exists(CLASSIFIER_MODEL)
+if classifier is not None:
+    print(f"Document classifier loaded from {CLASSIFIER_MODEL}")
+
+processor_options = dict(
+    # Pre-fork workers never see a request the parent could have answered
+    result_cache=result_cache if PREFORK_WORKERS <= 0 else None,
+    classifier=classifier,
+    classifier_min_confidence=CLASSIFIER_MIN_CONFIDENCE,
+    sim_speculation=SIM_SPECULATION,
+    ktp_template=KTP_TEMPLATE,
+    template_rec_model=KTP_TEMPLATE_REC_MODEL,
+    inference_max_batch=INFER_MAX_BATCH,
+    inference_linger_ms=INFER_LINGER_MS,
+    ocr_tiers=OCR_TIERS,
+    fast_det_model=TIER_FAST_DET_MODEL,
+    fast_rec_model=TIER_FAST_REC_MODEL,
+    tier_min_conf=TIER_MIN_CONF,
+    tier_min_completeness=TIER_MIN_COMPLETENESS,
+    textline_orientation=TEXTLINE_ORIENTATION,
+    textline_min_conf=TEXTLINE_MIN_CONF,
+    ocr_backend=OCR_BACKEND,
+    recording_dir=RECORDING_DIR,
+    onnx_model_dir=ONNX_MODEL_DIR,
+    onnx_threads=ONNX_THREADS,
+    precision=OCR_PRECISION,
+    int8_rec_model_dir=INT8_REC_MODEL_DIR,
+    tuning_profile=TUNING_PROFILE,
+    orientation_threads=ORIENTATION_THREADS,
+    orientation_coarse_side=ORIENTATION_COARSE_SIDE,
+    enhance_mode=ENHANCE_MODE,
+    enhance_threads=ENHANCE_THREADS,
+    decode_target_side=DECODE_TARGET_SIDE,
+    max_image_pixels=MAX_IMAGE_PIXELS,
+)
+
+# Uploads are decoded here (before dispatch) so oversized ones never reach a worker
+ingestor = Ingestor(target_side=DECODE_TARGET_SIDE, max_pixels=MAX_IMAGE_PIXELS)
 
 print("Loading Document Processor...")
-processor = DocumentProcessor()
+processor = DocumentProcessor(**processor_options)
+
+# Fork before any other thread exists: the workers inherit the loaded models
+# copy-on-write and `processor` becomes a dispatcher with the same API.
+worker_pool = None
+if PREFORK_WORKERS > 0:
+    worker_pool = PreforkPool(processor, PREFORK_WORKERS)
+    atexit.register(worker_pool.close)
+    processor = worker_pool
 print("Processor loaded. Flask server is ready.")
 
+# In threaded mode the first job worker reuses the synchronous processor and
+# every extra worker gets its own DocumentProcessor so predictors are never
+# shared.  In pre-fork mode the job workers simply feed the process pool.
+if worker_pool is not None:
+    job_processors = [worker_pool] * JOB_WORKERS
+else:
+    job_processors = [processor] + [
+        DocumentProcessor(**processor_options) for _ in range(max(0, JOB_WORKERS - 1))
+    ]
+job_queue = JobQueue(job_processors, max_queue=JOB_QUEUE_MAX)
+
+admission = AdmissionController(ADMISSION_CONCURRENCY, MAX_QUEUE_WAIT_S)
+
+archive_writer = ArchiveWriter(
+    build_storage_backend(
+        ARCHIVE_BACKEND,
+        LOGGING_FOLDER,
+        fsync=ARCHIVE_FSYNC,
+        bucket=os.environ.get('OCR_ARCHIVE_S3_BUCKET'),
+        prefix=os.environ.get('OCR_ARCHIVE_S3_PREFIX', 'ocr_logs'),
+        endpoint_url=os.environ.get('OCR_ARCHIVE_S3_ENDPOINT'),
+        region_name=os.environ.get('OCR_ARCHIVE_S3_REGION'),
+    ),
+    max_queue=ARCHIVE_QUEUE_MAX,
+    batch_size=ARCHIVE_BATCH_SIZE,
+    put_timeout=ARCHIVE_PUT_TIMEOUT,
+)
+atexit.register(archive_writer.close)
+
+warmup_state = {"ready": not WARMUP_ENABLED, "seconds": None, "images": [], "error": None}
+
+
+def run_warmup():
+    """Warm the OCR engine(s) in the background; /readyz flips when done."""
+    paths = [os.path.join(WARMUP_DIR, name) for name in WARMUP_IMAGES]
+    # Extra threaded job processors own separate engines and need warming too
+    targets = list({id(p): p for p in [processor] + job_processors}.values())
+    try:
+        start  = time.perf_counter()
+        report = targets[0].warm_up(paths)
+        for target in targets[1:]:
+            target.warm_up(paths)
+        report["seconds"] = round(time.perf_counter() - start, 3)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        warmup_state["error"] = f"{type(e).__name__}: {e}"
+        return
+    warmup_state.update(report)
+    warmup_state["ready"] = True
+    # Seed the admission estimate with warm per-document timings
+    for image in report["images"]:
+        admission.observe(image["seconds"])
+    print(f"Warm-up finished in {report['seconds']:.2f}s. Service is ready.")
+
+
+if WARMUP_ENABLED:
+    threading.Thread(target=run_warmup, name="ocr-warmup", daemon=True).start()
+
+
+# Gauges mirroring component state; evaluated only when /metrics is scraped
+metrics.REGISTRY.gauge_callback(
+    "ocr_jobs", "Async jobs by state.", ["state"],
+    lambda: {(k,): v for k, v in job_queue.stats().items() if k not in ("workers", "capacity")},
+)
+metrics.REGISTRY.gauge_callback(
+    "ocr_archive_writer", "Background archive writer counters.", ["field"],
+    lambda: {(k,): v for k, v in archive_writer.stats().items() if isinstance(v, (int, float))},
+)
+if worker_pool is not None:
+    metrics.REGISTRY.gauge_callback(
+        "ocr_prefork_workers", "Pre-fork worker pool state.", ["field"],
+        lambda: {(k,): v for k, v in worker_pool.stats().items()
+                 if k in ("workers", "busy", "idle", "utilisation", "retired")},
+    )
+if result_cache is not None:
+    metrics.REGISTRY.gauge_callback(
+        "ocr_result_cache", "Result cache counters.", ["field"],
+        lambda: {(k,): v for k, v in result_cache.stats().items()},
+    )
+metrics.REGISTRY.gauge_callback(
+    "ocr_admission", "Admission control state.", ["field"],
+    lambda: {(k,): v for k, v in admission.stats().items()},
+)
+if INFER_MAX_BATCH > 1:
+    metrics.REGISTRY.gauge_callback(
+        "ocr_inference_batches", "Micro-batched OCR calls by batch size (cumulative).", ["size"],
+        lambda: {(str(size),): n for size, n in processor.scheduler.stats()["batch_sizes"].items()},
+    )
+metrics.REGISTRY.gauge_callback(
+    "ocr_warmup_seconds", "Wall-clock time of the startup warm-up.", [],
+    lambda: {(): warmup_state["seconds"]} if warmup_state["seconds"] is not None else {},
+)
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-@app.route('/ocr/document', methods=['POST'])
-def process_document_image():
+
+def serialize_result(result):
+    return json.dumps(result, ensure_ascii=False, indent=4).encode('utf-8')
+
+
+def archive_result(data, unique_filename, request_id, result_bytes):
+    """Hand the image copy and the serialised prediction to the background writer."""
+    current_month = datetime.now().strftime('%Y-%m')
+    archive_writer.submit([
+        (f"{current_month}/{unique_filename}", data),
+        (f"{current_month}/{request_id}_pred.json", result_bytes),
+    ])
+
+
+def read_upload(file):
+    """
+    Read an uploaded file into memory in fixed-size chunks, aborting as soon
+    as it grows past MAX_UPLOAD_BYTES.  Returns (request_id, unique_filename, data).
+    """
+    chunks, total = [], 0
+    while True:
+        chunk = file.stream.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > MAX_UPLOAD_BYTES:
+            raise UploadTooLarge(file.filename)
+        chunks.append(chunk)
+    # Release the parsed part; only the joined copy is kept
+    file.stream.close()
+
+    _, file_extension = os.path.splitext(file.filename)
+    request_id = uuid.uuid4().hex
+    unique_filename = f"{request_id}{file_extension}"
+    return request_id, unique_filename, b"".join(chunks)
+
+
+def decode_image(data, ctx):
+    """
+    Decode encoded image bytes into an ``ingest.Ingested`` (None if
+    undecodable), at reduced scale when the pipeline does not need more.
+    Raises ImageTooLarge above MAX_IMAGE_PIXELS.
+    """
+    ingested = ingestor.decode(data)
+    if ingested is not None:
+        ctx.decode_scale = ingested.factor
+    return ingested
+
+
+def cached_result(digest, ctx):
+    """Exact-duplicate answer from the result cache, looked up before any decode."""
+    if result_cache is None:
+        return None
+    with ctx.stage("cache_lookup"):
+        result = result_cache.get_exact(digest)
+    ctx.cache = "exact" if result is not None else "miss"
+    return result
+
+
+def remember_result(digest, result):
+    """
+    Store a finished result under its upload digest.  Only needed in
+    pre-fork mode: in threaded mode the processor shares ``result_cache``
+    and stores results itself.
+    """
+    if worker_pool is None or result_cache is None:
+        return
+    if result.get("status") == 200 and not result.get("skipped_stages"):
+        result_cache.put(digest, result)
+
+
+def too_large_response():
+    return jsonify({"status": 413, "error": True, "message": f"Payload Too Large: Images must be at most {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"}), 413
+
+
+def batch_too_large_response():
+    return jsonify({"status": 413, "error": True, "message": f"Payload Too Large: A batch must be at most {BATCH_MAX_BYTES // (1024 * 1024)} MB in total"}), 413
+
+
+def too_many_pixels_response(e):
+    return jsonify({"status": 413, "error": True, "message": f"Payload Too Large: Images must be at most {e.max_pixels / 1e6:g} megapixels (got {e.width}x{e.height})"}), 413
+
+
+def undecodable_response():
+    return jsonify({"status": 400, "error": True, "message": "Bad Request: Image could not be decoded"}), 400
+
+
+def request_deadline(arrived):
+    """
+    Absolute ``time.monotonic()`` deadline from the ``X-Deadline-Ms`` header or
+    the ``deadline_ms`` form field (milliseconds from arrival), else the default.
+    Raises ValueError for malformed values.
+    """
+    raw = request.headers.get('X-Deadline-Ms') or request.form.get('deadline_ms')
+    budget_ms = int(raw) if raw else DEFAULT_DEADLINE_MS
+    if budget_ms < 0 or (raw and budget_ms == 0):
+        raise ValueError(raw)
+    return arrived + budget_ms / 1000.0 if budget_ms else None
+
+
+def request_upright():
+    """Client hint that the upload is already upright (``X-Image-Upright`` / ``upright``)."""
+    raw = request.headers.get('X-Image-Upright') or request.form.get('upright') or ''
+    return raw.strip().lower() in ('1', 'true', 'yes')
+
+
+def bad_deadline_response():
+    return jsonify({"status": 400, "error": True, "message": "Bad Request: deadline_ms / X-Deadline-Ms must be a positive number of milliseconds"}), 400
+
+
+def overloaded_response(retry_after):
+    response = jsonify({"status": 429, "error": True, "message": f"Too Many Requests: OCR backlog exceeds {MAX_QUEUE_WAIT_S:g}s, retry in {retry_after}s"})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+
+@app.errorhandler(413)
+def request_entity_too_large(e):
+    if request.endpoint == 'process_document_batch' and not isinstance(e, UploadPartTooLarge):
+        return batch_too_large_response()
+    return too_large_response()
+
+
+def validate_upload():
+    """Return (file, None) for a usable upload or (None, error_response)."""
     if 'image' not in request.files:
-        return jsonify({"status": 400, "error": True, "message": "Bad Request: 'image' part is missing in the form data"}), 400
+        return None, (jsonify({"status": 400, "error": True, "message": "Bad Request: 'image' part is missing in the form data"}), 400)
 
     file = request.files['image']
 
     if file.filename == '':
-        return jsonify({"status": 400, "error": True, "message": "Bad Request: No file selected"}), 400
+        return None, (jsonify({"status": 400, "error": True, "message": "Bad Request: No file selected"}), 400)
 
-    if file and allowed_file(file.filename):
-        _, file_extension = os.path.splitext(file.filename)
-        request_id = uuid.uuid4().hex
-        unique_filename = f"{request_id}{file_extension}"
-        image_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        
-        file.save(image_path)
+    if not allowed_file(file.filename):
+        return None, (jsonify({"status": 400, "error": True, "message": f"Bad Request: File type not allowed. Please use one of {list(ALLOWED_EXTENSIONS)}"}), 400)
 
+    return file, None
+
+@app.route('/ocr/document', methods=['POST'])
+def process_document_image():
+    # Decide before the body is parsed so rejections stay cheap
+    ticket, retry_after = admission.try_acquire()
+    if ticket is None:
+        return overloaded_response(retry_after)
+
+    ctx = RequestContext()
+    arrived = time.monotonic()
+    try:
+        return handle_document(ctx, arrived)
+    finally:
+        ticket.release(service_time(ctx))
+
+
+def service_time(ctx):
+    """
+    Pipeline time of one request for the admission estimate; None when the
+    answer came from the result cache, whose near-zero time is not
+    representative of the work a new document needs.
+    """
+    if ctx.cache == "exact":
+        return None
+    return ctx.timings.get("total")
+
+
+def handle_document(ctx, arrived):
+    file, error = validate_upload()
+    if error:
+        return error
+
+    try:
+        ctx.deadline = request_deadline(arrived)
+    except ValueError:
+        return bad_deadline_response()
+    ctx.upright = request_upright()
+
+    try:
+        request_id, unique_filename, data = read_upload(file)
+    except UploadTooLarge:
+        return too_large_response()
+
+    started = time.perf_counter()
+    ctx.request_id = request_id
+    digest = content_digest(data)
+    result = cached_result(digest, ctx)
+    if result is None:
         try:
-            result = processor.process_image(image_path)
-            
-            current_month = datetime.now().strftime('%Y-%m')
-            month_dir = os.path.join(LOGGING_FOLDER, current_month)
-            os.makedirs(month_dir, exist_ok=True)
-
-            final_image_path = os.path.join(month_dir, unique_filename)
-            shutil.copy(image_path, final_image_path)
-
-            json_filename = f"{request_id}_pred.json"
-            json_path = os.path.join(month_dir, json_filename)
-            
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(result, f, ensure_ascii=False, indent=4)
-            
-            status_code = result.get("status", 500)
-            
-            json_string = json.dumps(result, ensure_ascii=False, indent=4)
-            return Response(json_string, status=status_code, content_type='application/json; charset=utf-8')
-
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            return jsonify({"status": 500, "error": True, "message": f"An internal server error occurred: {e}"}), 500
-        
-        finally:
-            if os.path.exists(image_path):
-                os.remove(image_path)
+            with ctx.stage("decode"):
+                ingested = decode_image(data, ctx)
+        except ImageTooLarge as e:
+            return too_many_pixels_response(e)
+        if ingested is None:
+            return undecodable_response()
+
+    try:
+        if result is None:
+            result = processor.process_array(
+                ingested.image, content_hash=digest, ctx=ctx, encoded=ingested.encoded
+            )
+            remember_result(digest, result)
+        metrics.record_request(ctx, result, "document", time.perf_counter() - started)
+
+        # Serialise once: the same bytes are archived and sent to the client
+        result_bytes = serialize_result(result)
+        archive_result(data, unique_filename, request_id, result_bytes)
+
+        status_code = result.get("status", 500)
+
+        return Response(result_bytes, status=status_code, content_type='application/json; charset=utf-8')
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({"status": 500, "error": True, "message": f"An internal server error occurred: {e}"}), 500
+
+
+@app.route('/ocr/batch', methods=['POST'])
+def process_document_batch():
+    arrived = time.monotonic()
+    # A batch carries many images, so widen the body limit for this route
+    # only, up to the total batch cap (every part is held in memory)
+    request.max_content_length = min(
+        (MAX_UPLOAD_BYTES + FORM_OVERHEAD_BYTES) * BATCH_MAX_IMAGES,
+        BATCH_MAX_BYTES + FORM_OVERHEAD_BYTES,
+    )
+
+    files = request.files.getlist('images')
+    if not files:
+        return jsonify({"status": 400, "error": True, "message": "Bad Request: 'images' part is missing in the form data"}), 400
+
+    if len(files) > BATCH_MAX_IMAGES:
+        return jsonify({"status": 400, "error": True, "message": f"Bad Request: At most {BATCH_MAX_IMAGES} images per batch"}), 400
+
+    for file in files:
+        if file.filename == '' or not allowed_file(file.filename):
+            return jsonify({"status": 400, "error": True, "message": f"Bad Request: File type not allowed for '{file.filename}'. Please use one of {list(ALLOWED_EXTENSIONS)}"}), 400
+
+    try:
+        deadline = request_deadline(arrived)
+    except ValueError:
+        return bad_deadline_response()
+    upright = request_upright()
+
+    ticket, retry_after = admission.try_acquire(units=len(files))
+    if ticket is None:
+        return overloaded_response(retry_after)
+
+    service_seconds, documents = None, 0
+    try:
+        uploads = [read_upload(file) for file in files]
+    except UploadTooLarge:
+        ticket.release()
+        return too_large_response()
+
+    try:
+        # Encoded bytes are handed over as-is; the processor decodes one
+        # chunk at a time so a large batch never holds every frame at once.
+        started  = time.perf_counter()
+        contexts = [
+            RequestContext(request_id=request_id, deadline=deadline, upright=upright)
+            for request_id, _, _ in uploads
+        ]
+        digests  = [content_digest(data) for _, _, data in uploads]
+        results  = [cached_result(digest, ctx) for digest, ctx in zip(digests, contexts)]
+        misses   = [i for i, result in enumerate(results) if result is None]
+        if misses:
+            computed = processor.process_images(
+                [uploads[i][2] for i in misses], batch_size=BATCH_CHUNK_SIZE,
+                contexts=[contexts[i] for i in misses],
+            )
+            for i, result in zip(misses, computed):
+                results[i] = result
+                remember_result(digests[i], result)
+        service_seconds = time.perf_counter() - started
+        per_image = service_seconds / len(results)
+        # Only documents that ran the pipeline feed the admission estimate
+        documents = sum(ctx.cache != "exact" for ctx in contexts)
+        for ctx, result in zip(contexts, results):
+            metrics.record_request(ctx, result, "batch", per_image)
+
+        for (request_id, unique_filename, data), result in zip(uploads, results):
+            archive_result(data, unique_filename, request_id, serialize_result(result))
+
+        response = {
+            "status": 200,
+            "error": False,
+            "message": f"Batch of {len(results)} image(s) processed",
+            "data": [
+                {"filename": file.filename, **result}
+                for file, result in zip(files, results)
+            ],
+        }
+        json_string = json.dumps(response, ensure_ascii=False, indent=4)
+        return Response(json_string, status=200, content_type='application/json; charset=utf-8')
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({"status": 500, "error": True, "message": f"An internal server error occurred: {e}"}), 500
+
+    finally:
+        ticket.release(service_seconds if documents else None, documents)
+
+
+@app.route('/ocr/jobs', methods=['POST'])
+def submit_document_job():
+    file, error = validate_upload()
+    if error:
+        return error
+
+    try:
+        request_id, unique_filename, data = read_upload(file)
+    except UploadTooLarge:
+        return too_large_response()
+
+    ctx = RequestContext(request_id=request_id, upright=request_upright())
+    digest = content_digest(data)
+    try:
+        with ctx.stage("decode"):
+            ingested = decode_image(data, ctx)
+    except ImageTooLarge as e:
+        return too_many_pixels_response(e)
+    if ingested is None:
+        return undecodable_response()
+
+    # Jobs are bounded by the job queue, but they occupy the same engines, so
+    # they count towards the backlog seen by synchronous requests.
+    ticket, _ = admission.try_acquire(enforce=False)
+
+    def on_done(job):
+        ticket.release(service_time(ctx))
+        if job.error is not None:
+            ctx.error_class = ctx.error_class or "JobFailed"
+        metrics.record_request(ctx, job.result, "jobs", job.finished_at - job.started_at)
+        if job.result is not None:
+            remember_result(digest, job.result)
+            archive_result(data, unique_filename, request_id, serialize_result(job.result))
+
+    try:
+        job = job_queue.submit(ingested.image, on_done=on_done, content_hash=digest,
+                               ctx=ctx, encoded=ingested.encoded)
+    except queue.Full:
+        ticket.release()
+        return jsonify({"status": 503, "error": True, "message": "Service Unavailable: OCR job queue is full, please retry later"}), 503
+
+    return jsonify({"status": 202, "error": False, "message": "Job accepted", "data": job.to_dict()}), 202
+
+
+@app.route('/ocr/jobs/<job_id>', methods=['GET'])
+def get_document_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"status": 404, "error": True, "message": "Job not found"}), 404
+
+    json_string = json.dumps(
+        {"status": 200, "error": False, "message": f"Job {job.status}", "data": job.to_dict()},
+        ensure_ascii=False, indent=4,
+    )
+    return Response(json_string, status=200, content_type='application/json; charset=utf-8')
+
+
+@app.route('/ocr/workers', methods=['GET'])
+def get_worker_stats():
+    if worker_pool is not None:
+        data = worker_pool.stats()
     else:
-        return jsonify({"status": 400, "error": True, "message": f"Bad Request: File type not allowed. Please use one of {list(ALLOWED_EXTENSIONS)}"}), 400
+        data = {"mode": "threaded", "workers": 1, "http_threads": HTTP_THREADS}
+    if result_cache is not None:
+        data["cache"] = result_cache.stats()
+    if worker_pool is None and processor.scheduler is not None:
+        data["inference"] = processor.scheduler.stats()
+    data["jobs"]      = job_queue.stats()
+    data["admission"] = admission.stats()
+    data["archive"]   = archive_writer.stats()
+    return jsonify({"status": 200, "error": False, "message": "Worker status", "data": data}), 200
+
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    return jsonify({"status": 200, "error": False, "message": "alive"}), 200
+
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    data = {k: v for k, v in warmup_state.items() if k != "ready"}
+    if not warmup_state["ready"]:
+        message = "Warm-up failed" if warmup_state["error"] else "Warming up"
+        return jsonify({"status": 503, "error": True, "message": message, "data": data}), 503
+    # Dead pre-fork workers are not re-forked, so a degraded pool needs a restart
+    if worker_pool is not None and worker_pool.degraded:
+        data["workers"] = worker_pool.stats()["workers"]
+        data["retired"] = worker_pool.retired
+        return jsonify({"status": 503, "error": True, "message": "Degraded: worker process died", "data": data}), 503
+    return jsonify({"status": 200, "error": False, "message": "ready", "data": data}), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.REGISTRY.render(), status=200,
+                    content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 if __name__ == '__main__':
-    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
     os.makedirs(LOGGING_FOLDER, exist_ok=True)
     
     from waitress import serve
@@ -93,6 +757,6 @@ if __name__ == '__main__':
         app, 
         host='0.0.0.0', 
         port=5000, 
-        threads=4, 
+        threads=HTTP_THREADS, 
         channel_timeout=600
     )
\ No newline at end of file
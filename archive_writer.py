@@ -0,0 +1,250 @@
+"""
+archive_writer.py
+-----------------
+Background archival of uploaded images and their predictions.
+
+The request thread only hands over already-serialised bytes; a single
+writer thread drains a bounded queue, groups records into batches and
+persists them through a pluggable ``StorageBackend``.  When storage falls
+behind, ``submit`` waits at most ``put_timeout`` seconds and then drops the
+record (counted in ``stats()``) instead of slowing the response path.
+
+Usage
+-----
+    writer = ArchiveWriter(LocalStorageBackend("ocr_logs"))
+    writer.submit([("2025-01/abc.jpg", image_bytes),
+                   ("2025-01/abc_pred.json", json_bytes)])
+"""
+
+import os
+import queue
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# One archived object: (relative key, payload bytes)
+ArchiveItem = Tuple[str, bytes]
+
+
+# ---------------------------------------------------------------------------
+# Storage backends
+# ---------------------------------------------------------------------------
+
+class StorageBackend:
+    """Interface for archive destinations.  Keys are '/'-separated relative paths."""
+
+    name = "base"
+
+    def write_many(self, items: List[ArchiveItem]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class LocalStorageBackend(StorageBackend):
+    """
+    Writes objects under ``root`` on the local filesystem.
+
+    All files of a batch are written first and then fsynced together (plus
+    one fsync per touched directory), so a batch costs one round of syncs
+    rather than one per file.
+    """
+
+    name = "local"
+
+    def __init__(self, root: str, fsync: bool = True):
+        self.root  = root
+        self.fsync = fsync
+        os.makedirs(self.root, exist_ok=True)
+
+    def write_many(self, items: List[ArchiveItem]) -> None:
+        handles, dirs = [], set()
+        try:
+            for key, data in items:
+                path    = os.path.join(self.root, *key.split("/"))
+                parent  = os.path.dirname(path)
+                if parent not in dirs:
+                    os.makedirs(parent, exist_ok=True)
+                    dirs.add(parent)
+                f = open(path, "wb")
+                handles.append(f)
+                f.write(data)
+                f.flush()
+
+            if self.fsync:
+                for f in handles:
+                    os.fsync(f.fileno())
+        finally:
+            for f in handles:
+                f.close()
+
+        if self.fsync and hasattr(os, "O_DIRECTORY"):
+            for d in dirs:
+                fd = os.open(d, os.O_RDONLY | os.O_DIRECTORY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    Writes objects to an S3-compatible bucket (AWS S3, MinIO, Ceph RGW, …).
+
+    ``boto3`` is an optional dependency and is only imported when this
+    backend is selected.
+    """
+
+    name = "s3"
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        endpoint_url: Optional[str] = None,
+        region_name: Optional[str] = None,
+    ):
+        try:
+            import boto3
+        except ImportError as e:
+            raise ImportError(
+                "S3StorageBackend requires boto3 (pip install boto3)"
+            ) from e
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.client = boto3.client(
+            "s3", endpoint_url=endpoint_url, region_name=region_name
+        )
+
+    def write_many(self, items: List[ArchiveItem]) -> None:
+        for key, data in items:
+            full_key = f"{self.prefix}/{key}" if self.prefix else key
+            content_type = (
+                "application/json; charset=utf-8" if key.endswith(".json")
+                else "application/octet-stream"
+            )
+            self.client.put_object(
+                Bucket=self.bucket, Key=full_key, Body=data, ContentType=content_type
+            )
+
+
+def build_storage_backend(kind: str, local_root: str, **options) -> StorageBackend:
+    """Instantiate a backend by name ('local' or 's3')."""
+    kind = (kind or "local").lower()
+    if kind == "local":
+        return LocalStorageBackend(local_root, fsync=options.get("fsync", True))
+    if kind == "s3":
+        if not options.get("bucket"):
+            raise ValueError("S3 archive backend needs a bucket name")
+        return S3StorageBackend(
+            bucket=options["bucket"],
+            prefix=options.get("prefix", ""),
+            endpoint_url=options.get("endpoint_url"),
+            region_name=options.get("region_name"),
+        )
+    raise ValueError(f"Unknown archive backend: {kind!r}")
+
+
+# ---------------------------------------------------------------------------
+# Background writer
+# ---------------------------------------------------------------------------
+
+class ArchiveWriter:
+    """
+    Single background thread that persists archive records in batches.
+
+    A *record* is the list of objects belonging to one request (image copy
+    + prediction JSON); records are accepted or dropped as a whole.
+    """
+
+    def __init__(
+        self,
+        backend: StorageBackend,
+        max_queue: int = 256,
+        batch_size: int = 16,
+        put_timeout: float = 0.05,
+    ):
+        self.backend     = backend
+        self.batch_size  = max(1, batch_size)
+        self.put_timeout = put_timeout
+
+        self._queue: "queue.Queue[Optional[List[ArchiveItem]]]" = queue.Queue(maxsize=max_queue)
+        self._lock    = threading.Lock()
+        self._counts  = {"submitted": 0, "written": 0, "dropped": 0, "failed": 0, "batches": 0}
+        self._closed  = False
+
+        self._thread = threading.Thread(
+            target=self._run, name="ocr-archive-writer", daemon=True
+        )
+        self._thread.start()
+
+    # ------------------------------------------------------------------
+    def submit(self, record: List[ArchiveItem]) -> bool:
+        """Queue one record; returns False if it was dropped under back-pressure."""
+        if self._closed:
+            return False
+        try:
+            self._queue.put(record, timeout=self.put_timeout)
+        except queue.Full:
+            self._bump("dropped")
+            logger.warning(
+                "Archive queue full; dropped record %s", record[0][0] if record else "?"
+            )
+            return False
+        self._bump("submitted")
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            out = dict(self._counts)
+        out["queued"]  = self._queue.qsize()
+        out["backend"] = self.backend.name
+        return out
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Flush pending records and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            logger.warning("Archive writer did not drain before shutdown.")
+            return
+        self._thread.join(timeout)
+        self.backend.close()
+
+    # ------------------------------------------------------------------
+    def _bump(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self._counts[key] += n
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            record = self._queue.get()
+            if record is None:
+                break
+            batch = [record]
+            while len(batch) < self.batch_size:
+                try:
+                    nxt = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stop = True
+                    break
+                batch.append(nxt)
+
+            items = [item for rec in batch for item in rec]
+            try:
+                self.backend.write_many(items)
+                self._bump("written", len(batch))
+                self._bump("batches")
+            except Exception as e:
+                self._bump("failed", len(batch))
+                logger.error("Archive batch of %d record(s) failed: %s", len(batch), e)
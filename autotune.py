@@ -0,0 +1,287 @@
+"""
+autotune.py
+-----------
+Per-host tuning of worker count, engine CPU threads, recognition batch size
+and detector input size.
+
+Every engine configuration (intra-op threads × recognition batch × detector
+input size) runs in its own subprocess, so model load and thread pools
+start clean.  Inside it, each worker count is load-tested: N pre-forked
+``DocumentProcessor`` workers (threaded mode for N = 1) serve the sample
+corpus from N concurrent clients for ``--rounds`` passes.  Throughput and
+p95 latency are recorded per trial.
+
+Detector input size and batch size can change what is read.  A trial only
+qualifies when its extracted fields agree with the default configuration on
+at least ``--min-agreement`` of the corpus.  The winner is the qualifying
+trial with the highest throughput (and p95 under ``--max-p95-ms`` when set).
+It is written to a profile file that ``DocumentProcessor(tuning_profile=)``
+and app.py read at startup.  A profile only applies on the host it was
+measured on (same CPU model and usable core count).
+
+Usage
+-----
+    python autotune.py samples/ --output autotune_profile.json
+    python autotune.py --workers 1 2 4 --cpu-threads 2 4 --rec-batch 6 16 \\
+        --det-sizes 64:min 960:max --max-p95-ms 2500
+
+    settings = load_profile("autotune_profile.json")   # None on another host
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import itertools
+import subprocess
+import tempfile
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png"}
+
+# Engine settings a profile may carry, as DocumentProcessor keyword arguments
+ENGINE_KEYS = ("cpu_threads", "rec_batch_size", "det_limit_side_len", "det_limit_type")
+
+
+# ---------------------------------------------------------------------------
+# Host fingerprint + profile loading
+# ---------------------------------------------------------------------------
+
+def _cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or "unknown"
+
+
+def _usable_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def host_fingerprint() -> Dict[str, Any]:
+    return {"machine": platform.machine(), "cpu_model": _cpu_model(), "cpus": _usable_cpus()}
+
+
+def load_profile(path: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Tuned settings from ``path`` if it exists and was measured on this host."""
+    if not path or not os.path.isfile(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            profile = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning("Could not read tuning profile %s: %s", path, e)
+        return None
+    if profile.get("host") != host_fingerprint():
+        logger.warning("Tuning profile %s was measured on %s; ignoring it on %s.",
+                       path, profile.get("host"), host_fingerprint())
+        return None
+    return profile.get("settings")
+
+
+# ---------------------------------------------------------------------------
+# Trial (one engine configuration per subprocess)
+# ---------------------------------------------------------------------------
+
+def _percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def _load_test(processor, images, clients: int, rounds: int) -> Dict[str, Any]:
+    from concurrent.futures import ThreadPoolExecutor
+    from request_context import RequestContext
+
+    def one(item):
+        name, image = item
+        start  = time.perf_counter()
+        result = processor.process_array(image, use_cache=False, ctx=RequestContext())
+        return name, time.perf_counter() - start, result
+
+    work    = [item for _ in range(rounds) for item in images]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        done = list(pool.map(one, work))
+    wall = time.perf_counter() - started
+
+    latencies = [seconds for _, seconds, _ in done]
+    outputs   = {}
+    for name, _, result in done[:len(images)]:
+        outputs[name] = result.get("data") if result.get("status") == 200 else None
+    return {
+        "throughput": len(work) / wall,
+        "p50_ms":     _percentile(latencies, 0.50) * 1000,
+        "p95_ms":     _percentile(latencies, 0.95) * 1000,
+        "outputs":    outputs,
+    }
+
+
+def run_trial(spec: Dict[str, Any], paths: List[str], rounds: int) -> List[Dict[str, Any]]:
+    import cv2
+    from document_processor import DocumentProcessor
+    from prefork_pool import PreforkPool
+
+    engine    = {k: spec[k] for k in ENGINE_KEYS if spec.get(k) is not None}
+    processor = DocumentProcessor(**engine)
+    images    = [(os.path.basename(p), cv2.imread(p)) for p in paths]
+    images    = [(name, image) for name, image in images if image is not None]
+
+    # Largest pools first: the parent must not have run inference before a
+    # fork, and the threaded (1 worker) trial runs in the parent
+    results = []
+    for workers in sorted(spec["workers"], reverse=True):
+        if workers > 1:
+            pool = PreforkPool(processor, workers)
+            try:
+                pool.warm_up(paths)
+                stats = _load_test(pool, images, workers, rounds)
+            finally:
+                pool.close()
+        else:
+            processor.warm_up(paths)
+            stats = _load_test(processor, images, 1, rounds)
+        results.append({**engine, "workers": workers, **stats})
+        print(f"  workers={workers} {engine}: {stats['throughput']:.2f} img/s, "
+              f"p95 {stats['p95_ms']:.0f} ms", flush=True)
+    return results
+
+
+def _spawn_trial(spec: Dict[str, Any], paths: List[str], rounds: int) -> List[Dict[str, Any]]:
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump({"spec": spec, "paths": paths, "rounds": rounds}, f)
+        job = f.name
+    try:
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--trial", job])
+        if proc.returncode != 0:
+            print(f"  trial {spec} failed (exit {proc.returncode}); skipped.")
+            return []
+        with open(job, encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        os.unlink(job)
+
+
+# ---------------------------------------------------------------------------
+# Search
+# ---------------------------------------------------------------------------
+
+def _agreement(outputs: Dict[str, Any], reference: Dict[str, Any]) -> float:
+    if not reference:
+        return 1.0
+    return sum(outputs.get(name) == data for name, data in reference.items()) / len(reference)
+
+
+def _det_size(value: str):
+    size, _, kind = value.partition(":")
+    return int(size), (kind or "max")
+
+
+def _corpus(dirs: List[str]) -> List[str]:
+    paths = []
+    for d in dirs:
+        if os.path.isfile(d):
+            paths.append(d)
+            continue
+        paths.extend(sorted(
+            os.path.join(d, name) for name in os.listdir(d)
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTS
+        ))
+    return list(dict.fromkeys(os.path.abspath(p) for p in paths))
+
+
+def main(argv=None) -> int:
+    here = os.path.dirname(os.path.abspath(__file__))
+    cpus = _usable_cpus()
+    parser = argparse.ArgumentParser(description="Tune worker / engine settings for this host.")
+    parser.add_argument("corpus", nargs="*", help="image files or directories (uploads/ is always included)")
+    parser.add_argument("--output", default=os.path.join(here, "autotune_profile.json"))
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, max(1, cpus // 2)}))
+    parser.add_argument("--cpu-threads", type=int, nargs="+",
+                        default=sorted({1, 2, 4, cpus} & set(range(1, cpus + 1))))
+    parser.add_argument("--rec-batch", type=int, nargs="+", default=[1, 6, 16])
+    parser.add_argument("--det-sizes", nargs="+", default=["64:min", "736:max", "960:max"],
+                        help="detector limit_side_len:limit_type, e.g. 960:max")
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--min-agreement", type=float, default=1.0)
+    parser.add_argument("--max-p95-ms", type=float, default=None)
+    parser.add_argument("--trial", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.trial:
+        with open(args.trial, encoding="utf-8") as f:
+            job = json.load(f)
+        results = run_trial(job["spec"], job["paths"], job["rounds"])
+        with open(args.trial, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, default=str)
+        return 0
+
+    paths = _corpus([os.path.join(here, "uploads")] + args.corpus)
+    if not paths:
+        print("No sample images found.")
+        return 1
+    print(f"Autotuning on {len(paths)} image(s), {cpus} usable CPU(s).")
+
+    # Reference: the engine defaults, one worker
+    print("Reference (engine defaults):")
+    reference_runs = _spawn_trial({"workers": [1]}, paths, 1)
+    if not reference_runs:
+        return 1
+    reference = reference_runs[0]["outputs"]
+
+    trials = []
+    for threads, batch, det in itertools.product(args.cpu_threads, args.rec_batch, args.det_sizes):
+        size, kind = _det_size(det)
+        spec = {"cpu_threads": threads, "rec_batch_size": batch,
+                "det_limit_side_len": size, "det_limit_type": kind, "workers": args.workers}
+        print(f"Trial threads={threads} rec_batch={batch} det={size}:{kind}")
+        for run in _spawn_trial(spec, paths, args.rounds):
+            run["agreement"] = _agreement(run.pop("outputs"), reference)
+            trials.append(run)
+
+    eligible = [
+        t for t in trials
+        if t["agreement"] >= args.min_agreement
+        and (args.max_p95_ms is None or t["p95_ms"] <= args.max_p95_ms)
+    ]
+    if not eligible:
+        print("No configuration met the agreement / latency constraints; no profile written.")
+        return 1
+    best = max(eligible, key=lambda t: t["throughput"])
+
+    workers  = best["workers"]
+    settings = {k: best[k] for k in ENGINE_KEYS}
+    settings["prefork_workers"] = workers if workers > 1 else 0
+    profile = {
+        "host":     host_fingerprint(),
+        "created":  datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "corpus":   len(paths),
+        "settings": settings,
+        "best":     {k: best[k] for k in ("throughput", "p50_ms", "p95_ms", "agreement")},
+        "trials":   trials,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=2)
+
+    print(f"\nBest: {settings}")
+    print(f"      {best['throughput']:.2f} img/s, p95 {best['p95_ms']:.0f} ms, "
+          f"agreement {best['agreement']:.3f}")
+    print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""
+benchmark_backends.py
+---------------------
+Side-by-side latency, memory and accuracy of the OCR backends.
+
+Each backend runs in its own subprocess, so peak RSS and startup time are
+measured from a clean interpreter.  Each subprocess builds a
+``DocumentProcessor`` with ``OCR_BACKEND``-style settings, runs every image
+once untimed (graph compilation, MKLDNN kernels), then times ``repeats``
+passes with the result cache off.
+
+Accuracy is field agreement: the fraction of leaf fields in ``data`` that
+equal the reference.  The reference is ``--labels`` (JSON of filename →
+expected ``data``) when given, otherwise the first backend's output.
+
+Usage
+-----
+    python benchmark_backends.py uploads --backends paddle onnx --repeats 5
+    python benchmark_backends.py uploads --labels labels.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import statistics
+import subprocess
+import tempfile
+from typing import Any, Dict, List, Optional
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png"}
+
+
+def _images(path: str) -> List[str]:
+    if os.path.isfile(path):
+        return [path]
+    return sorted(
+        os.path.join(path, name) for name in os.listdir(path)
+        if os.path.splitext(name)[1].lower() in IMAGE_EXTS
+    )
+
+
+def _flatten(value: Any, prefix: str = "") -> Dict[str, Any]:
+    if isinstance(value, dict):
+        out = {}
+        for key, sub in value.items():
+            out.update(_flatten(sub, f"{prefix}{key}."))
+        return out
+    return {prefix.rstrip("."): value}
+
+
+def field_agreement(result: Optional[dict], reference: Optional[dict]) -> Optional[float]:
+    """Fraction of the reference's leaf fields reproduced exactly."""
+    if not reference:
+        return None
+    expected = _flatten(reference)
+    actual   = _flatten(result or {})
+    return sum(actual.get(k) == v for k, v in expected.items()) / max(len(expected), 1)
+
+
+# ---------------------------------------------------------------------------
+# Worker (one backend per process)
+# ---------------------------------------------------------------------------
+
+def run_worker(backend: str, images: List[str], repeats: int, options: Dict[str, Any]) -> dict:
+    import cv2
+    from document_processor import DocumentProcessor
+    from request_context import RequestContext
+
+    started   = time.perf_counter()
+    processor = DocumentProcessor(ocr_backend=backend, **options)
+    startup   = time.perf_counter() - started
+
+    decoded = {path: cv2.imread(path) for path in images}
+    outputs, latencies, first_call = {}, {}, {}
+    for path, image in decoded.items():
+        if image is None:
+            continue
+        name = os.path.basename(path)
+        t0 = time.perf_counter()
+        result = processor.process_array(image, use_cache=False, ctx=RequestContext())
+        first_call[name] = time.perf_counter() - t0
+        outputs[name] = result.get("data") if result.get("status") == 200 else None
+
+        runs = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            processor.process_array(image, use_cache=False, ctx=RequestContext())
+            runs.append(time.perf_counter() - t0)
+        latencies[name] = runs
+
+    return {
+        "backend":    backend,
+        "startup_s":  startup,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        "first_call": first_call,
+        "latencies":  latencies,
+        "outputs":    outputs,
+    }
+
+
+def _spawn(backend: str, args) -> Optional[dict]:
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        out_path = f.name
+    try:
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), args.images,
+             "--worker", backend, "--out", out_path, "--repeats", str(args.repeats),
+             "--onnx-model-dir", args.onnx_model_dir, "--onnx-threads", str(args.onnx_threads)],
+        )
+        if proc.returncode != 0:
+            print(f"Backend {backend} failed (exit {proc.returncode}); skipped.")
+            return None
+        with open(out_path, encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        os.unlink(out_path)
+
+
+# ---------------------------------------------------------------------------
+# Report
+# ---------------------------------------------------------------------------
+
+def report(runs: List[dict], labels: Optional[Dict[str, Any]]) -> None:
+    reference = labels if labels is not None else runs[0]["outputs"]
+    ref_name  = "labels" if labels is not None else runs[0]["backend"]
+
+    print(f"\n{'backend':<10}{'startup s':>11}{'peak RSS MB':>13}{'median ms':>11}"
+          f"{'p90 ms':>9}{'accuracy':>10}   (vs {ref_name})")
+    for run in runs:
+        all_runs = sorted(t for times in run["latencies"].values() for t in times)
+        median   = statistics.median(all_runs) * 1000 if all_runs else float("nan")
+        p90      = all_runs[int(0.9 * (len(all_runs) - 1))] * 1000 if all_runs else float("nan")
+        scores   = [field_agreement(run["outputs"].get(name), expected)
+                    for name, expected in reference.items()]
+        scores   = [s for s in scores if s is not None]
+        accuracy = f"{statistics.mean(scores):.3f}" if scores else "n/a"
+        print(f"{run['backend']:<10}{run['startup_s']:>11.2f}{run['max_rss_mb']:>13.0f}"
+              f"{median:>11.1f}{p90:>9.1f}{accuracy:>10}")
+
+    print("\nPer image (median ms / field agreement):")
+    names = sorted({name for run in runs for name in run["latencies"]})
+    for name in names:
+        cells = []
+        for run in runs:
+            times = run["latencies"].get(name) or [float("nan")]
+            score = field_agreement(run["outputs"].get(name), reference.get(name))
+            cells.append(f"{run['backend']}: {statistics.median(times) * 1000:7.1f}"
+                         f" / {'n/a' if score is None else f'{score:.2f}'}")
+        print(f"  {name:<32}" + "   ".join(cells))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark OCR backends side by side.")
+    parser.add_argument("images", help="image file or directory, e.g. uploads")
+    parser.add_argument("--backends", nargs="+", default=["paddle", "onnx"])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--labels", help="JSON of filename -> expected data")
+    parser.add_argument("--onnx-model-dir", default=os.environ.get("OCR_ONNX_MODEL_DIR", "models/onnx"))
+    parser.add_argument("--onnx-threads", type=int, default=int(os.environ.get("OCR_ONNX_THREADS", "0")))
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    images = _images(args.images)
+    if not images:
+        print(f"No images found in '{args.images}'.")
+        return 1
+
+    if args.worker:
+        result = run_worker(args.worker, images, args.repeats, dict(
+            onnx_model_dir=args.onnx_model_dir, onnx_threads=args.onnx_threads,
+        ))
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, default=str)
+        return 0
+
+    labels = None
+    if args.labels:
+        with open(args.labels, encoding="utf-8") as f:
+            labels = json.load(f)
+
+    runs = []
+    for backend in args.backends:
+        print(f"Running {backend} on {len(images)} image(s)…")
+        run = _spawn(backend, args)
+        if run is not None:
+            runs.append(run)
+    if not runs:
+        return 1
+    report(runs, labels)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+benchmark_enhance.py
+--------------------
+SIM field accuracy against smart-path preprocessing time, per enhancement mode.
+
+Every image is sent down the smart SIM path once per mode (and thread count):
+``SmartSIMPreprocessor.preprocess`` → OCR → ``SIMExtractor`` → JSON ``data``.
+Only the preprocessing is timed (after one untimed pass per mode), because
+the OCR input size is the same in every mode.
+
+Accuracy is the per-field exact-match rate against ``labels`` (JSON of
+filename → expected ``data``, as for ``accuracy_harness.py``).  Without
+labels it is field agreement with the first mode's output (``nlmeans``, the
+original step, by default).  For ``auto`` the algorithm picked per image is
+listed as well.
+
+Usage
+-----
+    python benchmark_enhance.py sim_samples/ --labels sim_labels.json
+    python benchmark_enhance.py sim_samples/ --modes nlmeans l_nlmeans guided auto --threads 1 4
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from accuracy_harness import FIELDS, score
+from benchmark_backends import field_agreement, _images
+from enhance import ENHANCE_MODES
+
+
+def run_mode(processor, images, mode: str, threads: int) -> Dict[str, Any]:
+    from enhance import EnhancementEngine
+    from image_preprocessor import ImageQualityAssessor
+    from sim_extractor import format_sim_to_json
+
+    engine = EnhancementEngine(mode=mode, threads=threads)
+    processor.smart_preprocessor.enhancer = engine
+
+    outputs, seconds, chosen = {}, [], Counter()
+    for name, image in images:
+        chosen[engine.select(ImageQualityAssessor.assess(image))] += 1
+        processor.smart_preprocessor.preprocess(image)              # untimed: pools, caches
+        start = time.perf_counter()
+        smart = processor.smart_preprocessor.preprocess(image)
+        seconds.append(time.perf_counter() - start)
+
+        ocr  = list(processor.ocr.predict(smart))
+        data = processor.sim_extractor.process_sim(ocr)
+        outputs[name] = format_sim_to_json(data).get("data")
+    return {"mode": mode, "threads": threads, "outputs": outputs,
+            "seconds": seconds, "chosen": dict(chosen)}
+
+
+def _accuracy(outputs: Dict[str, Optional[dict]], labels: Optional[dict], reference: dict) -> float:
+    if labels is not None:
+        table   = score(labels, outputs)
+        matches = [ok for field in FIELDS for ok in table[field].values()]
+        return sum(matches) / len(matches) if matches else float("nan")
+    scores = [field_agreement(outputs.get(name), expected) for name, expected in reference.items()]
+    scores = [s for s in scores if s is not None]
+    return statistics.mean(scores) if scores else float("nan")
+
+
+def report(runs: List[dict], labels: Optional[dict]) -> None:
+    reference = runs[0]["outputs"]
+    against   = "labels" if labels is not None else f"{runs[0]['mode']} output"
+    print(f"\n{'mode':<11}{'threads':>8}{'median ms':>11}{'p90 ms':>9}{'accuracy':>10}   (vs {against})")
+    for run in runs:
+        times  = sorted(run["seconds"])
+        median = statistics.median(times) * 1000
+        p90    = times[int(0.9 * (len(times) - 1))] * 1000
+        acc    = _accuracy(run["outputs"], labels, reference)
+        print(f"{run['mode']:<11}{run['threads']:>8}{median:>11.1f}{p90:>9.1f}{acc:>10.3f}")
+    for run in runs:
+        if run["mode"] == "auto":
+            picks = ", ".join(f"{k}: {v}" for k, v in sorted(run["chosen"].items()))
+            print(f"\nauto (threads={run['threads']}) picked — {picks}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="SIM accuracy vs enhancement time per mode.")
+    parser.add_argument("images", help="SIM image file or directory")
+    parser.add_argument("--labels", help="JSON of filename -> expected data")
+    parser.add_argument("--modes", nargs="+", default=["nlmeans", "l_nlmeans", "guided", "bilateral", "auto"],
+                        choices=ENHANCE_MODES)
+    parser.add_argument("--threads", type=int, nargs="+", default=[4])
+    parser.add_argument("--backend", default=os.environ.get("OCR_BACKEND", "paddle"))
+    args = parser.parse_args(argv)
+
+    import cv2
+    from document_processor import DocumentProcessor
+
+    images = [(os.path.basename(p), cv2.imread(p)) for p in _images(args.images)]
+    images = [(name, image) for name, image in images if image is not None]
+    if not images:
+        print(f"No images found in '{args.images}'.")
+        return 1
+
+    labels = None
+    if args.labels:
+        with open(args.labels, encoding="utf-8") as f:
+            labels = json.load(f)
+
+    processor = DocumentProcessor(ocr_backend=args.backend)
+    runs = []
+    for mode in args.modes:
+        for threads in args.threads:
+            print(f"Running {mode} (threads={threads}) on {len(images)} image(s)…")
+            runs.append(run_mode(processor, images, mode, threads))
+    report(runs, labels)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
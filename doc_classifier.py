@@ -0,0 +1,331 @@
+"""
+doc_classifier.py
+-----------------
+Pixel-only document classifier used to route a card before any OCR runs.
+
+Features (computed on the oriented card downscaled to 256 px wide):
+  * HSV colour histogram of the card (background tint: KTP blue,
+    SIM legacy cream, SIM smart polycarbonate)
+  * LAB mean / spread of the whole card
+  * Header strip (top 18 %): mean colour, edge density, dark-pixel ratio
+  * Face region layout: presence, centre and size of the largest Haar face
+  * Card aspect ratio
+
+The model is a multinomial logistic regression over standardised features,
+stored as a small ``.npz`` file.  Prediction is a handful of numpy ops plus
+one coarse Haar pass on a 256 px image, i.e. a few milliseconds on CPU.
+
+Labels: ``KTP``, ``SIM_LEGACY``, ``SIM_SMART``, ``UNKNOWN``.
+
+Training
+--------
+Pairs every archived upload in ``ocr_logs/<YYYY-MM>/`` with its
+``<request_id>_pred.json``.  Successful KTP predictions give ``KTP``,
+"Unknown document type" gives ``UNKNOWN``.  The prediction JSON does not
+record the SIM layout, so SIM images are labelled from an optional
+``labels.csv`` (``filename,label``) or, with ``--ocr-sim-version``, by
+OCR-ing them once and running ``SIMExtractor.detect_version``.
+
+Usage
+-----
+    python doc_classifier.py ocr_logs models/doc_classifier.npz --labels labels.csv
+
+    clf = DocumentClassifier.load("models/doc_classifier.npz")
+    label, confidence = clf.predict(oriented_card)
+"""
+
+import os
+import csv
+import sys
+import json
+import logging
+import argparse
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+LABELS = ("KTP", "SIM_LEGACY", "SIM_SMART", "UNKNOWN")
+
+FEATURE_WIDTH = 256
+HEADER_RATIO  = 0.18
+HUE_BINS      = 12
+SAT_BINS      = 3
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png"}
+
+
+# ---------------------------------------------------------------------------
+# Features
+# ---------------------------------------------------------------------------
+
+# CascadeClassifier is not safe to share between concurrent calls: each
+# request thread keeps its own (as in orientation.OrientationEngine)
+_local = threading.local()
+
+
+def _get_face_cascade():
+    cascade = getattr(_local, "face_cascade", None)
+    if cascade is None:
+        cascade = _local.face_cascade = cv2.CascadeClassifier(
+            cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+        )
+    return cascade
+
+
+def extract_features(card: np.ndarray) -> np.ndarray:
+    """Fixed-length float32 feature vector for an oriented BGR card image."""
+    h, w  = card.shape[:2]
+    # INTER_LINEAR aliases more than INTER_AREA but is ~20x faster on a
+    # full-resolution photo; training and inference see the same features.
+    small = cv2.resize(card, (FEATURE_WIDTH, max(1, round(h * FEATURE_WIDTH / w))),
+                       interpolation=cv2.INTER_LINEAR)
+    sh, sw = small.shape[:2]
+
+    hsv  = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+    lab  = cv2.cvtColor(small, cv2.COLOR_BGR2LAB)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    # ---- Card colour ----
+    hist = cv2.calcHist([hsv], [0, 1], None, [HUE_BINS, SAT_BINS], [0, 180, 0, 256]).flatten()
+    hist = hist / max(float(hist.sum()), 1.0)
+
+    lab_flat  = lab.reshape(-1, 3).astype(np.float32) / 255.0
+    lab_stats = np.concatenate([lab_flat.mean(axis=0), lab_flat.std(axis=0)])
+
+    # ---- Header strip ----
+    header_h = max(1, int(sh * HEADER_RATIO))
+    header   = small[:header_h]
+    header_gray = gray[:header_h]
+    header_feats = np.concatenate([
+        header.reshape(-1, 3).mean(axis=0) / 255.0,
+        [
+            float(np.count_nonzero(cv2.Canny(header_gray, 50, 150))) / header_gray.size,
+            float(np.count_nonzero(header_gray < 90)) / header_gray.size,
+        ],
+    ])
+
+    # ---- Face layout ----
+    # The ID photo spans roughly a quarter of the card height, so a coarse
+    # scale step and a large minimum size are enough.
+    min_face = max(16, sh // 5)
+    faces = _get_face_cascade().detectMultiScale(
+        gray, scaleFactor=1.25, minNeighbors=3, minSize=(min_face, min_face)
+    )
+    if len(faces):
+        x, y, fw, fh = max(faces, key=lambda f: f[2] * f[3])
+        face_feats = [1.0, (x + fw / 2) / sw, (y + fh / 2) / sh, fw / sw, fh / sh]
+    else:
+        face_feats = [0.0, 0.0, 0.0, 0.0, 0.0]
+
+    return np.concatenate([
+        hist, lab_stats, header_feats, face_feats, [w / h],
+    ]).astype(np.float32)
+
+
+# ---------------------------------------------------------------------------
+# Model
+# ---------------------------------------------------------------------------
+
+class DocumentClassifier:
+    """Softmax regression over ``extract_features`` vectors."""
+
+    def __init__(
+        self,
+        weights: np.ndarray,
+        bias: np.ndarray,
+        mean: np.ndarray,
+        scale: np.ndarray,
+        labels: Sequence[str] = LABELS,
+    ):
+        self.weights = weights
+        self.bias    = bias
+        self.mean    = mean
+        self.scale   = scale
+        self.labels  = tuple(labels)
+
+    # ------------------------------------------------------------------
+    def predict_proba(self, card: np.ndarray) -> np.ndarray:
+        return self._softmax(self._logits(extract_features(card)[None, :]))[0]
+
+    def predict(self, card: np.ndarray) -> Tuple[str, float]:
+        """Return ``(label, confidence)`` for an oriented card image."""
+        proba = self.predict_proba(card)
+        best  = int(np.argmax(proba))
+        return self.labels[best], float(proba[best])
+
+    # ------------------------------------------------------------------
+    @classmethod
+    def fit(
+        cls,
+        features: np.ndarray,
+        labels: Sequence[str],
+        epochs: int = 500,
+        learning_rate: float = 0.5,
+        l2: float = 1e-3,
+    ) -> "DocumentClassifier":
+        """Full-batch gradient descent on the cross-entropy loss."""
+        X     = np.asarray(features, dtype=np.float64)
+        mean  = X.mean(axis=0)
+        scale = X.std(axis=0)
+        scale[scale < 1e-6] = 1.0
+        Xs    = (X - mean) / scale
+
+        index = {label: i for i, label in enumerate(LABELS)}
+        y     = np.zeros((len(labels), len(LABELS)))
+        y[np.arange(len(labels)), [index[label] for label in labels]] = 1.0
+
+        W = np.zeros((X.shape[1], len(LABELS)))
+        b = np.zeros(len(LABELS))
+        for _ in range(epochs):
+            proba = cls._softmax(Xs @ W + b)
+            grad  = (proba - y) / len(X)
+            W    -= learning_rate * (Xs.T @ grad + l2 * W)
+            b    -= learning_rate * grad.sum(axis=0)
+
+        return cls(W.astype(np.float32), b.astype(np.float32),
+                   mean.astype(np.float32), scale.astype(np.float32))
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez(path, weights=self.weights, bias=self.bias, mean=self.mean,
+                 scale=self.scale, labels=np.array(self.labels))
+
+    @classmethod
+    def load(cls, path: str) -> "DocumentClassifier":
+        with np.load(path) as f:
+            return cls(f["weights"], f["bias"], f["mean"], f["scale"],
+                       [str(label) for label in f["labels"]])
+
+    @classmethod
+    def load_if_exists(cls, path: Optional[str]) -> Optional["DocumentClassifier"]:
+        if not path or not os.path.isfile(path):
+            return None
+        try:
+            return cls.load(path)
+        except Exception as e:
+            logger.warning("Could not load document classifier %s: %s", path, e)
+            return None
+
+    # ------------------------------------------------------------------
+    def _logits(self, X: np.ndarray) -> np.ndarray:
+        return ((X - self.mean) / self.scale) @ self.weights + self.bias
+
+    @staticmethod
+    def _softmax(z: np.ndarray) -> np.ndarray:
+        z = z - z.max(axis=1, keepdims=True)
+        e = np.exp(z)
+        return e / e.sum(axis=1, keepdims=True)
+
+
+# ---------------------------------------------------------------------------
+# Training from ocr_logs
+# ---------------------------------------------------------------------------
+
+def _read_labels_csv(path: Optional[str]) -> Dict[str, str]:
+    if not path:
+        return {}
+    with open(path, newline="", encoding="utf-8") as f:
+        return {row[0].strip(): row[1].strip().upper()
+                for row in csv.reader(f) if len(row) >= 2 and row[1].strip().upper() in LABELS}
+
+
+def _label_from_prediction(pred: dict) -> Optional[str]:
+    if pred.get("status") == 200:
+        doc_type = (pred.get("data") or {}).get("document_type")
+        return {"KTP": "KTP", "SIM": "SIM"}.get(doc_type)
+    if pred.get("message") == "Unknown document type":
+        return "UNKNOWN"
+    return None
+
+
+def collect_training_set(
+    logs_dir: str,
+    labels_csv: Optional[str] = None,
+    ocr_sim_version: bool = False,
+) -> Tuple[np.ndarray, List[str]]:
+    """Walk ``logs_dir`` and return ``(features, labels)`` for every usable upload."""
+    from image_preprocessor import StandardPreprocessor
+
+    overrides    = _read_labels_csv(labels_csv)
+    preprocessor = StandardPreprocessor()
+    features, labels = [], []
+
+    for root, _, files in os.walk(logs_dir):
+        for name in sorted(files):
+            stem, ext = os.path.splitext(name)
+            if ext.lower() not in IMAGE_EXTS:
+                continue
+
+            label = overrides.get(name)
+            if label is None:
+                pred_path = os.path.join(root, f"{stem}_pred.json")
+                if not os.path.isfile(pred_path):
+                    continue
+                with open(pred_path, encoding="utf-8") as f:
+                    label = _label_from_prediction(json.load(f))
+            if label is None:
+                continue
+
+            image = cv2.imread(os.path.join(root, name))
+            if image is None:
+                continue
+
+            oriented = preprocessor.correct_orientation_semantic(image)
+
+            if label == "SIM":
+                if not ocr_sim_version:
+                    continue
+                label = _sim_layout_by_ocr(oriented)
+
+            features.append(extract_features(oriented))
+            labels.append(label)
+
+    return np.array(features, dtype=np.float32), labels
+
+
+_sim_ocr = None
+
+
+def _sim_layout_by_ocr(oriented: np.ndarray) -> str:
+    global _sim_ocr
+    if _sim_ocr is None:
+        from document_processor import DocumentProcessor   # loads PaddleOCR
+        _sim_ocr = DocumentProcessor()
+    result, _ = _sim_ocr._run_ocr(_sim_ocr._quick_image(oriented))
+    version   = _sim_ocr.sim_extractor.detect_version(_sim_ocr._get_texts(result))
+    return "SIM_SMART" if version == "SMART" else "SIM_LEGACY"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Train the pixel-only document classifier.")
+    parser.add_argument("logs_dir", help="archived uploads, e.g. ocr_logs")
+    parser.add_argument("output", help="model path, e.g. models/doc_classifier.npz")
+    parser.add_argument("--labels", help="CSV of filename,label overriding the predictions")
+    parser.add_argument("--ocr-sim-version", action="store_true",
+                        help="label SIM layouts by OCR when labels.csv has no entry")
+    args = parser.parse_args(argv)
+
+    X, y = collect_training_set(args.logs_dir, args.labels, args.ocr_sim_version)
+    if len(y) == 0:
+        print(f"No labelled images found in '{args.logs_dir}'.")
+        return 1
+
+    counts = {label: y.count(label) for label in LABELS}
+    print(f"Training on {len(y)} image(s): {counts}")
+
+    clf  = DocumentClassifier.fit(X, y)
+    pred = [clf.labels[i] for i in np.argmax(clf._logits(X), axis=1)]
+    acc  = float(np.mean([p == t for p, t in zip(pred, y)]))
+    print(f"Training accuracy: {acc:.3f}")
+
+    clf.save(args.output)
+    print(f"Saved model to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,14 @@
 import cv2
 import sys
 import os
+import time
+import threading
 import traceback
 import logging
 import numpy as np
-from typing import Optional, Dict, Any
-from paddleocr import PaddleOCR
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Tuple, Union
 
 from ktp_extractor      import KTPExtractor, format_to_target_json
 from sim_extractor       import SIMExtractor, format_sim_to_json
@@ -14,6 +17,17 @@ from nik_fuzzy           import NIKFuzzyExtractor
 from date_normalizer     import DateNormalizer
 from confidence_scorer   import KTPConfidenceScorer, print_report
 from nik_cross_validator import NIKCrossValidator
+from result_cache        import ResultCache, array_digest, content_digest, sampled_digest
+from request_context     import RequestContext, StageCostModel
+from doc_classifier      import DocumentClassifier
+from ktp_template        import KTPTemplateMatcher
+from inference_scheduler import InferenceScheduler
+from ocr_backends        import create_backend
+from orientation         import OrientationEngine
+from image_artifacts     import ImageArtifacts
+from enhance             import EnhancementEngine
+from ingest              import Ingestor, ImageTooLarge
+from autotune            import load_profile
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(
@@ -64,6 +78,50 @@ def identify_document_type(ocr_texts: list) -> str:
     return "UNKNOWN"
 
 
+# ---------------------------------------------------------------------------
+# Speculative SIM smart path
+# ---------------------------------------------------------------------------
+
+SPECULATE_PREPROCESS = "preprocess"     # smart preprocessing only
+SPECULATE_OCR        = "ocr"            # smart preprocessing + smart OCR
+
+
+@dataclass
+class SmartSpeculation:
+    """Smart SIM work started ahead of the std decision; cancel if unneeded."""
+    future:    Future
+    cancelled: threading.Event
+    denoise:   bool
+
+    def cancel(self) -> None:
+        # A queued job never starts; a running one stops at the next
+        # preprocessing step (SmartSIMPreprocessor.preprocess checks the event)
+        self.cancelled.set()
+        self.future.cancel()
+
+
+# Recognition-only model for template KTP crops; the same Latin model the
+# full pipeline picks for lang='id'
+DEFAULT_TEMPLATE_REC_MODEL = "latin_PP-OCRv5_mobile_rec"
+
+
+# Initial per-stage cost guesses (seconds) for deadline decisions; replaced
+# by observed timings as soon as requests (or the warm-up) run the stage.
+DEFAULT_STAGE_COSTS = {
+    "unknown_retry_ocr":         1.5,
+    "sim_smart_preprocess":      1.0,
+    "sim_smart_preprocess_fast": 0.4,
+    "sim_smart_ocr":             2.0,
+    "sim_smart_extract":         0.05,
+    "heavy_tier":                4.0,
+}
+
+# Fast engine tier: mobile detection + recognition.  The heavy tier is the
+# default lang='id' pipeline used when tiers are off.
+DEFAULT_FAST_DET_MODEL = "PP-OCRv5_mobile_det"
+DEFAULT_FAST_REC_MODEL = "latin_PP-OCRv5_mobile_rec"
+
+
 def calculate_ocr_confidence(ocr_result: list) -> float:
     if not ocr_result or not ocr_result[0]:
         return 0.0
@@ -170,13 +228,97 @@ class DocumentProcessor:
     OCR engine intact.
     """
 
-    def __init__(self, debug: bool = False):
-        logger.info("Initialising PaddleOCR engine…")
-        self.ocr = PaddleOCR(
+    def __init__(
+        self,
+        debug: bool = False,
+        result_cache: Optional[ResultCache] = None,
+        classifier: Optional[DocumentClassifier] = None,
+        classifier_min_confidence: float = 0.90,
+        sim_speculation: Optional[str] = None,
+        speculation_workers: int = 2,
+        ktp_template: bool = False,
+        template_rec_model: Optional[str] = None,
+        inference_max_batch: int = 1,
+        inference_linger_ms: float = 5.0,
+        ocr_tiers: bool = False,
+        fast_det_model: Optional[str] = None,
+        fast_rec_model: Optional[str] = None,
+        tier_min_conf: float = 0.85,
+        tier_min_completeness: float = 0.70,
+        textline_orientation: str = "auto",
+        textline_min_conf: float = 0.80,
+        ocr_backend: str = "paddle",
+        recording_dir: str = "ocr_recordings",
+        onnx_model_dir: str = "models/onnx",
+        onnx_threads: int = 0,
+        precision: str = "fp32",
+        int8_rec_model_dir: Optional[str] = None,
+        cpu_threads: Optional[int] = None,
+        rec_batch_size: Optional[int] = None,
+        det_limit_side_len: Optional[int] = None,
+        det_limit_type: Optional[str] = None,
+        tuning_profile: Optional[str] = None,
+        orientation_threads: int = 3,
+        orientation_coarse_side: int = 320,
+        enhance_mode: str = "nlmeans",
+        enhance_threads: int = 4,
+        decode_target_side: int = 2000,
+        max_image_pixels: int = 50_000_000,
+    ):
+        logger.info("Initialising OCR engine (%s backend)…", ocr_backend)
+        backend_options = dict(
+            mode=ocr_backend, recording_dir=recording_dir,
+            onnx_model_dir=onnx_model_dir, onnx_threads=onnx_threads,
+            precision=precision, int8_rec_model_dir=int8_rec_model_dir,
+        )
+        # Host-tuned engine settings (autotune.py); explicit arguments win
+        tuned  = load_profile(tuning_profile) or {}
+        engine = {
+            key: value for key, value in (
+                ("cpu_threads",                 cpu_threads        or tuned.get("cpu_threads")),
+                ("text_recognition_batch_size", rec_batch_size     or tuned.get("rec_batch_size")),
+                ("text_det_limit_side_len",     det_limit_side_len or tuned.get("det_limit_side_len")),
+                ("text_det_limit_type",         det_limit_type     or tuned.get("det_limit_type")),
+            ) if value is not None
+        }
+        if engine:
+            logger.info("Engine tuning: %s", engine)
+        ocr_settings = dict(
             use_textline_orientation=True,
             lang='id',
             enable_mkldnn=True,
+            **engine,
+        )
+        # Tiered mode: self.ocr is the fast tier every image starts on and
+        # self.ocr_heavy the default engine, used only to escalate
+        self.ocr_heavy = None
+        if ocr_tiers:
+            heavy_settings = ocr_settings
+            ocr_settings   = dict(
+                use_textline_orientation=True,
+                enable_mkldnn=True,
+                text_detection_model_name=fast_det_model or DEFAULT_FAST_DET_MODEL,
+                text_recognition_model_name=fast_rec_model or DEFAULT_FAST_REC_MODEL,
+                **engine,
+            )
+            logger.info("Initialising heavy OCR tier…")
+            self.ocr_heavy = create_backend("ocr_heavy", heavy_settings, **backend_options)
+            self.heavy_settings_key = repr(sorted(heavy_settings.items()))
+        self.tier_min_conf         = tier_min_conf
+        self.tier_min_completeness = tier_min_completeness
+        # "auto": skip the per-line orientation classifier on images already
+        # known to be upright, re-running with it below textline_min_conf
+        self.textline_orientation  = textline_orientation
+        self.textline_min_conf     = textline_min_conf
+        self.ocr = create_backend("ocr", ocr_settings, **backend_options)
+        # Concurrent single-image calls share one predict() when batching is on
+        self.scheduler = (
+            InferenceScheduler(self.ocr.predict, inference_max_batch, inference_linger_ms)
+            if inference_max_batch > 1 else None
         )
+        # Part of every OCR memo key: identical pixels under different engine
+        # settings are different inferences
+        self.ocr_settings_key = repr(sorted(ocr_settings.items()))
 
         self.ktp_extractor = KTPExtractor()
         self.sim_extractor = SIMExtractor()
@@ -186,18 +328,69 @@ class DocumentProcessor:
         os.makedirs(self.debug_dir, exist_ok=True)
 
         # Preprocessors — used only for orientation + resize (KTP)
-        # and full preprocessing (SIM, where quality is more variable)
+        # and full preprocessing (SIM, where quality is more variable).
+        # One orientation engine: the decision is made once per request.
+        self.orientation = OrientationEngine(
+            coarse_side=orientation_coarse_side, threads=orientation_threads
+        )
         self.std_preprocessor   = StandardPreprocessor(
-            debug=debug, debug_dir=f"{self.debug_dir}/preprocess_std"
+            debug=debug, debug_dir=f"{self.debug_dir}/preprocess_std",
+            orientation_engine=self.orientation,
         )
         self.smart_preprocessor = SmartSIMPreprocessor(
-            debug=debug, debug_dir=f"{self.debug_dir}/preprocess_smart"
+            debug=debug, debug_dir=f"{self.debug_dir}/preprocess_smart",
+            orientation_engine=self.orientation,
+            enhancer=EnhancementEngine(mode=enhance_mode, threads=enhance_threads),
         )
 
+        # Header-first decoding for paths and encoded batch items
+        self.ingestor = Ingestor(target_side=decode_target_side, max_pixels=max_image_pixels)
+
         self.ktp_post       = KTPPostProcessor()
         self.cross_validator = NIKCrossValidator()
         self.scorer         = KTPConfidenceScorer()
 
+        # Optional cache of finished results for repeated submissions
+        self.result_cache   = result_cache
+
+        # Optional pixel-only router; below the confidence threshold the
+        # text-based identify_document_type decides as before
+        self.classifier                = classifier
+        self.classifier_min_confidence = classifier_min_confidence
+
+        # Speculative smart SIM path: None (off), "preprocess" or "ocr".
+        # Threads are created on first use, i.e. after any pre-fork.
+        self.sim_speculation = sim_speculation
+        self._speculation_pool = (
+            ThreadPoolExecutor(max_workers=speculation_workers, thread_name_prefix="sim-speculation")
+            if sim_speculation else None
+        )
+
+        # Template KTP mode: fit the national layout, recognise field crops
+        # only, fall back to detection + recognition when the fit is poor.
+        # Only classifier-routed cards can use it: otherwise the quick OCR
+        # pass has already run full detection + recognition.
+        if ktp_template and classifier is None:
+            logger.warning(
+                "KTP template mode needs the document classifier (OCR_DOC_CLASSIFIER_MODEL); "
+                "no classifier is loaded, so template mode is disabled."
+            )
+            ktp_template = False
+        self.template_matcher = KTPTemplateMatcher() if ktp_template else None
+        self.recognizer       = (
+            create_backend(
+                "text_rec",
+                dict(model_name=template_rec_model or DEFAULT_TEMPLATE_REC_MODEL, enable_mkldnn=True,
+                     **{k: v for k, v in engine.items() if k == "cpu_threads"}),
+                recognition=True, **backend_options,
+            )
+            if ktp_template else None
+        )
+
+        # Observed stage costs; optional stages are skipped when they would
+        # overrun the request deadline
+        self.stage_costs    = StageCostModel(DEFAULT_STAGE_COSTS)
+
         logger.info("DocumentProcessor ready.")
         sys.stdout.flush()
 
@@ -237,67 +430,731 @@ class DocumentProcessor:
 
     # ------------------------------------------------------------------
 
-    def _run_ocr(self, image):
-        try:
-            result = self.ocr.predict(image)
-            conf   = calculate_ocr_confidence(result)
+    def _ocr_memo_key(self, image: np.ndarray, heavy: bool = False) -> str:
+        settings = self.heavy_settings_key if heavy else self.ocr_settings_key
+        return f"{settings}:{sampled_digest(image)}"
+
+    def _run_ocr(
+        self,
+        image,
+        ctx: Optional[RequestContext] = None,
+        stage: str = "ocr",
+        upright: bool = True,
+    ):
+        """
+        OCR one image, memoised per request: an input already inferred
+        within ``ctx`` is answered from the memo instead of the engine.
+
+        ``upright=False`` marks an image that did not go through orientation
+        correction (the raw-image retry); it always keeps the text-line
+        orientation classifier.
+        """
+        ctx   = ctx if ctx is not None else RequestContext()
+        heavy = ctx.ocr_tier == "heavy" and self.ocr_heavy is not None
+        key   = self._ocr_memo_key(image, heavy)
+        if key in ctx.ocr_memo:
+            ctx.ocr_calls_avoided += 1
+            return ctx.ocr_memo[key]
+
+        skip_textline = self._skip_textline(ctx, upright)
+        ctx.ocr_calls += 1
+        with ctx.stage(stage):
+            try:
+                result = self._predict(image, heavy, skip_textline)
+                conf   = calculate_ocr_confidence(result)
+            except Exception as e:
+                logger.warning("OCR failed: %s", e)
+                return None, 0.0
+        if skip_textline:
+            result, conf = self._textline_fallback(image, result, conf, ctx, heavy)
+        ctx.ocr_memo[key] = (result, conf)
+        return result, conf
+
+    def _predict(self, image: np.ndarray, heavy: bool = False, skip_textline: bool = False) -> list:
+        """
+        ``predict`` for one image on the selected tier, via the scheduler
+        when enabled.
+        """
+        kwargs = {"use_textline_orientation": False} if skip_textline else {}
+        if heavy:
+            return self.ocr_heavy.predict(image, **kwargs)
+        if self.scheduler is None:
+            return self.ocr.predict(image, **kwargs)
+        return [self.scheduler.infer(image, **kwargs)]
+
+    # ------------------------------------------------------------------
+    # Text-line orientation
+    # ------------------------------------------------------------------
+
+    def _skip_textline(self, ctx: RequestContext, upright: bool = True) -> bool:
+        """
+        Run without the per-line orientation classifier when the card's
+        rotation is already known: the face cascade settled it during
+        orientation or the client declared the image upright.
+        """
+        return self.textline_orientation == "auto" and upright and ctx.upright
+
+    def _textline_fallback(
+        self,
+        image: np.ndarray,
+        result: Optional[list],
+        conf: float,
+        ctx: RequestContext,
+        heavy: bool = False,
+    ) -> Tuple[Optional[list], float]:
+        """Re-run a classifier-free pass with the classifier when recognition is poor."""
+        if result and conf >= self.textline_min_conf:
+            ctx.textline_skipped += 1
             return result, conf
+        logger.info("OCR conf %.3f without text-line orientation; re-running with it.", conf)
+        ctx.ocr_calls += 1
+        with ctx.stage("textline_fallback"):
+            try:
+                retry = self.ocr_heavy.predict(image) if heavy else self.ocr.predict(image)
+            except Exception as e:
+                logger.warning("OCR failed: %s", e)
+                return result, conf
+        ctx.textline_fallbacks += 1
+        retry_conf = calculate_ocr_confidence(retry)
+        if retry_conf >= conf:
+            return retry, retry_conf
+        return result, conf
+
+    def _run_ocr_batch(
+        self,
+        images: List[np.ndarray],
+        contexts: Optional[List[RequestContext]] = None,
+        stage: str = "ocr",
+        upright: bool = True,
+    ) -> List[Tuple[Optional[list], float]]:
+        """
+        One PaddleOCR ``predict`` call over several images.
+
+        Each entry of the returned list has the same ``(result, conf)`` shape
+        as ``_run_ocr`` so the extractors cannot tell the difference.  Inputs
+        already in their context's OCR memo are not sent to the engine.  If
+        the batched call fails, every image is retried on its own.  The
+        batch's wall-clock time is split evenly across the inferred images.
+        """
+        if not images:
+            return []
+        contexts = contexts or [RequestContext() for _ in images]
+        keys     = [self._ocr_memo_key(img) for img in images]
+        out: List[Optional[Tuple[Optional[list], float]]] = [None] * len(images)
+        misses = []
+        for i, (key, ctx) in enumerate(zip(keys, contexts)):
+            if key in ctx.ocr_memo:
+                ctx.ocr_calls_avoided += 1
+                out[i] = ctx.ocr_memo[key]
+            else:
+                misses.append(i)
+        if not misses:
+            return out
+
+        # Images of known orientation and the rest go to separate predict
+        # calls: the text-line classifier is a per-call setting
+        groups: Dict[bool, List[int]] = {}
+        for i in misses:
+            groups.setdefault(self._skip_textline(contexts[i], upright), []).append(i)
+
+        for skip_textline, group in groups.items():
+            kwargs = {"use_textline_orientation": False} if skip_textline else {}
+            start  = time.perf_counter()
+            try:
+                results = list(self.ocr.predict([images[i] for i in group], **kwargs))
+                if len(results) != len(group):
+                    raise RuntimeError(
+                        f"batch returned {len(results)} results for {len(group)} images"
+                    )
+            except Exception as e:
+                logger.warning("Batch OCR failed (%s); falling back to per-image OCR.", e)
+                for i in group:
+                    out[i] = self._run_ocr(images[i], contexts[i], stage, upright)
+                continue
+
+            share = (time.perf_counter() - start) / len(group)
+            for i, res in zip(group, results):
+                ctx = contexts[i]
+                ctx.ocr_calls += 1
+                ctx.add_time(stage, share)
+                wrapped = [res]
+                out[i]  = (wrapped, calculate_ocr_confidence(wrapped))
+            if skip_textline:
+                self._textline_fallback_batch(images, out, contexts, group)
+            for i in group:
+                contexts[i].ocr_memo[keys[i]] = out[i]
+        return out
+
+    def _textline_fallback_batch(
+        self,
+        images: List[np.ndarray],
+        out: List[Optional[Tuple[Optional[list], float]]],
+        contexts: List[RequestContext],
+        group: List[int],
+    ) -> None:
+        """
+        Batched ``_textline_fallback``: every poor classifier-free entry of
+        ``group`` is re-run in one ``predict`` with the classifier, in place.
+        """
+        poor = []
+        for i in group:
+            result, conf = out[i]
+            if result and conf >= self.textline_min_conf:
+                contexts[i].textline_skipped += 1
+            else:
+                poor.append(i)
+        if not poor:
+            return
+        logger.info("Batch: %d pass(es) below conf %.2f without text-line orientation; "
+                    "re-running them with it.", len(poor), self.textline_min_conf)
+        start = time.perf_counter()
+        try:
+            retries = list(self.ocr.predict([images[i] for i in poor]))
+            if len(retries) != len(poor):
+                raise RuntimeError(f"batch returned {len(retries)} results for {len(poor)} images")
         except Exception as e:
             logger.warning("OCR failed: %s", e)
-            return None, 0.0
+            return
+        share = (time.perf_counter() - start) / len(poor)
+        for i, res in zip(poor, retries):
+            ctx = contexts[i]
+            ctx.ocr_calls += 1
+            ctx.textline_fallbacks += 1
+            ctx.add_time("textline_fallback", share)
+            retry      = [res]
+            retry_conf = calculate_ocr_confidence(retry)
+            if retry_conf >= out[i][1]:
+                out[i] = (retry, retry_conf)
 
     def _get_texts(self, ocr_result):
         if not ocr_result or not ocr_result[0]:
             return []
         return ocr_result[0].get("rec_texts", [])
 
+    def _orient(self, image: np.ndarray, ctx: RequestContext) -> np.ndarray:
+        """Decide the card's rotation once; later stages reuse it from ``ctx.artifacts``."""
+        if ctx.artifacts is None:
+            ctx.artifacts = ImageArtifacts()
+        with ctx.stage("orientation"):
+            oriented = ctx.artifacts.oriented(image, self.orientation)
+        ctx.orientation = ctx.artifacts.orientation
+        ctx.face_boxes  = ctx.orientation.faces
+        ctx.upright     = ctx.upright or bool(ctx.face_boxes)
+        return oriented
+
+    @staticmethod
+    def _full_resolution(image: np.ndarray, ctx: RequestContext) -> np.ndarray:
+        """The upload at full size for the smart SIM path (decoded on demand)."""
+        if ctx.artifacts is None:
+            return image
+        full = ctx.artifacts.full_resolution(image)
+        ctx.full_decode = ctx.full_decode or full is not image
+        return full
+
+    def _quick_image(self, oriented: np.ndarray, ctx: Optional[RequestContext] = None) -> np.ndarray:
+        """1000 px wide + white border; built once per request and image."""
+        pre       = self.std_preprocessor
+        artifacts = ctx.artifacts if ctx is not None else None
+        if artifacts is None:
+            return pre.add_padding(pre.resize_keep_aspect(oriented, 1000))
+        return artifacts.derived(oriented, "quick", lambda: pre.add_padding(
+            artifacts.resized(oriented, 1000, pre.resize_keep_aspect)
+        ))
+
     # ------------------------------------------------------------------
     # Main entry point
     # ------------------------------------------------------------------
 
     def process_image(self, image_path: str) -> Dict[str, Any]:
         try:
-            image = cv2.imread(image_path)
-            if image is None:
-                return {"status": 404, "error": True, "message": "Image not found"}
-
-            # =========================================================
-            # PASS 1 — Orientation correction only (portrait → landscape)
-            # =========================================================
-            oriented = self.std_preprocessor.correct_orientation_semantic(image)
-
-            # =========================================================
-            # PASS 2 — Quick OCR for document-type detection
-            #          (resize only — no other preprocessing)
-            # =========================================================
-            quick_img = self.std_preprocessor.add_padding(
-                self.std_preprocessor.resize_keep_aspect(oriented, 1000)
-            )
-            quick_ocr, _ = self._run_ocr(quick_img)
-            doc_type = identify_document_type(self._get_texts(quick_ocr))
+            ingested = self.ingestor.read(image_path)
+        except ImageTooLarge as e:
+            return self._too_large(e)
+        if ingested is None:
+            return {"status": 404, "error": True, "message": "Image not found"}
+        ctx = RequestContext(decode_scale=ingested.factor)
+        return self.process_array(ingested.image, ctx=ctx, encoded=ingested.encoded)
 
-            if doc_type == "UNKNOWN":
-                logger.info("Quick-pass UNKNOWN; retrying on raw image.")
-                raw_ocr, _ = self._run_ocr(image)
-                raw_type   = identify_document_type(self._get_texts(raw_ocr))
-                if raw_type != "UNKNOWN":
-                    doc_type  = raw_type
-                    quick_ocr = raw_ocr
-                    oriented  = image
+    @staticmethod
+    def _too_large(e: ImageTooLarge) -> Dict[str, Any]:
+        return {"status": 413, "error": True,
+                "message": f"Image too large: {e.width}x{e.height} exceeds {e.max_pixels} pixels"}
 
-            sys.stdout.flush()
+    def warm_up(self, image_paths: List[str]) -> Dict[str, Any]:
+        """
+        Run the full pipeline on sample cards so PaddleOCR / MKLDNN compile
+        their kernels for the production input shapes before real traffic.
 
-            if doc_type == "KTP":
-                return self._process_ktp(oriented, quick_ocr)
+        The SIM smart-path input is warmed explicitly as well, because the
+        sample may be clean enough for the std path alone.  A synthetic
+        blank card is used when no sample image can be read.
+        """
+        start  = time.perf_counter()
+        images = []
+        for path in image_paths:
+            image = cv2.imread(path)
+            if image is None:
+                logger.warning("Warm-up image not readable: %s", path)
+                continue
+            images.append((os.path.basename(path), image))
+        if not images:
+            images.append(("synthetic", np.full((630, 1000, 3), 255, dtype=np.uint8)))
+
+        report = []
+        for name, image in images:
+            began  = time.perf_counter()
+            ctx    = RequestContext(request_id=f"warmup:{name}")
+            result = self.process_array(image, use_cache=False, ctx=ctx)
+            if ctx.doc_type == "SIM" and ctx.sim_path == "std":
+                smart_image = self.smart_preprocessor.preprocess(image)
+                self._run_ocr(smart_image, ctx, "sim_smart_ocr")
+            if self.ocr_heavy is not None and ctx.ocr_tier != "heavy":
+                self.ocr_heavy.predict(self._quick_image(image))
+            if self.recognizer is not None and ctx.ktp_path is None:
+                self.recognizer.predict([np.full((48, 480, 3), 255, dtype=np.uint8)])
+            report.append({
+                "image":     name,
+                "status":    result.get("status"),
+                "doc_type":  ctx.doc_type,
+                "ocr_calls": ctx.ocr_calls,
+                "seconds":   round(time.perf_counter() - began, 3),
+            })
 
-            if doc_type == "SIM":
-                return self._process_sim(image, oriented, quick_ocr)
+        seconds = time.perf_counter() - start
+        logger.info("Warm-up finished in %.2fs over %d image(s)", seconds, len(report))
+        return {"seconds": round(seconds, 3), "images": report}
 
-            return {"status": 400, "error": True, "message": "Unknown document type"}
+    def process_array(
+        self,
+        image: np.ndarray,
+        content_hash: Optional[str] = None,
+        use_cache: bool = True,
+        ctx: Optional[RequestContext] = None,
+        encoded: Optional[bytes] = None,
+    ) -> Dict[str, Any]:
+        """
+        Run the full pipeline on an already-decoded BGR image.
 
+        ``content_hash`` is the digest of the encoded upload, used as the
+        exact-match cache key; without it the decoded pixels are hashed.
+        ``encoded`` is the upload when ``image`` is a reduced-scale decode
+        (``Ingested.encoded``); the smart SIM path decodes it at full size.
+        Stage timings and counters are recorded on ``ctx`` when given.
+        """
+        ctx = ctx if ctx is not None else RequestContext()
+        if encoded is not None:
+            ctx.artifacts = ctx.artifacts or ImageArtifacts()
+            ctx.artifacts.add_encoded(image, encoded)
+        if ctx.remaining() <= 0:
+            ctx.skip("all")
+            return {"status": 504, "error": True, "message": "Deadline exceeded before processing"}
+        try:
+            with ctx.stage("total"):
+                result = self._process_array(image, content_hash, use_cache, ctx)
+            self.stage_costs.observe(ctx.timings)
+            return result
         except Exception as e:
             traceback.print_exc()
+            ctx.error_class = type(e).__name__
             return {"status": 500, "error": True, "message": f"Internal Error: {str(e)}"}
+        finally:
+            # Derived images live only as long as the request
+            ctx.artifacts = None
+
+    def _process_array(
+        self,
+        image: np.ndarray,
+        content_hash: Optional[str],
+        use_cache: bool,
+        ctx: RequestContext,
+    ) -> Dict[str, Any]:
+        if image is None or image.size == 0:
+            return {"status": 400, "error": True, "message": "Image could not be decoded"}
+
+        cache  = self.result_cache if use_cache else None
+        digest = None
+        if cache is not None:
+            with ctx.stage("cache_lookup"):
+                digest = content_hash or array_digest(image)
+                cached = cache.get_exact(digest)
+            if cached is not None:
+                logger.info("Result cache: exact hit.")
+                ctx.cache = "exact"
+                return cached
+            ctx.cache = "miss"
+
+        # =========================================================
+        # PASS 1 — Orientation correction only (portrait → landscape)
+        # =========================================================
+        oriented = self._orient(image, ctx)
+
+        # =========================================================
+        # PASS 2 — Quick OCR for document-type detection
+        #          (resize only — no other preprocessing)
+        # =========================================================
+        quick_img = self._quick_image(oriented, ctx)
+
+        result = self._route_and_extract(image, oriented, quick_img, ctx)
+        result = self._escalate_tier(result, image, oriented, quick_img, ctx)
+
+        # Degraded answers are not cached; a later request with more time
+        # should get the full pipeline.
+        if ctx.skipped_stages:
+            result["skipped_stages"] = list(ctx.skipped_stages)
+        elif cache is not None and result.get("status") == 200:
+            cache.put(digest, result)
+        return result
+
+    def _route_and_extract(
+        self,
+        image: np.ndarray,
+        oriented: np.ndarray,
+        quick_img: np.ndarray,
+        ctx: RequestContext,
+    ) -> Dict[str, Any]:
+        """(Classifier or quick OCR pass) → document type → KTP / SIM pipeline."""
+        layout = self._classify(oriented, ctx)
+        if layout is not None:
+            ctx.doc_type = "SIM" if layout.startswith("SIM") else layout
+            if layout == "KTP":
+                return self._process_ktp(oriented, None, ctx)
+            if ctx.doc_type == "SIM":
+                return self._process_sim(image, oriented, None, ctx, layout=layout)
+            return {"status": 400, "error": True, "message": "Unknown document type"}
+
+        quick_ocr, _ = self._run_ocr(quick_img, ctx, "quick_ocr")
+        doc_type = identify_document_type(self._get_texts(quick_ocr))
+
+        if doc_type == "UNKNOWN" and not ctx.can_afford(self.stage_costs.estimate("unknown_retry_ocr")):
+            logger.info("Quick-pass UNKNOWN; no time left for the raw-image retry.")
+            ctx.skip("unknown_retry_ocr")
+        elif doc_type == "UNKNOWN":
+            logger.info("Quick-pass UNKNOWN; retrying on raw image.")
+            raw_ocr, _ = self._run_ocr(image, ctx, "unknown_retry_ocr", upright=False)
+            raw_type   = identify_document_type(self._get_texts(raw_ocr))
+            if raw_type != "UNKNOWN":
+                doc_type  = raw_type
+                quick_ocr = raw_ocr
+                oriented  = image
+                ctx.upright = False     # the raw image skipped orientation
+
+        sys.stdout.flush()
+        ctx.doc_type = doc_type
+
+        if doc_type == "SIM":
+            return self._process_sim(image, oriented, quick_ocr, ctx)
+
+        if doc_type == "KTP":
+            return self._process_ktp(oriented, quick_ocr, ctx)
+
+        return {"status": 400, "error": True, "message": "Unknown document type"}
+
+    # ------------------------------------------------------------------
+    # Engine tiers
+    # ------------------------------------------------------------------
+
+    def _needs_heavy_tier(self, result: Dict[str, Any], ctx: RequestContext) -> bool:
+        """Fast-tier answer below the confidence / completeness thresholds."""
+        if result.get("status") != 200:
+            # Only failures after OCR ran (unknown type, empty OCR); a
+            # pixel-classifier rejection never reached the engine
+            return ctx.ocr_calls > 0
+        if ctx.ocr_conf is not None and ctx.ocr_conf < self.tier_min_conf:
+            return True
+        return ctx.completeness is not None and ctx.completeness < self.tier_min_completeness
+
+    @staticmethod
+    def _tier_quality(result: Dict[str, Any], ctx: RequestContext) -> Tuple[bool, float, float]:
+        return result.get("status") == 200, ctx.completeness or 0.0, ctx.ocr_conf or 0.0
+
+    def _escalate_tier(
+        self,
+        result: Dict[str, Any],
+        image: np.ndarray,
+        oriented: np.ndarray,
+        quick_img: np.ndarray,
+        ctx: RequestContext,
+    ) -> Dict[str, Any]:
+        """Re-run routing + extraction on the heavy tier when the fast answer is poor."""
+        if self.ocr_heavy is None:
+            return result
+        if not self._needs_heavy_tier(result, ctx):
+            ctx.ocr_tier = "fast"
+            result["ocr_tier"] = "fast"
+            return result
+        if not ctx.can_afford(self.stage_costs.estimate("heavy_tier")):
+            logger.info("Fast tier below thresholds; no time left for the heavy tier.")
+            ctx.skip("heavy_tier")
+            ctx.ocr_tier = "fast"
+            result["ocr_tier"] = "fast"
+            return result
+
+        logger.info("Fast tier below thresholds (conf=%s completeness=%s); escalating.",
+                    ctx.ocr_conf, ctx.completeness)
+        fast_quality = self._tier_quality(result, ctx)
+        ctx.ocr_tier = "heavy"
+        ctx.ocr_conf = ctx.completeness = None
+        with ctx.stage("heavy_tier"):
+            heavy = self._route_and_extract(image, oriented, quick_img, ctx)
+        if self._tier_quality(heavy, ctx) >= fast_quality:
+            heavy["ocr_tier"] = "heavy"
+            return heavy
+        result["ocr_tier"] = "fast"
+        return result
+
+    def _classify(self, oriented: np.ndarray, ctx: RequestContext) -> Optional[str]:
+        """Pixel-only layout label when the classifier is confident, else None."""
+        if self.classifier is None:
+            return None
+        with ctx.stage("classify"):
+            try:
+                label, confidence = self.classifier.predict(oriented)
+            except Exception as e:
+                logger.warning("Document classifier failed: %s", e)
+                return None
+        ctx.classifier = label if confidence >= self.classifier_min_confidence else "ambiguous"
+        logger.info("Classifier: %s (%.2f)", label, confidence)
+        return label if confidence >= self.classifier_min_confidence else None
+
+    # ------------------------------------------------------------------
+    # Batch entry point
+    # ------------------------------------------------------------------
+
+    def process_images(
+        self,
+        images: List[Union[str, bytes, np.ndarray]],
+        batch_size: int = 8,
+        contexts: Optional[List[RequestContext]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Batched counterpart of ``process_image``.
+
+        Orientation and resize run per image; every OCR pass (quick pass,
+        UNKNOWN retry, SIM std pass, SIM smart pass) is sent to PaddleOCR as
+        one batch.  Images are handled ``batch_size`` at a time so a large
+        backfill never holds more than one chunk of decoded frames in memory.
+        Each item may be a file path, encoded image bytes or a decoded array.
+        ``contexts`` (one per image) receive the per-image metrics.
+        Results are returned in input order.
+        """
+        if contexts is None:
+            contexts = [RequestContext() for _ in images]
+        results: List[Dict[str, Any]] = []
+        for start in range(0, len(images), batch_size):
+            chunk     = images[start:start + batch_size]
+            chunk_ctx = contexts[start:start + batch_size]
+            try:
+                results.extend(self._process_batch(chunk, chunk_ctx))
+            except Exception as e:
+                traceback.print_exc()
+                for ctx in chunk_ctx:
+                    ctx.error_class = type(e).__name__
+                results.extend(
+                    {"status": 500, "error": True, "message": f"Internal Error: {str(e)}"}
+                    for _ in chunk
+                )
+            finally:
+                for ctx in chunk_ctx:
+                    ctx.artifacts = None
+        return results
+
+    def _load_image(self, item: Union[str, bytes, np.ndarray], ctx: RequestContext) -> Optional[np.ndarray]:
+        """Decode one batch item (reduced scale when possible); may raise ``ImageTooLarge``."""
+        if isinstance(item, np.ndarray):
+            return item if item.size else None
+        if isinstance(item, (bytes, bytearray, memoryview)):
+            ingested = self.ingestor.decode(bytes(item))
+        else:
+            ingested = self.ingestor.read(item)
+        if ingested is None:
+            return None
+        ctx.decode_scale = ingested.factor
+        if ingested.encoded is not None:
+            ctx.artifacts = ctx.artifacts or ImageArtifacts()
+            ctx.artifacts.add_encoded(ingested.image, ingested.encoded)
+        return ingested.image
+
+    def _process_batch(
+        self,
+        items: List[Union[str, bytes, np.ndarray]],
+        contexts: List[RequestContext],
+    ) -> List[Dict[str, Any]]:
+        n        = len(items)
+        results    = [None] * n
+        images     = [None] * n
+        oriented   = [None] * n
+        quick_imgs = [None] * n
+        digests    = [None] * n
+        layouts    = [None] * n
+        cache      = self.result_cache
+
+        # ---- Load + orientation + resize (per image), cache lookups ----
+        for i, item in enumerate(items):
+            ctx = contexts[i]
+            if ctx.remaining() <= 0:
+                ctx.skip("all")
+                results[i] = {"status": 504, "error": True,
+                              "message": "Deadline exceeded before processing"}
+                continue
+            if cache is not None and isinstance(item, (bytes, bytearray, memoryview)):
+                with ctx.stage("cache_lookup"):
+                    digests[i] = content_digest(bytes(item))
+                    results[i] = cache.get_exact(digests[i])
+                if results[i] is not None:
+                    ctx.cache = "exact"
+                    continue
+
+            try:
+                with ctx.stage("decode"):
+                    image = self._load_image(item, ctx)
+            except ImageTooLarge as e:
+                results[i] = self._too_large(e)
+                continue
+            if image is None:
+                message = "Image not found" if isinstance(item, str) else "Image could not be decoded"
+                results[i] = {"status": 404 if isinstance(item, str) else 400,
+                              "error": True, "message": message}
+                continue
+
+            if cache is not None and digests[i] is None:
+                with ctx.stage("cache_lookup"):
+                    digests[i] = array_digest(image)
+                    results[i] = cache.get_exact(digests[i])
+                if results[i] is not None:
+                    ctx.cache = "exact"
+                    continue
+            if cache is not None:
+                ctx.cache = "miss"
+
+            images[i] = image
+            oriented[i]   = self._orient(image, ctx)
+            quick_imgs[i] = self._quick_image(oriented[i], ctx)
+
+            layouts[i] = self._classify(oriented[i], ctx)
+            if layouts[i] == "UNKNOWN":
+                ctx.doc_type = "UNKNOWN"
+                results[i]   = {"status": 400, "error": True, "message": "Unknown document type"}
+
+        live = [i for i in range(n) if results[i] is None]
+
+        # ---- Quick pass (batched) ----
+        quick_ocr = [None] * n
+        doc_types = ["UNKNOWN"] * n
+        for i, (res, _) in zip(live, self._run_ocr_batch(
+                [quick_imgs[i] for i in live], [contexts[i] for i in live], "quick_ocr")):
+            quick_ocr[i] = res
+            if layouts[i] is not None:
+                doc_types[i] = "SIM" if layouts[i].startswith("SIM") else layouts[i]
+            else:
+                doc_types[i] = identify_document_type(self._get_texts(res))
+
+        # ---- UNKNOWN retry on the raw image (batched) ----
+        retry_cost = self.stage_costs.estimate("unknown_retry_ocr")
+        unknown    = []
+        for i in live:
+            if doc_types[i] != "UNKNOWN":
+                continue
+            if contexts[i].can_afford(retry_cost):
+                unknown.append(i)
+            else:
+                contexts[i].skip("unknown_retry_ocr")
+        if unknown:
+            logger.info("Batch: %d quick-pass UNKNOWN; retrying on raw images.", len(unknown))
+        for i, (res, _) in zip(unknown, self._run_ocr_batch(
+                [images[i] for i in unknown], [contexts[i] for i in unknown], "unknown_retry_ocr",
+                upright=False)):
+            raw_type = identify_document_type(self._get_texts(res))
+            if raw_type != "UNKNOWN":
+                doc_types[i] = raw_type
+                quick_ocr[i] = res
+                oriented[i]  = images[i]
+                contexts[i].upright = False
+
+        sys.stdout.flush()
+
+        # ---- KTP: the quick pass is already the final OCR ----
+        sims = []
+        for i in live:
+            contexts[i].doc_type = doc_types[i]
+            try:
+                if doc_types[i] == "KTP":
+                    results[i] = self._process_ktp(oriented[i], quick_ocr[i], contexts[i])
+                elif doc_types[i] == "SIM":
+                    sims.append(i)
+                else:
+                    results[i] = {"status": 400, "error": True, "message": "Unknown document type"}
+            except Exception as e:
+                traceback.print_exc()
+                contexts[i].error_class = type(e).__name__
+                results[i] = {"status": 500, "error": True, "message": f"Internal Error: {str(e)}"}
+
+        # ---- SIM std pass (batched) ----
+        std_passes = {}
+        for i, (res, conf) in zip(sims, self._run_ocr_batch(
+                [self._quick_image(oriented[i], contexts[i]) for i in sims],
+                [contexts[i] for i in sims], "sim_std_ocr")):
+            with contexts[i].stage("sim_std_extract"):
+                std_passes[i] = self._sim_std_pass(res, conf, quick_ocr[i])
+
+        # ---- SIM smart pass (batched) ----
+        smart_idx, smart_images = [], []
+        for i in sims:
+            if layouts[i] != "SIM_SMART" and not self._sim_needs_smart(std_passes[i]):
+                contexts[i].sim_path = "std"
+                continue
+            denoise = self._plan_smart_sim(contexts[i])
+            if denoise is None:
+                continue
+            try:
+                stage = "sim_smart_preprocess" if denoise else "sim_smart_preprocess_fast"
+                with contexts[i].stage(stage):
+                    smart_images.append(self.smart_preprocessor.preprocess(
+                        self._full_resolution(images[i], contexts[i]),
+                        denoise=denoise, artifacts=contexts[i].artifacts))
+                smart_idx.append(i)
+            except Exception as e:
+                logger.error("Smart SIM preprocessing failed: %s", e)
+                traceback.print_exc()
+                contexts[i].sim_path = "smart_failed"
+
+        smart_ocr = dict(zip(smart_idx, self._run_ocr_batch(
+            smart_images, [contexts[i] for i in smart_idx], "sim_smart_ocr")))
+
+        for i in sims:
+            try:
+                if i in smart_ocr:
+                    res, conf  = smart_ocr[i]
+                    results[i] = self._sim_finish(std_passes[i], res, conf, contexts[i])
+                else:
+                    results[i] = self._sim_result(std_passes[i]["data"], std_passes[i]["conf"], contexts[i])
+            except Exception as e:
+                traceback.print_exc()
+                contexts[i].error_class = type(e).__name__
+                results[i] = {"status": 500, "error": True, "message": f"Internal Error: {str(e)}"}
+
+        # ---- Engine tiers: poor fast-tier answers go to the heavy tier ----
+        if self.ocr_heavy is not None:
+            for i in live:
+                if images[i] is None:
+                    continue
+                try:
+                    results[i] = self._escalate_tier(
+                        results[i], images[i], oriented[i], quick_imgs[i], contexts[i]
+                    )
+                except Exception as e:
+                    traceback.print_exc()
+                    contexts[i].error_class = type(e).__name__
+                    results[i] = {"status": 500, "error": True, "message": f"Internal Error: {str(e)}"}
+
+        for i in live:
+            ctx = contexts[i]
+            self.stage_costs.observe(ctx.timings)
+            if ctx.skipped_stages:
+                results[i]["skipped_stages"] = list(ctx.skipped_stages)
+            elif cache is not None and results[i].get("status") == 200:
+                cache.put(digests[i], results[i])
+
+        return results
 
     # ------------------------------------------------------------------
     # KTP processing
@@ -307,6 +1164,7 @@ class DocumentProcessor:
         self,
         oriented_image: np.ndarray,
         initial_ocr: Optional[list] = None,
+        ctx: Optional[RequestContext] = None,
     ) -> Dict[str, Any]:
         """
         KTP pipeline (v3):
@@ -318,45 +1176,63 @@ class DocumentProcessor:
           * add_padding(20) adds a white border to prevent OCR edge-clipping
           * No geometric correction, no deskew, no image enhancement
         """
-        # ---- Step A: Minimal resize + border (non-destructive) ----
-        work_image = self.std_preprocessor.add_padding(
-            self.std_preprocessor.resize_keep_aspect(oriented_image, 1000)
-        )
+        ctx = ctx if ctx is not None else RequestContext()
 
-        # ---- Step B: OCR on original image ----
+        # ---- Steps A + B: resize + border, OCR on original image ----
         # Re-use the quick-pass result if it came from the same image,
-        # otherwise run a fresh prediction on work_image.
+        # otherwise read the template field crops or run a fresh prediction
+        # on the minimal resize + border (non-destructive) image.
+        template = None
         if initial_ocr is not None:
             ocr_result = initial_ocr
             ocr_conf   = calculate_ocr_confidence(ocr_result)
-        else:
-            ocr_result, ocr_conf = self._run_ocr(work_image)
+        elif self.template_matcher is not None and ctx.ocr_tier != "heavy":
+            template = self._ktp_template_read(oriented_image, ctx)
+
+        if template is not None:
+            template_fields, ocr_result = template
+            ocr_conf = calculate_ocr_confidence(ocr_result)
+        elif initial_ocr is None:
+            work_image = self._quick_image(oriented_image, ctx)
+            ocr_result, ocr_conf = self._run_ocr(work_image, ctx, "ktp_ocr")
 
         if not ocr_result:
             return {"status": 500, "error": True, "message": "OCR produced no result"}
 
         # ---- Step C: Field extraction ----
-        raw_data = self.ktp_extractor.process_ktp(ocr_result, return_trace=False)
+        # Template reads are already keyed by field; only the value clean-up
+        # of the extractor applies.
+        with ctx.stage("ktp_extract"):
+            if template is not None:
+                raw_data = self.ktp_extractor.cleanup_data(template_fields)
+            else:
+                raw_data = self.ktp_extractor.process_ktp(ocr_result, return_trace=False)
 
         # ---- Step D: NIK fuzzy repair + date normalization ----
-        ocr_items     = self._build_ocr_items(ocr_result)
-        repaired_data = self.ktp_post.repair(raw_data, ocr_items=ocr_items)
+        with ctx.stage("ktp_repair"):
+            ocr_items     = self._build_ocr_items(ocr_result)
+            repaired_data = self.ktp_post.repair(raw_data, ocr_items=ocr_items)
 
         # ---- Step E: Bidirectional NIK ↔ field cross-validation ----
-        repaired_data = self.cross_validator.validate_and_repair(repaired_data)
-        cross_val     = repaired_data.pop("_cross_val", None)
+        with ctx.stage("ktp_cross_validate"):
+            repaired_data = self.cross_validator.validate_and_repair(repaired_data)
+            cross_val     = repaired_data.pop("_cross_val", None)
 
         # ---- Step F: Format to JSON ----
-        json_output = format_to_target_json(repaired_data)
+        with ctx.stage("ktp_format"):
+            json_output = format_to_target_json(repaired_data)
 
         # ---- Step G: Confidence scoring ----
-        report = self.scorer.score(json_output.get("data", {}))
+        with ctx.stage("ktp_score"):
+            report = self.scorer.score(json_output.get("data", {}))
         if self.debug:
             print_report(report)
 
         # Apply the cross-validation delta to the composite score
         cv_delta     = getattr(cross_val, "confidence_delta", 0.0) if cross_val else 0.0
         final_score  = max(0.0, min(1.0, report.overall + cv_delta))
+        ctx.ocr_conf     = ocr_conf
+        ctx.completeness = 0.0 if report.missing_critical else final_score
 
         # json_output["confidence"] = {
         #     "overall":          round(final_score, 4),
@@ -394,17 +1270,202 @@ class DocumentProcessor:
         # )
         return json_output
 
+    def _ktp_template_read(
+        self, oriented_image: np.ndarray, ctx: RequestContext
+    ) -> Optional[Tuple[Dict[str, str], list]]:
+        """
+        Read the KTP fields from template crops.
+
+        Returns ``(fields, ocr_result)`` where ``ocr_result`` has the
+        PaddleOCR result shape (one polygon and text per crop), or ``None``
+        when the fit or its verification fails.
+        """
+        with ctx.stage("ktp_template_fit"):
+            fit = self.template_matcher.fit(oriented_image, ctx.face_boxes)
+            crops = self.template_matcher.crop_fields(oriented_image, fit) if fit is not None else None
+        if crops is None:
+            logger.info("KTP template: no acceptable fit; running full OCR.")
+            ctx.ktp_path = "template_rejected"
+            return None
+
+        ctx.ocr_calls += 1
+        with ctx.stage("ktp_template_rec"):
+            try:
+                results = list(self.recognizer.predict(list(crops.values())))
+            except Exception as e:
+                logger.warning("KTP template recognition failed: %s", e)
+                results = []
+        if len(results) != len(crops):
+            ctx.ktp_path = "template_rejected"
+            return None
+
+        texts  = {name: res["rec_text"] for name, res in zip(crops, results)}
+        fields = self.template_matcher.read_fields(texts)
+        if fields is None:
+            logger.info("KTP template: PROVINSI / NIK verification failed; running full OCR.")
+            ctx.ktp_path = "template_rejected"
+            return None
+
+        polygons = self.template_matcher.field_polygons(fit)
+        ocr_result = [{
+            "dt_polys":   [polygons[name] for name in crops],
+            "rec_texts":  list(texts.values()),
+            "rec_scores": [float(res["rec_score"]) for res in results],
+        }]
+        logger.info("KTP template: fit residual=%.4f, %d crops recognised.", fit.residual, len(crops))
+        ctx.ktp_path = "template"
+        return fields, ocr_result
+
     # ------------------------------------------------------------------
     # SIM processing (unchanged)
     # ------------------------------------------------------------------
 
     def _process_sim(
-        self, raw_image, oriented_image, initial_ocr
+        self, raw_image, oriented_image, initial_ocr,
+        ctx: Optional[RequestContext] = None,
+        layout: Optional[str] = None,
     ) -> Dict[str, Any]:
-        std_image = self.std_preprocessor.add_padding(
-            self.std_preprocessor.resize_keep_aspect(oriented_image, 1000)
+        ctx = ctx if ctx is not None else RequestContext()
+
+        # The card is known to be a SIM.  While its std OCR is still to run
+        # (classifier-routed, or after the raw-image retry), smart work
+        # started now overlaps it; a quick-pass SIM has the std OCR memoised.
+        std_image   = self._quick_image(oriented_image, ctx)
+        speculation = None
+        if self._ocr_pending(std_image, ctx) and (
+                layout == "SIM_SMART" or self._quality_suggests_smart(oriented_image, ctx)):
+            speculation = self._speculate_smart(raw_image, ctx)
+
+        # A card the classifier already places as SIM_SMART would end up on
+        # the smart path anyway: run it first and skip the std pass when the
+        # smart extraction is complete on its own.
+        smart = None
+        if layout == "SIM_SMART" and speculation is None:
+            smart = self._smart_sim_ocr(raw_image, ctx)
+            if smart is not None:
+                with ctx.stage("sim_smart_extract"):
+                    data_smart  = self.sim_extractor.process_sim(smart[0])
+                    score_smart = self.calculate_sim_completeness(data_smart)
+                if score_smart >= self.SIM_MIN_SCORE and smart[1] >= self.SIM_MIN_CONF:
+                    ctx.sim_path = "smart"
+                    return self._sim_result(data_smart, smart[1], ctx)
+
+        ocr_result_std, conf_std = self._run_ocr(std_image, ctx, "sim_std_ocr")
+        with ctx.stage("sim_std_extract"):
+            std = self._sim_std_pass(ocr_result_std, conf_std, initial_ocr)
+
+        if smart is None and not self._sim_needs_smart(std):
+            self._cancel_speculation(speculation, ctx)
+            ctx.sim_path = "std"
+            return self._sim_result(std["data"], std["conf"], ctx)
+
+        if smart is None and speculation is not None:
+            smart = self._collect_speculation(speculation, ctx)
+        elif smart is None:
+            smart = self._smart_sim_ocr(raw_image, ctx)
+        if smart is not None:
+            return self._sim_finish(std, smart[0], smart[1], ctx)
+        return self._sim_result(std["data"], std["conf"], ctx)
+
+    # ------------------------------------------------------------------
+    # Speculation
+    # ------------------------------------------------------------------
+
+    def _quality_suggests_smart(self, image: np.ndarray, ctx: RequestContext) -> bool:
+        """Capture-quality hint that the std pass will miss the thresholds."""
+        if self._speculation_pool is None:
+            return False
+        q = (ctx.artifacts.quality(image) if ctx.artifacts is not None
+             else self.smart_preprocessor.quality_assessor.assess(image))
+        return q["is_blurry"] or q["is_dark"] or q["is_overexposed"] or q["is_low_contrast"]
+
+    def _ocr_pending(self, image: np.ndarray, ctx: RequestContext) -> bool:
+        """``image`` has not been inferred yet within ``ctx`` (current tier)."""
+        heavy = ctx.ocr_tier == "heavy" and self.ocr_heavy is not None
+        return self._ocr_memo_key(image, heavy) not in ctx.ocr_memo
+
+    def _speculate_smart(self, raw_image, ctx: RequestContext) -> Optional[SmartSpeculation]:
+        if self._speculation_pool is None:
+            return None
+        denoise = self._smart_sim_mode(ctx)
+        if denoise is None:
+            return None
+        # The worker never touches ``ctx``: it records on a private context
+        # that the collecting thread merges, and keeps its own reference to
+        # the artifacts, which outlive ``ctx.artifacts`` if the request ends.
+        shadow = RequestContext(
+            request_id=ctx.request_id, deadline=ctx.deadline, upright=ctx.upright,
+            ocr_tier=ctx.ocr_tier, artifacts=ctx.artifacts,
+        )
+        cancelled = threading.Event()
+        future    = self._speculation_pool.submit(
+            self._speculative_smart_work, raw_image, denoise, cancelled, shadow
         )
-        ocr_result_std, conf_std = self._run_ocr(std_image)
+        return SmartSpeculation(future, cancelled, denoise)
+
+    def _speculative_smart_work(self, raw_image, denoise: bool, cancelled, shadow: RequestContext):
+        """
+        Background half of the smart path, recorded on ``shadow``; returns
+        ``(smart_image or None if cancelled, ocr or None, shadow)``.
+        """
+        if cancelled.is_set():
+            return None, None, shadow
+        stage = "sim_smart_preprocess" if denoise else "sim_smart_preprocess_fast"
+        with shadow.stage(stage):
+            smart_image = self.smart_preprocessor.preprocess(
+                self._full_resolution(raw_image, shadow), denoise=denoise,
+                artifacts=shadow.artifacts, cancelled=cancelled,
+            )
+        if smart_image is None or cancelled.is_set():
+            return None, None, shadow
+        if self.sim_speculation == SPECULATE_OCR:
+            return smart_image, self._run_ocr(smart_image, shadow, "sim_smart_ocr"), shadow
+        return smart_image, None, shadow
+
+    def _collect_speculation(
+        self, speculation: SmartSpeculation, ctx: RequestContext
+    ) -> Optional[Tuple[Optional[list], float]]:
+        """Wait for speculative smart work and finish it on this thread."""
+        ctx.speculation = "used"
+        if not speculation.denoise:
+            ctx.skip("denoise")
+        try:
+            smart_image, smart, shadow = speculation.future.result()
+            ctx.merge(shadow)
+            if smart is None:
+                smart = self._run_ocr(smart_image, ctx, "sim_smart_ocr")
+            return smart
+        except Exception as e:
+            logger.error("Smart SIM path failed: %s", e)
+            traceback.print_exc()
+            ctx.sim_path = "smart_failed"
+            return None
+
+    @staticmethod
+    def _cancel_speculation(speculation: Optional[SmartSpeculation], ctx: RequestContext) -> None:
+        if speculation is not None:
+            speculation.cancel()
+            ctx.speculation = "cancelled"
+
+    def _smart_sim_ocr(self, raw_image, ctx: RequestContext) -> Optional[Tuple[Optional[list], float]]:
+        """Smart preprocessing + OCR within the deadline; None if skipped or failed."""
+        denoise = self._plan_smart_sim(ctx)
+        if denoise is None:
+            return None
+        try:
+            stage = "sim_smart_preprocess" if denoise else "sim_smart_preprocess_fast"
+            with ctx.stage(stage):
+                smart_image = self.smart_preprocessor.preprocess(
+                    self._full_resolution(raw_image, ctx), denoise=denoise, artifacts=ctx.artifacts)
+            return self._run_ocr(smart_image, ctx, "sim_smart_ocr")
+        except Exception as e:
+            logger.error("Smart SIM path failed: %s", e)
+            traceback.print_exc()
+            ctx.sim_path = "smart_failed"
+            return None
+
+    def _sim_std_pass(self, ocr_result_std, conf_std, initial_ocr) -> Dict[str, Any]:
+        """Extract SIM fields from the standard (1000 px) OCR pass."""
         if ocr_result_std is None:
             ocr_result_std = initial_ocr
             conf_std       = calculate_ocr_confidence(initial_ocr)
@@ -418,26 +1479,71 @@ class DocumentProcessor:
             "SIM: version=%s std_score=%.1f conf=%.2f",
             sim_version, score_std, conf_std,
         )
+        return {"data": data_std, "score": score_std, "conf": conf_std, "version": sim_version}
 
-        if sim_version == "SMART" or score_std < 4.0 or conf_std < 0.70:
-            try:
-                smart_image = self.smart_preprocessor.preprocess(raw_image)
-                ocr_smart, conf_smart = self._run_ocr(smart_image)
-                data_smart  = self.sim_extractor.process_sim(ocr_smart)
-                score_smart = self.calculate_sim_completeness(data_smart)
+    SIM_MIN_SCORE = 4.0     # completeness below which the smart path is tried
+    SIM_MIN_CONF  = 0.70    # mean OCR confidence below which the smart path is tried
 
-                logger.info(
-                    "SIM smart path: score=%.1f conf=%.2f", score_smart, conf_smart
-                )
+    @classmethod
+    def _sim_needs_smart(cls, std: Dict[str, Any]) -> bool:
+        return (std["version"] == "SMART" or std["score"] < cls.SIM_MIN_SCORE
+                or std["conf"] < cls.SIM_MIN_CONF)
 
-                if score_smart >= score_std:
-                    final_data = self.merge_sim_data(data_smart, data_std)
-                    return format_sim_to_json(final_data)
-            except Exception as e:
-                logger.error("Smart SIM path failed: %s", e)
-                traceback.print_exc()
+    def _smart_sim_mode(self, ctx: RequestContext) -> Optional[bool]:
+        """
+        Fit the smart SIM path into the remaining budget.
+
+        Returns ``True`` for the full path, ``False`` for the path without
+        ``fastNlMeansDenoisingColored`` and ``None`` when even that would
+        overrun.
+        """
+        tail = self.stage_costs.estimate("sim_smart_ocr", "sim_smart_extract")
+        if ctx.can_afford(self.stage_costs.estimate("sim_smart_preprocess") + tail):
+            return True
+        if ctx.can_afford(self.stage_costs.estimate("sim_smart_preprocess_fast") + tail):
+            return False
+        return None
+
+    def _plan_smart_sim(self, ctx: RequestContext) -> Optional[bool]:
+        """``_smart_sim_mode`` that also records the degradation on ``ctx``."""
+        denoise = self._smart_sim_mode(ctx)
+        if denoise is False:
+            logger.info("SIM smart path: skipping denoise to meet the deadline.")
+            ctx.skip("denoise")
+        elif denoise is None:
+            logger.info("SIM smart path: skipped, %.2fs left.", ctx.remaining())
+            ctx.skip("sim_smart")
+            ctx.sim_path = "smart_skipped"
+        return denoise
+
+    def _sim_finish(
+        self, std: Dict[str, Any], ocr_smart, conf_smart,
+        ctx: Optional[RequestContext] = None,
+    ) -> Dict[str, Any]:
+        """Keep the smart-path extraction when it is at least as complete as std."""
+        ctx = ctx if ctx is not None else RequestContext()
+        with ctx.stage("sim_smart_extract"):
+            data_smart  = self.sim_extractor.process_sim(ocr_smart)
+            score_smart = self.calculate_sim_completeness(data_smart)
+
+        logger.info(
+            "SIM smart path: score=%.1f conf=%.2f", score_smart, conf_smart
+        )
+
+        if score_smart >= std["score"]:
+            ctx.sim_path = "smart"
+            final_data = self.merge_sim_data(data_smart, std["data"])
+            return self._sim_result(final_data, conf_smart, ctx)
+        ctx.sim_path = "smart_rejected"
+        return self._sim_result(std["data"], std["conf"], ctx)
+
+    SIM_MAX_SCORE = 6.0     # calculate_sim_completeness of a fully read card
 
-        return format_sim_to_json(data_std)
+    def _sim_result(self, data, conf: float, ctx: RequestContext) -> Dict[str, Any]:
+        """Format SIM data and record its quality for the tier decision."""
+        ctx.ocr_conf     = conf
+        ctx.completeness = self.calculate_sim_completeness(data) / self.SIM_MAX_SCORE
+        return format_sim_to_json(data)
 
     # ------------------------------------------------------------------
 
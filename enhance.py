@@ -0,0 +1,181 @@
+"""
+enhance.py
+----------
+Denoising for the SIM smart path, chosen per image.
+
+``SmartSIMPreprocessor._enhance_details`` applies CLAHE to the L channel and
+then denoises.  Colour non-local means (the original step) can take longer
+than the OCR pass on a phone photo.  ``EnhancementEngine`` offers cheaper
+alternatives:
+
+  * ``nlmeans``   — ``fastNlMeansDenoisingColored`` on the BGR image (original)
+  * ``l_nlmeans`` — non-local means on L only, at most ``work_width`` px wide;
+    the correction is upsampled onto the full-resolution L channel
+  * ``guided``    — self-guided filter on L (box filters, linear time)
+  * ``bilateral`` — bilateral filter on L
+  * ``none``      — CLAHE only
+  * ``auto``      — per image from the noise estimate in
+    ``ImageQualityAssessor.assess``: clean captures skip denoising, moderate
+    noise gets the guided filter and heavy noise ``l_nlmeans``
+
+Non-local means runs through ``TiledExecutor``.  It cuts the image into
+tiles that overlap by more than the search + template radius and filters
+them concurrently (OpenCV releases the GIL).  Tile interiors are stitched
+back, so the result matches a single whole-image call.
+
+``benchmark_enhance.py`` compares SIM field accuracy against time per mode.
+
+Usage
+-----
+    engine   = EnhancementEngine(mode="auto", threads=4)
+    algo     = engine.select(quality)          # quality = ImageQualityAssessor.assess(img)
+    enhanced = engine.to_bgr(lab, algo)        # lab: CLAHE'd LAB image
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import cv2
+import numpy as np
+
+ENHANCE_MODES = ("nlmeans", "l_nlmeans", "guided", "bilateral", "none", "auto")
+
+# Immerkær's noise estimator: a Laplacian-difference kernel that cancels
+# smooth image structure, leaving mostly sensor noise
+_NOISE_KERNEL = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+
+# Non-local means parameters of the original step
+NLM_H, NLM_TEMPLATE, NLM_SEARCH = 3, 7, 21
+
+
+def estimate_noise(gray: np.ndarray) -> float:
+    """Gaussian noise sigma of an 8-bit grayscale image (Immerkær, 1996)."""
+    h, w = gray.shape[:2]
+    if h < 3 or w < 3:
+        return 0.0
+    response = cv2.filter2D(gray, cv2.CV_16S, _NOISE_KERNEL)
+    total    = cv2.norm(response[1:-1, 1:-1], cv2.NORM_L1)
+    return float(np.sqrt(np.pi / 2) * total / (6.0 * (w - 2) * (h - 2)))
+
+
+def guided_filter(image: np.ndarray, radius: int = 4, eps: float = 64.0) -> np.ndarray:
+    """Self-guided filter (He et al.) on an 8-bit single-channel image."""
+    src    = image.astype(np.float32)
+    ksize  = (2 * radius + 1, 2 * radius + 1)
+    mean   = cv2.boxFilter(src, -1, ksize)
+    var    = cv2.boxFilter(src * src, -1, ksize) - mean * mean
+    a      = var / (var + eps)
+    b      = mean - a * mean
+    out    = cv2.boxFilter(a, -1, ksize) * src + cv2.boxFilter(b, -1, ksize)
+    return np.clip(out, 0, 255).astype(np.uint8)
+
+
+# ---------------------------------------------------------------------------
+# Tiled execution
+# ---------------------------------------------------------------------------
+
+class TiledExecutor:
+    """Run a neighbourhood filter over overlapping tiles on a thread pool."""
+
+    def __init__(self, threads: int = 4, tile: int = 512, overlap: int = 16):
+        self.threads = threads
+        self.tile    = tile
+        self.overlap = overlap
+        # Threads are created on first use, i.e. after any pre-fork.
+        self._pool = (
+            ThreadPoolExecutor(max_workers=threads, thread_name_prefix="enhance")
+            if threads > 1 else None
+        )
+
+    def run(self, fn: Callable[[np.ndarray], np.ndarray], image: np.ndarray) -> np.ndarray:
+        """``fn(image)``, tile by tile; ``fn`` must keep shape and dtype."""
+        h, w = image.shape[:2]
+        if self._pool is None or (h <= self.tile and w <= self.tile):
+            return fn(image)
+
+        out, pad, jobs = np.empty_like(image), self.overlap, []
+        for y in range(0, h, self.tile):
+            for x in range(0, w, self.tile):
+                y1, x1 = min(y + self.tile, h), min(x + self.tile, w)
+                ys, xs = max(0, y - pad), max(0, x - pad)
+                ye, xe = min(h, y1 + pad), min(w, x1 + pad)
+                tile   = np.ascontiguousarray(image[ys:ye, xs:xe])
+                jobs.append(((y, y1, x, x1, ys, xs), self._pool.submit(fn, tile)))
+        for (y, y1, x, x1, ys, xs), job in jobs:
+            out[y:y1, x:x1] = job.result()[y - ys:y1 - ys, x - xs:x1 - xs]
+        return out
+
+
+# ---------------------------------------------------------------------------
+# Engine
+# ---------------------------------------------------------------------------
+
+class EnhancementEngine:
+    """Selectable denoising step after CLAHE on the smart SIM path."""
+
+    def __init__(
+        self,
+        mode: str = "nlmeans",
+        threads: int = 4,
+        tile: int = 512,
+        work_width: int = 1600,
+        noise_low: float = 1.5,
+        noise_high: float = 5.0,
+    ):
+        if mode not in ENHANCE_MODES:
+            raise ValueError(f"Unknown enhancement mode {mode!r}; expected one of {ENHANCE_MODES}")
+        self.mode       = mode
+        self.work_width = work_width
+        self.noise_low  = noise_low
+        self.noise_high = noise_high
+        # Tiles must overlap by the search + template radius to match a whole-image call
+        self.tiles = TiledExecutor(threads, tile, overlap=max(16, NLM_SEARCH // 2 + NLM_TEMPLATE // 2))
+
+    # ------------------------------------------------------------------
+    def select(self, quality: Optional[dict]) -> str:
+        """The algorithm for one image (``mode`` unless it is ``auto``)."""
+        if self.mode != "auto":
+            return self.mode
+        noise = (quality or {}).get("noise")
+        if noise is None:
+            return "nlmeans"
+        if noise < self.noise_low:
+            return "none"
+        if noise < self.noise_high or (quality or {}).get("is_blurry"):
+            # Edge-preserving and cheap; NL-means smears already soft strokes
+            return "guided"
+        return "l_nlmeans"
+
+    def to_bgr(self, lab: np.ndarray, algorithm: str) -> np.ndarray:
+        """Denoise a LAB image with ``algorithm`` and return BGR; ``lab`` may be modified."""
+        if algorithm == "nlmeans":
+            return self.tiles.run(
+                lambda t: cv2.fastNlMeansDenoisingColored(t, None, NLM_H, NLM_H, NLM_TEMPLATE, NLM_SEARCH),
+                cv2.cvtColor(lab, cv2.COLOR_LAB2BGR),
+            )
+        if algorithm != "none":
+            lab[:, :, 0] = self.denoise_l(np.ascontiguousarray(lab[:, :, 0]), algorithm)
+        return cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+
+    def denoise_l(self, l_channel: np.ndarray, algorithm: str) -> np.ndarray:
+        if algorithm == "guided":
+            return guided_filter(l_channel)
+        if algorithm == "bilateral":
+            return cv2.bilateralFilter(l_channel, 5, 25, 5)
+        if algorithm == "l_nlmeans":
+            return self._l_nlmeans(l_channel)
+        raise ValueError(f"Unknown enhancement algorithm {algorithm!r}")
+
+    def _l_nlmeans(self, l_channel: np.ndarray) -> np.ndarray:
+        nlm = lambda t: cv2.fastNlMeansDenoising(t, None, NLM_H, NLM_TEMPLATE, NLM_SEARCH)
+        h, w  = l_channel.shape[:2]
+        scale = self.work_width / w
+        if scale >= 1.0:
+            return self.tiles.run(nlm, l_channel)
+        # The output is resized to at most work_width anyway: estimate the
+        # correction there and upsample it onto the full-resolution channel
+        small      = cv2.resize(l_channel, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        correction = cv2.subtract(self.tiles.run(nlm, small), small, dtype=cv2.CV_16S)
+        correction = cv2.resize(correction, (w, h), interpolation=cv2.INTER_LINEAR)
+        return cv2.add(l_channel, correction, dtype=cv2.CV_8U)
+
@@ -0,0 +1,112 @@
+"""
+image_artifacts.py
+------------------
+Per-request store of images derived from the upload.
+
+Within one request the same derived images are needed by several stages:
+the grayscale copies (edge and line detection), the 1000 px resize (quick pass, KTP OCR, SIM std pass, SIM deskew), the 1280 px
+resize (SIM geometric correction) and the quality statistics.
+``ImageArtifacts`` builds each on first use and hands the same array to every
+later caller.  Nothing full-resolution is kept except the oriented image the
+pipeline holds anyway, so a 12 MP upload is not copied once per stage.
+
+Artifacts are keyed by the source array object.  The store keeps a reference
+to every source, so keys stay unique for the request's lifetime.  A
+right-angle rotation registered with ``add_rotation`` shares the
+rotation-invariant quality statistics with its source.  The store also holds
+the request's orientation decision.  When the upload was decoded at
+reduced scale (``ingest.Ingestor``), ``full_resolution`` decodes it at full
+size for the one stage that needs it.  Concurrent stages (speculative SIM work)
+may read it; a value built twice by a race is simply kept once.
+
+The caller drops the store when the request ends (``RequestContext``
+never pickles it), so nothing outlives the request.
+
+Usage
+-----
+    artifacts = ImageArtifacts()
+    oriented  = artifacts.oriented(image, engine)        # decided once
+    gray      = artifacts.gray(oriented)
+    small     = artifacts.resized(oriented, 1000, preprocessor.resize_keep_aspect)
+    quality   = artifacts.quality(image)
+"""
+
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from ingest import decode_full
+
+
+class ImageArtifacts:
+    """Lazily derived images of one request, shared by every stage."""
+
+    def __init__(self):
+        self._slots: Dict[int, Tuple[np.ndarray, Dict[Hashable, Any]]] = {}
+        self._rotation_of: Dict[int, np.ndarray] = {}
+        self._encoded: Dict[int, bytes] = {}
+        self.orientation = None                  # orientation.Orientation once decided
+
+    # ------------------------------------------------------------------
+    def derived(self, image: np.ndarray, key: Hashable, build: Callable[[], Any]) -> Any:
+        """``build()`` once per (image, key)."""
+        _, cache = self._slots.setdefault(id(image), (image, {}))
+        if key not in cache:
+            cache.setdefault(key, build())
+        return cache[key]
+
+    def add_rotation(self, source: np.ndarray, rotated: np.ndarray) -> None:
+        """Mark ``rotated`` as a right-angle rotation of ``source``."""
+        if rotated is not source:
+            self._rotation_of[id(rotated)] = source
+            self._slots.setdefault(id(rotated), (rotated, {}))
+
+    def add_encoded(self, image: np.ndarray, encoded: bytes) -> None:
+        """Mark ``image`` as a reduced-scale decode of ``encoded``."""
+        self._slots.setdefault(id(image), (image, {}))
+        self._encoded[id(image)] = encoded
+
+    def full_resolution(self, image: np.ndarray) -> np.ndarray:
+        """``image`` at full resolution; the upload is decoded on first use."""
+        encoded = self._encoded.get(id(image))
+        if encoded is None:
+            return image
+        def build():
+            full = decode_full(encoded)
+            return full if full is not None else image
+        return self.derived(image, "full", build)
+
+    # ------------------------------------------------------------------
+    def gray(self, image: np.ndarray) -> np.ndarray:
+        if image.ndim == 2:
+            return image
+        return self.derived(image, "gray", lambda: cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+
+    def resized(self, image: np.ndarray, width: int, resize: Callable) -> np.ndarray:
+        """Pyramid level ``width`` px wide, built by ``resize(image, width)``."""
+        return self.derived(image, ("resized", width), lambda: resize(image, width))
+
+    def quality(self, image: np.ndarray) -> dict:
+        """``ImageQualityAssessor.assess`` (unchanged by right-angle rotations)."""
+        from image_preprocessor import ImageQualityAssessor
+        source = self._rotation_of.get(id(image), image)
+        return self.derived(source, "quality", lambda: ImageQualityAssessor.assess(source))
+
+    # ------------------------------------------------------------------
+    def oriented(self, image: np.ndarray, engine=None) -> np.ndarray:
+        """``image`` turned upright; the decision is made by ``engine`` once."""
+        def build():
+            if self.orientation is None:
+                self.orientation = engine.detect(image)
+            rotated = self.orientation.apply(image)
+            self.add_rotation(image, rotated)
+            return rotated
+        return self.derived(image, "oriented", build)
+
+
+def gray_of(image: np.ndarray, artifacts: Optional[ImageArtifacts] = None) -> np.ndarray:
+    """Grayscale ``image``, from ``artifacts`` when given."""
+    if artifacts is not None:
+        return artifacts.gray(image)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
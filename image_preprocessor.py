@@ -3,6 +3,10 @@ import numpy as np
 import os
 import math
 
+from orientation import OrientationEngine
+from image_artifacts import gray_of
+from enhance import EnhancementEngine, estimate_noise
+
 
 # ---------------------------------------------------------------------------
 # Quality Assessment
@@ -11,33 +15,39 @@ import math
 class ImageQualityAssessor:
     """Measures image quality to drive adaptive preprocessing decisions."""
 
+    # Statistics come from cv2.meanStdDev: no float64 copy of a 12 MP frame.
+    # The 8-bit Laplacian fits int16 exactly, so CV_16S gives the same variance.
+
     @staticmethod
     def blur_score(image: np.ndarray) -> float:
         """Laplacian variance — higher = sharper. Blurry images score < 80."""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
-        return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+        _, std = cv2.meanStdDev(cv2.Laplacian(gray_of(image), cv2.CV_16S))
+        return float(std[0, 0]) ** 2
 
     @staticmethod
     def brightness(image: np.ndarray) -> float:
         """Mean pixel brightness [0-255]."""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
-        return float(np.mean(gray))
+        return float(cv2.meanStdDev(gray_of(image))[0][0, 0])
 
     @staticmethod
     def contrast(image: np.ndarray) -> float:
         """Standard deviation of brightness [0-128]."""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
-        return float(np.std(gray))
+        return float(cv2.meanStdDev(gray_of(image))[1][0, 0])
 
     @classmethod
     def assess(cls, image: np.ndarray) -> dict:
-        blur   = cls.blur_score(image)
-        bright = cls.brightness(image)
-        cont   = cls.contrast(image)
+        gray       = gray_of(image)        # converted once for all three measures
+        blur       = cls.blur_score(gray)
+        mean, std  = cv2.meanStdDev(gray)
+        bright     = float(mean[0, 0])
+        cont       = float(std[0, 0])
+        noise      = estimate_noise(gray)
         return {
             "blur":            blur,
             "brightness":      bright,
             "contrast":        cont,
+            "noise":           noise,
+            "is_noisy":        noise  > 5.0,
             "is_blurry":       blur   < 80,
             "is_very_blurry":  blur   < 30,
             "is_dark":         bright < 60,
@@ -54,7 +64,10 @@ def unsharp_mask(image: np.ndarray, sigma: float = 1.0, strength: float = 1.5) -
     """Sharpen an image via unsharp masking."""
     blurred = cv2.GaussianBlur(image, (0, 0), sigma)
     sharpened = cv2.addWeighted(image, 1.0 + strength, blurred, -strength, 0)
-    return np.clip(sharpened, 0, 255).astype(np.uint8)
+    # 8-bit output is already saturated by addWeighted; no clipped copies
+    if sharpened.dtype != np.uint8:
+        sharpened = np.clip(sharpened, 0, 255).astype(np.uint8)
+    return sharpened
 
 
 def normalize_exposure(image: np.ndarray, clip_limit: float = 3.0) -> np.ndarray:
@@ -74,7 +87,7 @@ def normalize_exposure(image: np.ndarray, clip_limit: float = 3.0) -> np.ndarray
 # ---------------------------------------------------------------------------
 
 class StandardPreprocessor:
-    def __init__(self, debug=False, debug_dir="preprocess_debug"):
+    def __init__(self, debug=False, debug_dir="preprocess_debug", orientation_engine=None):
         self.TARGET_RATIO  = 1.58
         self.MIN_AREA_RATIO = 0.05
         self.PROCESSING_WIDTH = 1280
@@ -85,9 +98,9 @@ class StandardPreprocessor:
         if self.debug:
             os.makedirs(self.debug_dir, exist_ok=True)
 
-        cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        self.face_cascade    = cv2.CascadeClassifier(cascade_path)
         self.quality_assessor = ImageQualityAssessor()
+        # Shared between preprocessors so the search threads exist once
+        self.orientation_engine = orientation_engine or OrientationEngine()
 
     # ------------------------------------------------------------------
     def resize_keep_aspect(self, image, target_width):
@@ -98,13 +111,25 @@ class StandardPreprocessor:
         interp = cv2.INTER_LANCZOS4 if scale < 1.0 else cv2.INTER_LINEAR
         return cv2.resize(image, None, fx=scale, fy=scale, interpolation=interp)
 
+    def _resized(self, image, target_width, artifacts=None):
+        if artifacts is None:
+            return self.resize_keep_aspect(image, target_width)
+        return artifacts.resized(image, target_width, self.resize_keep_aspect)
+
+    def _oriented(self, image, artifacts=None):
+        if artifacts is None:
+            return self.correct_orientation_semantic(image)
+        return artifacts.oriented(image, self.orientation_engine)
+
     # ------------------------------------------------------------------
-    def preprocess(self, image):
+    def preprocess(self, image, artifacts=None):
+        """``artifacts``: the request's ``ImageArtifacts``, shared with other stages."""
         h, w = image.shape[:2]
         if w > self.PROCESSING_WIDTH:
-            image = self.resize_keep_aspect(image, self.PROCESSING_WIDTH)
+            image = self._resized(image, self.PROCESSING_WIDTH, artifacts)
 
-        quality = self.quality_assessor.assess(image)
+        quality = (artifacts.quality(image) if artifacts is not None
+                   else self.quality_assessor.assess(image))
 
         # Pre-enhance dark / low-contrast images before other steps
         if quality["is_dark"] or quality["is_low_contrast"]:
@@ -113,15 +138,15 @@ class StandardPreprocessor:
             if self.debug:
                 self._save(image, "std_00_exposure_fixed")
 
-        oriented_image = self.correct_orientation_semantic(image)
+        oriented_image = self._oriented(image, artifacts)
         if self.debug:
             self._save(oriented_image, "std_01_oriented")
 
-        warped, _ = self.geometric_correction(oriented_image)
+        warped, _ = self.geometric_correction(oriented_image, artifacts)
         if self.debug:
             self._save(warped, "std_02_warped")
 
-        deskewed = self.deskew_hough(warped)
+        deskewed = self.deskew_hough(warped, artifacts)
         if self.debug:
             self._save(deskewed, "std_03_deskewed")
 
@@ -149,7 +174,7 @@ class StandardPreprocessor:
         )
 
     # ------------------------------------------------------------------
-    def minimal_preprocess(self, image: np.ndarray) -> np.ndarray:
+    def minimal_preprocess(self, image: np.ndarray, artifacts=None) -> np.ndarray:
         """
         Non-destructive KTP preprocessing path (v3 — authoritative).
 
@@ -169,36 +194,21 @@ class StandardPreprocessor:
         KTP images arriving at the API are assumed to be high quality.
         Preserving the original pixel data maximises OCR accuracy.
         """
-        oriented = self.correct_orientation_semantic(image)
-        resized  = self.resize_keep_aspect(oriented, self.OUTPUT_WIDTH)
+        oriented = self._oriented(image, artifacts)
+        resized  = self._resized(oriented, self.OUTPUT_WIDTH, artifacts)
         return self.add_padding(resized)
 
     # ------------------------------------------------------------------
     def correct_orientation_semantic(self, image):
-        h, w = image.shape[:2]
-        scale = 600 / max(h, w)
-        small = cv2.resize(image, None, fx=scale, fy=scale)
-
-        best_angle = 0
-        max_faces  = 0
-
-        for angle in [0, 90, 180, 270]:
-            rotated = small if angle == 0 else self.rotate_image_90(small, angle)
-            gray    = cv2.cvtColor(rotated, cv2.COLOR_BGR2GRAY)
-            faces   = self.face_cascade.detectMultiScale(
-                gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30)
-            )
-            if len(faces) > max_faces:
-                max_faces = len(faces)
-                best_angle = angle
-
-        if max_faces == 0:
-            # Fallback: identity cards are landscape — rotate portrait images
-            if h > w:
-                return self.rotate_image_90(image, 90)
-            return image
+        return self.orient_with_faces(image)[0]
 
-        return self.rotate_image_90(image, best_angle)
+    def orient_with_faces(self, image):
+        """
+        ``correct_orientation_semantic`` that also returns the face boxes
+        ``[(x, y, w, h), ...]`` it found, in oriented full-resolution pixels.
+        """
+        orientation = self.orientation_engine.detect(image)
+        return orientation.apply(image), orientation.faces
 
     # ------------------------------------------------------------------
     def rotate_image_90(self, image, angle):
@@ -209,9 +219,9 @@ class StandardPreprocessor:
         return image
 
     # ------------------------------------------------------------------
-    def geometric_correction(self, image):
+    def geometric_correction(self, image, artifacts=None):
         h, w   = image.shape[:2]
-        gray   = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        gray   = gray_of(image, artifacts)
         blurred = cv2.GaussianBlur(gray, (5, 5), 0)
         edged  = cv2.Canny(blurred, 30, 100)
         kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
@@ -265,9 +275,9 @@ class StandardPreprocessor:
         return False
 
     # ------------------------------------------------------------------
-    def deskew_hough(self, image):
+    def deskew_hough(self, image, artifacts=None):
         h, w = image.shape[:2]
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        gray = gray_of(image, artifacts)
 
         mx, my = int(w * 0.2), int(h * 0.2)
         roi = gray[my:h - my, mx:w - mx]
@@ -342,28 +352,45 @@ class StandardPreprocessor:
 # ---------------------------------------------------------------------------
 
 class SmartSIMPreprocessor(StandardPreprocessor):
-    def __init__(self, debug=False, debug_dir="preprocess_debug"):
-        super().__init__(debug, debug_dir)
+    def __init__(self, debug=False, debug_dir="preprocess_debug", orientation_engine=None,
+                 enhancer=None):
+        super().__init__(debug, debug_dir, orientation_engine)
+        # Denoising after CLAHE; EnhancementEngine(mode="auto") picks per image
+        self.enhancer = enhancer or EnhancementEngine()
         self.OUTPUT_WIDTH     = 1600
         self.PROCESSING_WIDTH = 1280
 
     # ------------------------------------------------------------------
-    def preprocess(self, image):
-        quality = self.quality_assessor.assess(image)
+    def preprocess(self, image, denoise=True, artifacts=None, cancelled=None):
+        """
+        ``artifacts``: the request's ``ImageArtifacts``; its orientation
+        decision, grayscale and resized copies are reused, not rebuilt.
+        ``cancelled``: a ``threading.Event`` checked between steps; once set,
+        the remaining steps are skipped and ``None`` is returned.
+        """
+        stop = cancelled.is_set if cancelled is not None else (lambda: False)
+        quality = (artifacts.quality(image) if artifacts is not None
+                   else self.quality_assessor.assess(image))
 
-        oriented_image = self.correct_orientation_semantic(image)
+        oriented_image = self._oriented(image, artifacts)
         if self.debug:
             self._save(oriented_image, "smart_01_oriented")
+        if stop():
+            return None
 
-        warped, _ = self.geometric_correction_high_res(oriented_image)
+        warped, _ = self.geometric_correction_high_res(oriented_image, artifacts)
         if self.debug:
             self._save(warped, "smart_02_warped")
+        if stop():
+            return None
 
-        deskewed = self.deskew_hough_high_res(warped)
+        deskewed = self.deskew_hough_high_res(warped, artifacts)
         if self.debug:
             self._save(deskewed, "smart_03_deskewed")
+        if stop():
+            return None
 
-        enhanced = self._enhance_details(deskewed, quality)
+        enhanced = self._enhance_details(deskewed, quality, denoise=denoise)
         if self.debug:
             self._save(enhanced, "smart_04_enhanced")
 
@@ -378,12 +405,12 @@ class SmartSIMPreprocessor(StandardPreprocessor):
         return final_image
 
     # ------------------------------------------------------------------
-    def geometric_correction_high_res(self, full_image):
+    def geometric_correction_high_res(self, full_image, artifacts=None):
         h, w        = full_image.shape[:2]
-        detect_img  = self.resize_keep_aspect(full_image, self.PROCESSING_WIDTH)
+        detect_img  = self._resized(full_image, self.PROCESSING_WIDTH, artifacts)
         scale       = w / detect_img.shape[1]
 
-        gray    = cv2.cvtColor(detect_img, cv2.COLOR_BGR2GRAY)
+        gray    = gray_of(detect_img, artifacts)
         blurred = cv2.GaussianBlur(gray, (5, 5), 0)
         edged   = cv2.Canny(blurred, 30, 100)
         kernel  = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
@@ -414,12 +441,12 @@ class SmartSIMPreprocessor(StandardPreprocessor):
         return full_image, False
 
     # ------------------------------------------------------------------
-    def deskew_hough_high_res(self, image):
+    def deskew_hough_high_res(self, image, artifacts=None):
         h_orig, w_orig = image.shape[:2]
-        detect_img     = self.resize_keep_aspect(image, 1000)
+        detect_img     = self._resized(image, 1000, artifacts)
         h, w           = detect_img.shape[:2]
 
-        gray  = cv2.cvtColor(detect_img, cv2.COLOR_BGR2GRAY)
+        gray  = gray_of(detect_img, artifacts)
         mx, my = int(w * 0.15), int(h * 0.15)
         roi   = gray[my:h - my, mx:w - mx]
         if roi.size == 0:
@@ -461,10 +488,9 @@ class SmartSIMPreprocessor(StandardPreprocessor):
                               borderMode=cv2.BORDER_REPLICATE)
 
     # ------------------------------------------------------------------
-    def _enhance_details(self, image, quality=None):
+    def _enhance_details(self, image, quality=None, denoise=True):
         try:
             lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
-            l, a, b = cv2.split(lab)
 
             # Adaptive CLAHE clip based on image quality
             clip = 2.0
@@ -474,9 +500,12 @@ class SmartSIMPreprocessor(StandardPreprocessor):
                 elif quality.get("is_blurry"):       clip = 3.0
 
             clahe     = cv2.createCLAHE(clipLimit=clip, tileGridSize=(8, 8))
-            cl        = clahe.apply(l)
-            enhanced  = cv2.cvtColor(cv2.merge([cl, a, b]), cv2.COLOR_LAB2BGR)
-            denoised  = cv2.fastNlMeansDenoisingColored(enhanced, None, 3, 3, 7, 21)
+            # CLAHE on L in place: a and b are untouched, no split / merge copies
+            lab[:, :, 0] = clahe.apply(np.ascontiguousarray(lab[:, :, 0]))
+            # Denoising is the most expensive step; callers short on time skip it
+            algorithm = self.enhancer.select(quality) if denoise else "none"
+            denoised  = self.enhancer.to_bgr(lab, algorithm)
+            del lab
 
             # Apply sharpening on blurry images
             if quality and quality.get("is_blurry"):
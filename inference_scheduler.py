@@ -0,0 +1,155 @@
+"""
+inference_scheduler.py
+----------------------
+Cross-request dynamic micro-batching for OCR engine calls.
+
+In threaded mode every waitress thread shares one ``DocumentProcessor`` and
+used to call ``PaddleOCR.predict`` on its own single image.  The scheduler
+sits in between: callers submit one image and block on a future, while a
+dispatcher thread collects submissions for up to ``linger_ms`` after the
+oldest one arrived, or until ``max_batch`` images are waiting, runs them
+through detection and recognition as one ``predict`` call and scatters the
+results back.
+
+Only calls with identical engine keyword arguments share a batch.  If a
+batched call fails, every image in it is retried on its own so a single bad
+input cannot fail its neighbours.  The dispatcher thread starts on the
+first submission, i.e. after any pre-fork.
+
+Usage
+-----
+    scheduler = InferenceScheduler(ocr.predict, max_batch=8, linger_ms=5)
+    result    = scheduler.infer(image)        # one PaddleOCR result dict
+    scheduler.stats()["batch_sizes"]          # {size: count}
+"""
+
+import time
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Pending:
+    image:   Any
+    kwargs:  Dict[str, Any]
+    key:     Tuple
+    arrived: float = field(default_factory=time.monotonic)
+    future:  Future = field(default_factory=Future)
+
+
+class InferenceScheduler:
+    """Micro-batches ``predict(images, **kwargs) -> results`` across threads."""
+
+    def __init__(self, predict: Callable, max_batch: int = 8, linger_ms: float = 5.0):
+        self._predict   = predict
+        self.max_batch  = max(1, max_batch)
+        self.linger     = max(0.0, linger_ms) / 1000.0
+
+        self._pending: List[_Pending] = []
+        self._cond    = threading.Condition()
+        self._thread  = None
+        self._closed  = False
+
+        self._batch_sizes = Counter()
+        self._images      = 0
+        self._fallbacks   = 0
+
+    # ------------------------------------------------------------------
+    def infer(self, image, **kwargs):
+        """Blocking single-image inference through the shared batch."""
+        return self.submit(image, **kwargs).result()
+
+    def submit(self, image, **kwargs) -> Future:
+        item = _Pending(image, kwargs, tuple(sorted(kwargs.items())))
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Inference scheduler is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="ocr-inference-scheduler", daemon=True
+                )
+                self._thread.start()
+            self._pending.append(item)
+            self._cond.notify()
+        return item.future
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            batches = sum(self._batch_sizes.values())
+            return {
+                "max_batch":   self.max_batch,
+                "linger_ms":   round(self.linger * 1000, 3),
+                "pending":     len(self._pending),
+                "batches":     batches,
+                "images":      self._images,
+                "mean_batch":  round(self._images / batches, 3) if batches else 0.0,
+                "fallbacks":   self._fallbacks,
+                "batch_sizes": dict(self._batch_sizes),
+            }
+
+    # ------------------------------------------------------------------
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._execute(batch)
+
+    def _next_batch(self):
+        """Block until a batch is due; ``None`` once closed and drained."""
+        with self._cond:
+            while not self._pending:
+                if self._closed:
+                    return None
+                self._cond.wait()
+
+            head = self._pending[0]
+            due  = head.arrived + self.linger
+            while True:
+                group = [p for p in self._pending if p.key == head.key][:self.max_batch]
+                wait  = due - time.monotonic()
+                if len(group) >= self.max_batch or wait <= 0 or self._closed:
+                    break
+                self._cond.wait(wait)
+
+            taken = set(map(id, group))
+            self._pending = [p for p in self._pending if id(p) not in taken]
+            self._batch_sizes[len(group)] += 1
+            self._images += len(group)
+            return group
+
+    def _execute(self, batch: List[_Pending]) -> None:
+        kwargs = batch[0].kwargs
+        try:
+            results = list(self._predict([p.image for p in batch], **kwargs))
+            if len(results) != len(batch):
+                raise RuntimeError(f"batch returned {len(results)} results for {len(batch)} images")
+        except Exception as e:
+            if len(batch) > 1:
+                logger.warning("Batched OCR failed (%s); retrying %d image(s) one by one.", e, len(batch))
+                with self._cond:
+                    self._fallbacks += 1
+                for p in batch:
+                    self._execute_one(p)
+            else:
+                batch[0].future.set_exception(e)
+            return
+        for p, res in zip(batch, results):
+            p.future.set_result(res)
+
+    def _execute_one(self, item: _Pending) -> None:
+        try:
+            item.future.set_result(list(self._predict([item.image], **item.kwargs))[0])
+        except Exception as e:
+            item.future.set_exception(e)
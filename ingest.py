@@ -0,0 +1,179 @@
+"""
+ingest.py
+---------
+Header-first decoding of uploaded images.
+
+Phone uploads arrive at 12–48 MP.  The pipeline immediately shrinks them to
+600 px for orientation and 1000 px for OCR.  ``Ingestor.decode`` therefore
+reads the width and height from the JPEG SOF or PNG IHDR header before
+decoding anything:
+
+  * above ``max_pixels`` the upload is rejected with ``ImageTooLarge``, so
+    it is never decoded;
+  * a JPEG whose long side is at least 2×, 4× or 8× ``target_side`` is
+    decoded with ``IMREAD_REDUCED_COLOR_2/4/8``.  libjpeg scales during the
+    inverse DCT, which is several times faster than a full decode and never
+    allocates the full frame.  PNG has no such shortcut, so it is decoded
+    at full size.
+
+A reduced ``Ingested`` keeps the encoded bytes.  ``full()`` decodes them at
+full resolution on demand.  The smart SIM path is its only caller, through
+``ImageArtifacts.full_resolution``.
+
+Usage
+-----
+    ingestor = Ingestor(target_side=2000, max_pixels=50_000_000)
+    try:
+        ingested = ingestor.decode(data)         # None if undecodable
+    except ImageTooLarge as e:
+        ...                                      # e.width, e.height
+    ingested.image                               # 1 / ingested.factor scale
+    ingested.full()                              # full resolution, decoded now
+"""
+
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Scale factor → decode flag (libjpeg DCT scaling for JPEG input)
+DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# Start-of-frame markers: every SOFn except DHT (C4), JPG (C8) and DAC (CC)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+class ImageTooLarge(ValueError):
+    """Upload dimensions exceed the configured pixel limit."""
+
+    def __init__(self, width: int, height: int, max_pixels: int):
+        super().__init__(f"{width}x{height} exceeds {max_pixels} pixels")
+        self.width      = width
+        self.height     = height
+        self.max_pixels = max_pixels
+
+
+# ---------------------------------------------------------------------------
+# Header parsing
+# ---------------------------------------------------------------------------
+
+def _jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    i, n = 2, len(data)
+    while i + 4 <= n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:                          # fill byte
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:  # standalone markers
+            i += 2
+            continue
+        if marker in (0xD9, 0xDA):                  # EOI / SOS before any frame header
+            return None
+        if marker in _SOF_MARKERS:
+            if i + 9 > n:
+                return None
+            height = int.from_bytes(data[i + 5:i + 7], "big")
+            width  = int.from_bytes(data[i + 7:i + 9], "big")
+            return width, height
+        # Skip the whole segment (this also skips EXIF thumbnails in APP1)
+        i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+    return None
+
+
+def image_size(data: bytes) -> Optional[Tuple[str, int, int]]:
+    """``(format, width, height)`` from a JPEG / PNG header; None if unknown."""
+    if data[:2] == b"\xff\xd8":
+        size = _jpeg_size(data)
+        fmt  = "jpeg"
+    elif data[:8] == _PNG_SIGNATURE and data[12:16] == b"IHDR":
+        size = int.from_bytes(data[16:20], "big"), int.from_bytes(data[20:24], "big")
+        fmt  = "png"
+    else:
+        return None
+    # A zero height means it is defined later by a DNL marker
+    if size is None or not all(size):
+        return None
+    return (fmt,) + size
+
+
+def decode_full(data: bytes) -> Optional[np.ndarray]:
+    """Decode encoded bytes at full resolution (None if undecodable)."""
+    if not data:
+        return None
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+# ---------------------------------------------------------------------------
+# Ingestor
+# ---------------------------------------------------------------------------
+
+@dataclass
+class Ingested:
+    image:   np.ndarray
+    factor:  int = 1                        # image is 1 / factor of the upload
+    encoded: Optional[bytes] = None         # kept only when factor > 1
+
+    def full(self) -> np.ndarray:
+        """The upload at full resolution (decoded on every call)."""
+        if self.encoded is None:
+            return self.image
+        full = decode_full(self.encoded)
+        return full if full is not None else self.image
+
+
+class Ingestor:
+    """Decode uploads no larger than the pipeline needs, within a pixel limit."""
+
+    def __init__(self, target_side: int = 2000, max_pixels: int = 50_000_000):
+        # 0 disables the reduced decode / the pixel limit
+        self.target_side = target_side
+        self.max_pixels  = max_pixels
+
+    def factor(self, width: int, height: int) -> int:
+        """Largest JPEG scale factor that keeps the long side ≥ ``target_side``."""
+        if self.target_side > 0:
+            for factor in (8, 4, 2):
+                if max(width, height) // factor >= self.target_side:
+                    return factor
+        return 1
+
+    def _check(self, width: int, height: int) -> None:
+        if self.max_pixels > 0 and width * height > self.max_pixels:
+            raise ImageTooLarge(width, height, self.max_pixels)
+
+    def decode(self, data: bytes) -> Optional[Ingested]:
+        """Decode ``data``; None if undecodable, ``ImageTooLarge`` over the limit."""
+        if not data:
+            return None
+        header = image_size(data)
+        factor = 1
+        if header is not None:
+            fmt, width, height = header
+            self._check(width, height)
+            if fmt == "jpeg":
+                factor = self.factor(width, height)
+
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), DECODE_FLAGS[factor])
+        if image is None:
+            return None
+        if header is None:
+            self._check(image.shape[1], image.shape[0])
+        return Ingested(image, factor, bytes(data) if factor > 1 else None)
+
+    def read(self, path: str) -> Optional[Ingested]:
+        """``decode`` for a file path (None if missing or undecodable)."""
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        return self.decode(data)
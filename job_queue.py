@@ -0,0 +1,168 @@
+"""
+job_queue.py
+------------
+Bounded in-process job queue for asynchronous OCR requests.
+
+Request acceptance is decoupled from OCR throughput: the HTTP handler only
+enqueues a job and returns its id, while a fixed pool of worker threads —
+each bound to its own ``DocumentProcessor`` — drains the queue.
+
+Usage
+-----
+    jobs = JobQueue([processor], max_queue=32)
+    job  = jobs.submit(image_array, on_done=archive_fn)  # raises queue.Full
+    jobs.get(job.job_id).to_dict()
+"""
+
+import time
+import uuid
+import queue
+import logging
+import threading
+import traceback
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------------
+# Job record
+# ---------------------------------------------------------------------------
+
+JOB_QUEUED  = "queued"
+JOB_RUNNING = "running"
+JOB_DONE    = "done"
+JOB_FAILED  = "failed"
+
+
+@dataclass
+class Job:
+    job_id:      str
+    payload:     Any                          # decoded image handed to the processor
+    on_done:     Optional[Callable] = None    # on_done(job) after completion
+    options:     Dict[str, Any] = field(default_factory=dict)   # extra process_array kwargs
+    status:      str   = JOB_QUEUED
+    result:      Optional[Dict[str, Any]] = None
+    error:       Optional[str] = None
+    created_at:  float = field(default_factory=time.time)
+    started_at:  Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = {
+            "job_id":     self.job_id,
+            "status":     self.status,
+            "created_at": self.created_at,
+        }
+        if self.started_at is not None:
+            out["started_at"] = self.started_at
+        if self.finished_at is not None:
+            out["finished_at"] = self.finished_at
+        if self.status == JOB_DONE:
+            out["result"] = self.result
+        if self.status == JOB_FAILED:
+            out["error"] = self.error
+        return out
+
+
+# ---------------------------------------------------------------------------
+# Queue + worker pool
+# ---------------------------------------------------------------------------
+
+class JobQueue:
+    """
+    Fixed pool of worker threads fed from a bounded FIFO.
+
+    Each worker owns exactly one processor from ``processors`` so that
+    PaddleOCR predictors are never shared between workers.  Finished jobs
+    are kept for ``result_ttl`` seconds and then forgotten.
+    """
+
+    def __init__(
+        self,
+        processors: List[Any],
+        max_queue: int = 32,
+        result_ttl: float = 600.0,
+    ):
+        if not processors:
+            raise ValueError("JobQueue needs at least one processor")
+
+        self.result_ttl = result_ttl
+        self._queue: "queue.Queue[Job]" = queue.Queue(maxsize=max_queue)
+        self._jobs:  Dict[str, Job] = {}
+        self._lock   = threading.Lock()
+
+        self._workers = []
+        for i, proc in enumerate(processors):
+            t = threading.Thread(
+                target=self._worker_loop, args=(proc,),
+                name=f"ocr-job-worker-{i}", daemon=True,
+            )
+            t.start()
+            self._workers.append(t)
+
+        logger.info(
+            "JobQueue started: %d worker(s), max_queue=%d", len(processors), max_queue
+        )
+
+    # ------------------------------------------------------------------
+    def submit(self, payload: Any, on_done: Optional[Callable] = None, **options) -> Job:
+        """Enqueue a job without blocking; raises ``queue.Full`` when saturated."""
+        job = Job(job_id=uuid.uuid4().hex, payload=payload, on_done=on_done, options=options)
+        self._purge_expired()
+        with self._lock:
+            self._jobs[job.job_id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job.job_id, None)
+            raise
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts = {JOB_QUEUED: 0, JOB_RUNNING: 0, JOB_DONE: 0, JOB_FAILED: 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+        counts["workers"]  = len(self._workers)
+        counts["capacity"] = self._queue.maxsize
+        return counts
+
+    # ------------------------------------------------------------------
+    def _worker_loop(self, processor) -> None:
+        while True:
+            job = self._queue.get()
+            job.status     = JOB_RUNNING
+            job.started_at = time.time()
+            try:
+                job.result = processor.process_array(job.payload, **job.options)
+                job.status = JOB_DONE
+            except Exception as e:
+                traceback.print_exc()
+                job.error  = f"An internal server error occurred: {e}"
+                job.status = JOB_FAILED
+            finally:
+                job.finished_at = time.time()
+                job.payload     = None
+                if job.on_done is not None:
+                    try:
+                        job.on_done(job)
+                    except Exception as e:
+                        logger.error("Job %s completion hook failed: %s", job.job_id, e)
+                self._queue.task_done()
+
+    def _purge_expired(self) -> None:
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [
+                jid for jid, job in self._jobs.items()
+                if job.finished_at is not None and job.finished_at < cutoff
+            ]
+            for jid in expired:
+                del self._jobs[jid]
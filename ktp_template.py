@@ -0,0 +1,403 @@
+"""
+ktp_template.py
+---------------
+Template-driven field reading for KTP cards.
+
+Every e-KTP is printed on the same national layout, so once the card's
+position in the photo is known each field sits in a fixed rectangle.  The
+matcher
+
+  1. takes the face boxes found during orientation correction as a first
+     guess of where and how large the card is,
+  2. locates a few strong text anchors near their expected positions with a
+     cheap ink-projection search (no text detection model): the PROVINSI
+     and KABUPATEN header lines, the NIK label and the left edge of the
+     label column on the last row,
+  3. fits a similarity transform (scale, rotation, translation) from the
+     canonical template to the photo by least squares over those anchors,
+  4. crops each field's value rectangle from the photo.
+
+The crops go to a recognition-only model in one batch.  A fit whose anchor
+residual is large, whose scale disagrees with the face, or whose PROVINSI /
+NIK reads fail verification is rejected and the caller runs the full
+detection + recognition pipeline instead.
+
+Template coordinates are pixels on a 1000 px wide card.
+
+Usage
+-----
+    matcher = KTPTemplateMatcher()
+    fit     = matcher.fit(oriented_card, face_boxes)
+    if fit is not None:
+        crops = matcher.crop_fields(oriented_card, fit)
+        ...                                   # recognise crops
+        fields = matcher.read_fields(texts)
+"""
+
+import re
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+from thefuzz import fuzz
+
+from ktp_extractor import _clean_nik
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_WIDTH  = 1000
+TEMPLATE_HEIGHT = 647
+
+# Face box of the ID photo (x, y, w, h) as found by the frontal-face cascade
+TEMPLATE_FACE = (735.0, 191.0, 183.0, 183.0)
+
+# Value rectangles (x0, y0, x1, y1).  Rows are ~28 px apart; every row box
+# spans half a pitch above and below the text centre line.
+_ROW_PITCH   = 28.3
+_ROW_CENTRES = {
+    "Nama":              191.5,
+    "Tempat/Tgl Lahir":  218.5,
+    "Jenis Kelamin":     246.5,
+    "Alamat":            274.5,
+    "RT/RW":             300.5,
+    "Kel/Desa":          331.5,
+    "Kecamatan":         358.5,
+    "Agama":             387.5,
+    "Status Perkawinan": 416.0,
+    "Pekerjaan":         445.0,
+    "Kewarganegaraan":   473.5,
+    "Berlaku Hingga":    502.5,
+}
+_VALUE_X = (252.0, 702.0)
+
+
+def _row(y: float, x0: float = _VALUE_X[0], x1: float = _VALUE_X[1]):
+    half = _ROW_PITCH / 2
+    return (x0, y - half, x1, y + half)
+
+
+FIELD_BOXES: Dict[str, Tuple[float, float, float, float]] = {
+    "PROVINSI":  (130.0, 26.0, 870.0, 62.0),
+    "KABUPATEN": (130.0, 61.0, 870.0, 95.0),
+    "NIK":       (232.0, 114.0, 700.0, 156.0),
+    **{name: _row(y) for name, y in _ROW_CENTRES.items()},
+    "Jenis Kelamin": _row(_ROW_CENTRES["Jenis Kelamin"], x1=470.0),
+    "Gol. Darah":    _row(_ROW_CENTRES["Jenis Kelamin"], x0=598.0),
+}
+
+# Anchors located by ink projection: centres of the two header lines, the
+# left edge of the NIK label and the left edge of every row label (RT/RW,
+# Kel/Desa and Kecamatan are indented).
+_HEADER_ANCHORS  = ((499.5, 44.5), (497.0, 78.0))
+ANCHOR_NIK_LABEL = (37.0, 134.5)
+_ROW_LABEL_LEFT  = {
+    "Nama": 34.3, "Tempat/Tgl Lahir": 41.3, "Jenis Kelamin": 33.9, "Alamat": 33.5,
+    "RT/RW": 86.7, "Kel/Desa": 87.1, "Kecamatan": 86.6, "Agama": 28.6,
+    "Status Perkawinan": 32.3, "Pekerjaan": 29.3, "Kewarganegaraan": 31.3,
+    "Berlaku Hingga": 30.4,
+}
+_MIN_ROW_ANCHORS = 6
+
+# Label + value block used to estimate the residual rotation
+_TEXT_BLOCK      = (20, 100, 700, 520)
+_MIN_LINE_HEIGHT = 8
+
+
+@dataclass
+class TemplateFit:
+    """Similarity transform from template pixels to photo pixels."""
+    matrix:   np.ndarray       # 2x3
+    scale:    float            # photo pixels per template pixel
+    angle:    float            # degrees
+    residual: float            # RMS anchor error, fraction of card width
+
+    def project(self, points: np.ndarray) -> np.ndarray:
+        return points @ self.matrix[:, :2].T + self.matrix[:, 2]
+
+
+# ---------------------------------------------------------------------------
+# Geometry helpers
+# ---------------------------------------------------------------------------
+
+def fit_similarity(src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+    """Least-squares similarity transform (Umeyama) mapping ``src`` onto ``dst``."""
+    src_mean, dst_mean = src.mean(axis=0), dst.mean(axis=0)
+    src_c, dst_c = src - src_mean, dst - dst_mean
+    cov  = dst_c.T @ src_c / len(src)
+    U, S, Vt = np.linalg.svd(cov)
+    d = np.sign(np.linalg.det(U) * np.linalg.det(Vt))
+    D = np.diag([1.0, d])
+    R = U @ D @ Vt
+    var   = (src_c ** 2).sum() / len(src)
+    scale = float((S * np.diag(D)).sum() / var) if var > 0 else 1.0
+    t = dst_mean - scale * R @ src_mean
+    return np.hstack([scale * R, t[:, None]])
+
+
+def _ink_mask(gray: np.ndarray) -> np.ndarray:
+    """Dark, thin strokes (printed text) as a boolean mask."""
+    k = max(3, gray.shape[1] // 60) | 1
+    blackhat = cv2.morphologyEx(
+        gray, cv2.MORPH_BLACKHAT, cv2.getStructuringElement(cv2.MORPH_RECT, (k, k))
+    )
+    # Otsu separates the printed text from the lighter guilloche pattern
+    level, _ = cv2.threshold(blackhat, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    mask = (blackhat > max(level, 30)).astype(np.uint8)
+    return cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((2, 2), np.uint8)).astype(bool)
+
+
+def _text_bands(mask: np.ndarray, min_fill: float = 0.03, min_height: int = 3) -> List[Tuple[int, int]]:
+    """
+    Row ranges ``[start, end)`` whose ink coverage exceeds ``min_fill`` and
+    a third of the densest row in ``mask``.
+    """
+    if mask.size == 0:
+        return []
+    fill  = mask.mean(axis=1)
+    rows  = fill > max(min_fill, fill.max() / 3)
+    bands = []
+    start = None
+    for i, on in enumerate(np.append(rows, False)):
+        if on and start is None:
+            start = i
+        elif not on and start is not None:
+            if i - start >= min_height:
+                bands.append((start, i))
+            start = None
+    return bands
+
+
+def _ink_columns(mask: np.ndarray) -> Optional[Tuple[float, float]]:
+    """Robust left / right extent of the ink in ``mask``."""
+    cols = np.nonzero(mask.any(axis=0))[0]
+    if len(cols) < 4:
+        return None
+    return float(np.percentile(cols, 2)), float(np.percentile(cols, 98))
+
+
+# ---------------------------------------------------------------------------
+# Matcher
+# ---------------------------------------------------------------------------
+
+class KTPTemplateMatcher:
+    """Fits the KTP template to an oriented card photo and crops field values."""
+
+    def __init__(
+        self,
+        work_width: int = 1000,
+        max_residual: float = 0.006,
+        max_angle: float = 6.0,
+        face_scale_tolerance: float = 0.35,
+    ):
+        self.work_width           = work_width
+        self.max_residual         = max_residual
+        self.max_angle            = max_angle
+        self.face_scale_tolerance = face_scale_tolerance
+
+    # ------------------------------------------------------------------
+    def fit(self, card: np.ndarray, face_boxes: Sequence[Sequence[float]]) -> Optional[TemplateFit]:
+        """Best template fit over the candidate face boxes, or ``None``."""
+        if not len(face_boxes):
+            return None
+        h, w  = card.shape[:2]
+        k     = self.work_width / w
+        small = cv2.resize(card, (self.work_width, max(1, round(h * k))), interpolation=cv2.INTER_LINEAR)
+        mask  = _ink_mask(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)).astype(np.uint8)
+
+        best = None
+        for face in sorted(face_boxes, key=lambda f: -f[2] * f[3])[:3]:
+            fit = self._fit_from_face(mask, [float(v) * k for v in face])
+            if fit is not None and (best is None or fit.residual < best.residual):
+                best = fit
+        if best is None:
+            return None
+
+        # Back to full-resolution photo pixels
+        best.matrix = best.matrix / k
+        best.scale  = best.scale / k
+        return best
+
+    def _fit_from_face(self, mask: np.ndarray, face: List[float]) -> Optional[TemplateFit]:
+        fx, fy, fw, fh = face
+        tx, ty, tw, th = TEMPLATE_FACE
+        s0 = (fw / tw + fh / th) / 2
+        guess = np.array([[s0, 0.0, fx - s0 * tx], [0.0, s0, fy - s0 * ty], [0.0, 0.0, 1.0]])
+
+        # Work in template coordinates: warp the ink mask through the guess
+        # and take out the residual rotation before looking for anchors.
+        rot   = self._best_rotation(self._rectify(mask, guess))
+        guess = guess @ np.linalg.inv(rot)
+
+        # Coarse fit on the header and NIK label, which sit next to the
+        # face and are hard to confuse; then every row label on top.
+        coarse = self._locate_header(self._rectify(mask, guess))
+        if coarse is None:
+            return None
+        guess = self._similarity(coarse[0], self._to_photo(guess, coarse[1]))
+
+        rect   = self._rectify(mask, guess)
+        header = self._locate_header(rect)
+        rows   = self._locate_rows(rect)
+        if header is None or len(rows[0]) < _MIN_ROW_ANCHORS:
+            return None
+        src = np.vstack([header[0], rows[0]])
+        dst = self._to_photo(guess, np.vstack([header[1], rows[1]]))
+
+        M     = fit_similarity(src, dst)
+        scale = float(np.hypot(M[0, 0], M[1, 0]))
+        angle = float(np.degrees(np.arctan2(M[1, 0], M[0, 0])))
+        err   = src @ M[:, :2].T + M[:, 2] - dst
+        resid = float(np.sqrt((err ** 2).sum(axis=1).mean())) / (scale * TEMPLATE_WIDTH)
+
+        if abs(angle) > self.max_angle:
+            return None
+        if abs(scale / s0 - 1.0) > self.face_scale_tolerance:
+            return None
+        if resid > self.max_residual:
+            return None
+        return TemplateFit(M, scale, angle, resid)
+
+    @staticmethod
+    def _to_photo(template_to_photo: np.ndarray, points: np.ndarray) -> np.ndarray:
+        return points @ template_to_photo[:2, :2].T + template_to_photo[:2, 2]
+
+    @staticmethod
+    def _similarity(src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+        return np.vstack([fit_similarity(src, dst), [0.0, 0.0, 1.0]])
+
+    @staticmethod
+    def _rectify(mask: np.ndarray, template_to_photo: np.ndarray) -> np.ndarray:
+        return cv2.warpAffine(
+            mask, template_to_photo[:2], (TEMPLATE_WIDTH, TEMPLATE_HEIGHT),
+            flags=cv2.INTER_NEAREST | cv2.WARP_INVERSE_MAP,
+        )
+
+    def _best_rotation(self, rect: np.ndarray) -> np.ndarray:
+        """
+        3x3 rotation (template frame) that makes the text rows horizontal,
+        chosen by the sharpest row-projection profile over the text block.
+        """
+        x0, y0, x1, y1 = _TEXT_BLOCK
+        # Half resolution is plenty for a 0.5 degree search
+        block  = cv2.resize(rect[y0:y1, x0:x1] * np.uint8(255), None, fx=0.5, fy=0.5,
+                            interpolation=cv2.INTER_AREA)
+        centre = (block.shape[1] / 2, block.shape[0] / 2)
+        best_angle, best_score = 0.0, -1.0
+        for angle in np.arange(-self.max_angle, self.max_angle + 0.25, 0.5):
+            R = cv2.getRotationMatrix2D(centre, float(angle), 1.0)
+            rows  = cv2.warpAffine(block, R, block.shape[::-1], flags=cv2.INTER_NEAREST).sum(axis=1)
+            score = float((rows.astype(np.float64) ** 2).sum())
+            if score > best_score:
+                best_angle, best_score = float(angle), score
+        R = cv2.getRotationMatrix2D((x0 + 2 * centre[0], y0 + 2 * centre[1]), best_angle, 1.0)
+        return np.vstack([R, [0.0, 0.0, 1.0]])
+
+    def _locate_header(self, rect: np.ndarray) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Header line centres and the NIK label edge in the rectified mask."""
+        src, dst = [], []
+
+        # The first two lines of ink above the NIK row
+        x0, y0, x1, y1 = 130, 0, 870, 104
+        sub   = rect[y0:y1, x0:x1]
+        bands = _text_bands(sub, min_height=_MIN_LINE_HEIGHT)
+        if len(bands) < 2:
+            return None
+        for anchor, (b0, b1) in zip(_HEADER_ANCHORS, bands[:2]):
+            cols = _ink_columns(sub[b0:b1])
+            if cols is None:
+                return None
+            src.append(anchor)
+            dst.append((x0 + (cols[0] + cols[1]) / 2, y0 + (b0 + b1) / 2))
+
+        edge = self._label_edge(rect, ANCHOR_NIK_LABEL, 20)
+        if edge is None:
+            return None
+        src.append(ANCHOR_NIK_LABEL)
+        dst.append(edge)
+        return np.array(src, dtype=np.float64), np.array(dst, dtype=np.float64)
+
+    def _locate_rows(self, rect: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Left edge of every row label found within a third of a row pitch."""
+        src, dst = [], []
+        for name, x in _ROW_LABEL_LEFT.items():
+            anchor = (x, _ROW_CENTRES[name])
+            edge   = self._label_edge(rect, anchor, int(_ROW_PITCH / 2))
+            if edge is not None and abs(edge[1] - anchor[1]) < _ROW_PITCH / 3:
+                src.append(anchor)
+                dst.append(edge)
+        return np.array(src, dtype=np.float64).reshape(-1, 2), np.array(dst, dtype=np.float64).reshape(-1, 2)
+
+    @staticmethod
+    def _label_edge(rect: np.ndarray, anchor: Tuple[float, float], half_height: int) -> Optional[Tuple[float, float]]:
+        """Left edge and mid-height of the text line nearest ``anchor``."""
+        ax, ay = int(anchor[0]), int(anchor[1])
+        x0, y0 = max(0, ax - 32), max(0, ay - half_height)
+        sub    = rect[y0:ay + half_height, x0:ax + 120]
+        bands  = _text_bands(sub, min_fill=0.05, min_height=_MIN_LINE_HEIGHT)
+        if not bands:
+            return None
+        b0, b1 = min(bands, key=lambda b: abs((b[0] + b[1]) / 2 - (ay - y0)))
+        cols   = _ink_columns(sub[b0:b1])
+        if cols is None:
+            return None
+        return x0 + cols[0], y0 + (b0 + b1) / 2
+
+    # ------------------------------------------------------------------
+    def field_polygons(self, fit: TemplateFit) -> Dict[str, np.ndarray]:
+        """Photo-space quadrilateral of every field box."""
+        out = {}
+        for name, (x0, y0, x1, y1) in FIELD_BOXES.items():
+            quad = np.array([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], dtype=np.float64)
+            out[name] = fit.project(quad)
+        return out
+
+    def crop_fields(self, card: np.ndarray, fit: TemplateFit) -> Dict[str, np.ndarray]:
+        """Upright crop of every field box, warped out of the photo."""
+        crops = {}
+        for name, (x0, y0, x1, y1) in FIELD_BOXES.items():
+            out_w = max(8, int(round((x1 - x0) * fit.scale)))
+            out_h = max(8, int(round((y1 - y0) * fit.scale)))
+            # Output pixel (u, v) ↔ template (x0 + u / s, y0 + v / s)
+            T = np.array([[1 / fit.scale, 0, x0], [0, 1 / fit.scale, y0], [0, 0, 1]])
+            M = np.vstack([fit.matrix, [0, 0, 1]]) @ T
+            crops[name] = cv2.warpAffine(
+                card, M[:2], (out_w, out_h),
+                flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                borderMode=cv2.BORDER_REPLICATE,
+            )
+        return crops
+
+    # ------------------------------------------------------------------
+    @staticmethod
+    def read_fields(texts: Dict[str, str]) -> Optional[Dict[str, str]]:
+        """
+        Map recognised crop texts to ``KTPExtractor`` field names.
+
+        Returns ``None`` when the verification anchors fail: the PROVINSI
+        crop must read as the PROVINSI header and the NIK crop must hold
+        sixteen digits.
+        """
+        provinsi = (texts.get("PROVINSI") or "").strip()
+        head     = provinsi.split(None, 1)
+        if len(head) < 2 or fuzz.ratio(head[0].upper(), "PROVINSI") < 70:
+            return None
+        if _clean_nik(texts.get("NIK") or "") is None:
+            return None
+
+        fields = {"PROVINSI": head[1]}
+        kab = (texts.get("KABUPATEN") or "").strip()
+        words = kab.split(None, 1)
+        if len(words) == 2 and fuzz.ratio(words[0].upper(), "KABUPATEN") >= 65:
+            kab = words[1]
+        if kab:
+            fields["KABUPATEN"] = kab
+
+        for name, text in texts.items():
+            if name in fields or name in ("PROVINSI", "KABUPATEN"):
+                continue
+            value = re.sub(r"^[^0-9A-Za-z]+", "", text or "").strip()
+            if value:
+                fields[name] = value
+        return fields
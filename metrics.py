@@ -0,0 +1,270 @@
+"""
+metrics.py
+----------
+Minimal in-process Prometheus metrics (text exposition format 0.0.4).
+
+Recording is a dictionary update under a lock; all formatting work happens
+in ``Registry.render()``, i.e. only when ``/metrics`` is scraped.  Gauges
+that mirror other components (job queue, archive writer, worker pool) are
+registered as callbacks and evaluated at scrape time as well.
+
+Usage
+-----
+    from metrics import record_request, REGISTRY
+    record_request(ctx, result, endpoint="document", seconds=1.2)
+    body = REGISTRY.render()
+"""
+
+import bisect
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Seconds; covers millisecond cache hits up to the multi-second SIM smart path
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ---------------------------------------------------------------------------
+# Metric types
+# ---------------------------------------------------------------------------
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name       = name
+        self.help_text  = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, lv)} {_format_value(v)}"
+            for lv, v in items
+        ]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name       = name
+        self.help_text  = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets    = tuple(sorted(buckets))
+        # labels → [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[LabelValues, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[idx] += 1
+            series[-1]  += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((lv, list(s)) for lv, s in self._series.items())
+        lines = []
+        for lv, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, lv, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, lv)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, lv)} {cumulative}")
+        return lines
+
+
+class CallbackGauge:
+    """Gauge whose samples are produced by ``fn() -> {label tuple: value}`` at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str], fn: Callable):
+        self.name       = name
+        self.help_text  = help_text
+        self.labelnames = tuple(labelnames)
+        self.fn         = fn
+
+    def render(self) -> List[str]:
+        try:
+            samples = self.fn() or {}
+        except Exception:
+            return []
+        return [
+            f"{self.name}{_format_labels(self.labelnames, lv)} {_format_value(float(v))}"
+            for lv, v in sorted(samples.items())
+        ]
+
+
+# ---------------------------------------------------------------------------
+# Registry
+# ---------------------------------------------------------------------------
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._names   = set()
+        self._lock    = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            if metric.name in self._names:
+                raise ValueError(f"Metric {metric.name!r} already registered")
+            self._names.add(metric.name)
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()) -> Counter:
+        return self._add(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge_callback(self, name, help_text, labelnames, fn) -> CallbackGauge:
+        return self._add(CallbackGauge(name, help_text, labelnames, fn))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        out = []
+        for m in metrics:
+            out.append(f"# HELP {m.name} {m.help_text}")
+            out.append(f"# TYPE {m.name} {m.kind}")
+            out.extend(m.render())
+        return "\n".join(out) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "ocr_request_duration_seconds", "End-to-end handling time per document.", ["endpoint"]
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "ocr_stage_duration_seconds", "Wall-clock time per pipeline stage.", ["stage"]
+)
+OCR_CALLS = REGISTRY.histogram(
+    "ocr_engine_calls_per_request", "OCR engine invocations per document.", [],
+    buckets=(0, 1, 2, 3, 4, 5, 6, 8),
+)
+OCR_CALLS_AVOIDED = REGISTRY.counter(
+    "ocr_engine_calls_avoided_total", "OCR inferences answered from the per-request memo.", []
+)
+DOCUMENTS = REGISTRY.counter(
+    "ocr_documents_total", "Documents processed by detected type.", ["doc_type"]
+)
+CLASSIFIER = REGISTRY.counter(
+    "ocr_classifier_routes_total", "Pixel classifier decisions (label, or ambiguous).", ["outcome"]
+)
+SIM_PATHS = REGISTRY.counter(
+    "ocr_sim_path_total", "SIM documents by processing path.", ["path"]
+)
+SIM_SPECULATION = REGISTRY.counter(
+    "ocr_sim_speculation_total", "Speculative smart SIM work by outcome.", ["outcome"]
+)
+KTP_PATHS = REGISTRY.counter(
+    "ocr_ktp_path_total", "KTP documents by template mode outcome.", ["path"]
+)
+OCR_TIERS = REGISTRY.counter(
+    "ocr_tier_total", "Documents by the OCR engine tier that produced the answer.", ["tier"]
+)
+TEXTLINE_ORIENTATION = REGISTRY.counter(
+    "ocr_textline_orientation_total",
+    "OCR passes run without the text-line orientation classifier, by outcome.", ["outcome"]
+)
+ORIENTATION = REGISTRY.counter(
+    "ocr_orientation_total",
+    "Card orientation decisions, by how the search ended.", ["path"]
+)
+DECODES = REGISTRY.counter(
+    "ocr_decode_total",
+    "Upload decodes, by JPEG scale (1, 2, 4, 8) and on-demand full-size decodes (full).", ["scale"]
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "ocr_result_cache_lookups_total", "Result cache lookups by outcome.", ["outcome"]
+)
+SKIPPED_STAGES = REGISTRY.counter(
+    "ocr_skipped_stages_total", "Optional stages skipped to meet a request deadline.", ["stage"]
+)
+ERRORS = REGISTRY.counter(
+    "ocr_errors_total", "Failed documents by error class.", ["error_class"]
+)
+
+
+def record_request(ctx, result: Optional[dict], endpoint: str, seconds: float) -> None:
+    """Fold one finished ``RequestContext`` into the process-wide metrics."""
+    REQUEST_SECONDS.observe(seconds, endpoint)
+    for stage, elapsed in ctx.timings.items():
+        STAGE_SECONDS.observe(elapsed, stage)
+    OCR_CALLS.observe(ctx.ocr_calls)
+    if ctx.ocr_calls_avoided:
+        OCR_CALLS_AVOIDED.inc(amount=ctx.ocr_calls_avoided)
+
+    if ctx.doc_type:
+        DOCUMENTS.inc(ctx.doc_type)
+    if ctx.classifier:
+        CLASSIFIER.inc(ctx.classifier)
+    if ctx.sim_path:
+        SIM_PATHS.inc(ctx.sim_path)
+    if ctx.speculation:
+        SIM_SPECULATION.inc(ctx.speculation)
+    if ctx.ktp_path:
+        KTP_PATHS.inc(ctx.ktp_path)
+    if ctx.ocr_tier:
+        OCR_TIERS.inc(ctx.ocr_tier)
+    if ctx.textline_skipped:
+        TEXTLINE_ORIENTATION.inc("skipped", amount=ctx.textline_skipped)
+    if ctx.textline_fallbacks:
+        TEXTLINE_ORIENTATION.inc("fallback", amount=ctx.textline_fallbacks)
+    if ctx.orientation is not None:
+        ORIENTATION.inc(ctx.orientation.path)
+    if ctx.decode_scale is not None:
+        DECODES.inc(str(ctx.decode_scale))
+    if ctx.full_decode:
+        DECODES.inc("full")
+    if ctx.cache:
+        CACHE_LOOKUPS.inc(ctx.cache)
+    for stage in ctx.skipped_stages:
+        SKIPPED_STAGES.inc(stage)
+
+    status = (result or {}).get("status", 500)
+    if ctx.error_class:
+        ERRORS.inc(ctx.error_class)
+    elif status >= 400:
+        ERRORS.inc(f"http_{status}")
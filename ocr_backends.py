@@ -0,0 +1,285 @@
+"""
+ocr_backends.py
+---------------
+OCR engines behind one small interface, so the post-OCR pipeline
+(KTPExtractor, SIMExtractor, KTPPostProcessor, NIKCrossValidator, scorer)
+can run without Paddle.
+
+A backend has PaddleOCR's ``predict`` signature: one image or a list of
+images in, one result dict per image out.  Full OCR backends return
+``dt_polys`` / ``rec_texts`` / ``rec_scores``.  Recognition-only backends
+(the KTP template crops) return ``rec_text`` / ``rec_score``.
+
+Backends:
+  * ``PaddleOCRBackend`` / ``PaddleRecognitionBackend`` — the real engines;
+    ``paddleocr`` is imported only when one is built.
+  * ``OnnxOCRBackend`` / ``OnnxRecognitionBackend`` (``onnx_backend.py``) —
+    the same models exported to ONNX, on onnxruntime's CPU execution provider.
+  * ``RecordingBackend`` — wraps another backend and persists every raw
+    result as ``<dir>/<image digest>[__<kwarg>=<value>...].json``.  The
+    predict kwargs are part of the name because they change the result (the
+    text-line classifier off vs. its fallback run on the same image).
+  * ``ReplayBackend``    — serves those recordings; no models are loaded,
+    and every run over the same inputs gives the same answers.  An image
+    without a recording gets an empty result (or ``ReplayMiss`` in strict
+    mode).
+
+Usage
+-----
+    ocr = create_backend("ocr", dict(lang="id"), mode="record", recording_dir="ocr_recordings")
+    ocr.predict(image)          # runs PaddleOCR, writes ocr_recordings/ocr/<digest>.json
+
+    ocr = create_backend("ocr", dict(lang="id"), mode="replay", recording_dir="ocr_recordings")
+    ocr.predict(image)          # same result, no Paddle
+"""
+
+import os
+import re
+import json
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Protocol
+
+import numpy as np
+
+from result_cache import array_digest
+
+logger = logging.getLogger(__name__)
+
+BACKEND_MODES = ("paddle", "onnx", "record", "replay")
+PRECISIONS    = ("fp32", "int8")
+
+# Result fields worth persisting; the rest of a PaddleOCR result (input
+# image, preprocessing sub-results, model settings) is bulky and unused.
+RECORDED_KEYS = (
+    "dt_polys", "dt_scores", "rec_texts", "rec_scores", "rec_polys", "rec_boxes",
+    "textline_orientation_angles", "rec_text", "rec_score",
+)
+_ARRAY_KEYS = ("dt_polys", "rec_polys", "rec_boxes")
+
+
+class OCRBackend(Protocol):
+    def predict(self, input, **kwargs) -> List[Dict[str, Any]]: ...
+
+
+# ---------------------------------------------------------------------------
+# Paddle
+# ---------------------------------------------------------------------------
+
+class PaddleOCRBackend:
+    """Detection + recognition through ``paddleocr.PaddleOCR``."""
+
+    def __init__(self, **settings):
+        from paddleocr import PaddleOCR
+        self.settings = settings
+        self._engine  = PaddleOCR(**settings)
+
+    def predict(self, input, **kwargs):
+        return self._engine.predict(input, **kwargs)
+
+
+class PaddleRecognitionBackend:
+    """Recognition only through ``paddleocr.TextRecognition``."""
+
+    def __init__(self, **settings):
+        from paddleocr import TextRecognition
+        self.settings = settings
+        self._engine  = TextRecognition(**settings)
+
+    def predict(self, input, **kwargs):
+        return self._engine.predict(input, **kwargs)
+
+
+# ---------------------------------------------------------------------------
+# Record / replay
+# ---------------------------------------------------------------------------
+
+class ReplayMiss(KeyError):
+    """No recording exists for an image (strict replay only)."""
+
+
+def _to_record(result) -> Dict[str, Any]:
+    record = {}
+    for key in RECORDED_KEYS:
+        if key not in result:
+            continue
+        value = result[key]
+        if isinstance(value, np.ndarray):
+            value = value.tolist()
+        elif isinstance(value, (list, tuple)):
+            value = [v.tolist() if isinstance(v, np.ndarray) else v for v in value]
+        elif isinstance(value, np.generic):
+            value = value.item()
+        record[key] = value
+    return record
+
+
+def _from_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    result = dict(record)
+    for key in _ARRAY_KEYS:
+        if key in result:
+            result[key] = [np.asarray(v, dtype=np.int32) for v in result[key]]
+    return result
+
+
+def _as_list(input) -> List[Any]:
+    return input if isinstance(input, list) else [input]
+
+
+def record_key(image: np.ndarray, kwargs: Dict[str, Any]) -> str:
+    """Recording name: the image digest plus the sorted ``predict`` kwargs."""
+    return array_digest(image) + "".join(f"__{k}={kwargs[k]}" for k in sorted(kwargs))
+
+
+class RecordingBackend:
+    """Pass-through wrapper that stores each image's raw result by digest."""
+
+    def __init__(self, inner: OCRBackend, directory: str):
+        self.inner     = inner
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def predict(self, input, **kwargs):
+        images  = _as_list(input)
+        results = list(self.inner.predict(input, **kwargs))
+        for image, result in zip(images, results):
+            if isinstance(image, np.ndarray):
+                self._write(record_key(image, kwargs), _to_record(result))
+        return results
+
+    def _write(self, key: str, record: Dict[str, Any]) -> None:
+        path = os.path.join(self.directory, f"{key}.json")
+        tmp  = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+class ReplayBackend:
+    """Serves ``RecordingBackend`` output; loads no models."""
+
+    def __init__(self, directory: str, strict: bool = False):
+        self.directory = directory
+        self.strict    = strict
+        self._loaded: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._lock     = threading.Lock()
+        self.hits      = 0
+        self.misses    = 0
+        if not os.path.isdir(directory):
+            logger.warning("Replay directory %s does not exist; every image will miss.", directory)
+
+    def predict(self, input, **kwargs):
+        return [self._replay(image, kwargs) for image in _as_list(input)]
+
+    def _replay(self, image: np.ndarray, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        key = record_key(image, kwargs)
+        with self._lock:
+            if key not in self._loaded:
+                self._loaded[key] = self._read(key)
+            record = self._loaded[key]
+            if record is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if record is None:
+            if self.strict:
+                raise ReplayMiss(key)
+            logger.warning("No OCR recording for image %s; replaying an empty result.", key)
+            return {"dt_polys": [], "rec_texts": [], "rec_scores": [],
+                    "rec_text": "", "rec_score": 0.0}
+        return _from_record(record)
+
+    def _read(self, key: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self.directory, f"{key}.json")
+        if not os.path.isfile(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+
+# ---------------------------------------------------------------------------
+# INT8 recognition model
+# ---------------------------------------------------------------------------
+
+# Recognition model PaddleOCR picks for a ``lang`` when none is named
+LANG_REC_MODELS = {"id": "latin_PP-OCRv5_mobile_rec"}
+
+
+def inference_model_name(model_dir: str) -> Optional[str]:
+    """``Global.model_name`` from a Paddle inference model's ``inference.yml``."""
+    path = os.path.join(model_dir, "inference.yml")
+    if not os.path.isfile(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        match = re.search(r"^\s*model_name:\s*['\"]?([\w.-]+)", f.read(), re.MULTILINE)
+    return match.group(1) if match else None
+
+
+def _int8_settings(role: str, settings: Dict[str, Any], recognition: bool, int8_rec_model_dir: Optional[str]):
+    """
+    ``(settings, precision)`` for one role.  The quantised weights replace
+    the role's recognition model only when it is the model they were
+    quantised from; any other role keeps FP32.
+    """
+    if not int8_rec_model_dir:
+        raise ValueError("INT8 recognition on Paddle needs int8_rec_model_dir "
+                         "(a quantised inference model of the recognition model)")
+    quantised = inference_model_name(int8_rec_model_dir)
+    if quantised is None:
+        raise ValueError(f"{int8_rec_model_dir}/inference.yml does not name the quantised model")
+    name_key = "model_name" if recognition else "text_recognition_model_name"
+    dir_key  = "model_dir"  if recognition else "text_recognition_model_dir"
+    model    = settings.get(name_key) or LANG_REC_MODELS.get(settings.get("lang"))
+    if model != quantised:
+        logger.warning("INT8 model %s is not the %s recognition model (%s); %s stays FP32.",
+                       quantised, role, model or "unknown", role)
+        return settings, "fp32"
+    return dict(settings, **{name_key: quantised, dir_key: int8_rec_model_dir}), "int8"
+
+
+# ---------------------------------------------------------------------------
+# Factory
+# ---------------------------------------------------------------------------
+
+def create_backend(
+    role: str,
+    settings: Dict[str, Any],
+    mode: str = "paddle",
+    recording_dir: str = "ocr_recordings",
+    recognition: bool = False,
+    strict: bool = False,
+    onnx_model_dir: str = "models/onnx",
+    onnx_threads: int = 0,
+    precision: str = "fp32",
+    int8_rec_model_dir: Optional[str] = None,
+) -> OCRBackend:
+    """
+    Build the engine for one ``role`` (``ocr``, ``ocr_heavy``, ``text_rec``).
+    Recordings of each role live in their own ``recording_dir/<role>``.
+
+    ``precision="int8"`` swaps in a quantised recognition model: the
+    ``inference_int8.onnx`` export on ONNX Runtime, or the Paddle inference
+    model in ``int8_rec_model_dir`` on Paddle.  That directory holds one
+    model, so on Paddle it only replaces the recognition model of the
+    roles that use the model it was quantised from (named in its
+    ``inference.yml``); the other roles stay FP32.
+    """
+    if mode not in BACKEND_MODES:
+        raise ValueError(f"Unknown OCR backend mode {mode!r}; expected one of {BACKEND_MODES}")
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}; expected one of {PRECISIONS}")
+    if precision == "int8" and mode in ("paddle", "record"):
+        settings, precision = _int8_settings(role, settings, recognition, int8_rec_model_dir)
+    if precision != "fp32":
+        role = f"{role}_{precision}"
+    directory = os.path.join(recording_dir, role)
+    if mode == "replay":
+        return ReplayBackend(directory, strict=strict)
+    if mode == "onnx":
+        from onnx_backend import OnnxOCRBackend, OnnxRecognitionBackend
+        cls = OnnxRecognitionBackend if recognition else OnnxOCRBackend
+        return cls.from_settings(settings, onnx_model_dir, onnx_threads, precision)
+    engine = PaddleRecognitionBackend(**settings) if recognition else PaddleOCRBackend(**settings)
+    if mode == "record":
+        return RecordingBackend(engine, directory)
+    return engine
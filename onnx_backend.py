@@ -0,0 +1,423 @@
+"""
+onnx_backend.py
+---------------
+PP-OCR detection + recognition on onnxruntime's CPU execution provider.
+
+Runs ONNX exports of the same models PaddleOCR loads, without Paddle
+Inference.  Paddle Inference with MKLDNN is the largest resident-memory
+consumer and the slowest part of startup.  Pre- and post-processing follow
+the PaddleX OCR pipeline defaults:
+
+  * Detection   — resize so the short side is >= 64 px and the long side
+                  <= 4000 px, rounded to multiples of 32; ImageNet
+                  normalisation; DB post-process (threshold 0.3, box score
+                  0.6, unclip ratio 1.5) producing quadrilaterals sorted
+                  top-to-bottom, left-to-right.
+  * Orientation — optional PP-LCNet text-line classifier (0 / 180 degrees)
+                  on each crop, skipped with ``use_textline_orientation=False``.
+  * Recognition — perspective crop per box; height 48, width padded to the
+                  widest crop in a batch of 6; greedy CTC decode against the
+                  model's character dictionary.
+
+Results have the ``dt_polys`` / ``rec_texts`` / ``rec_scores`` shape
+``DocumentProcessor._get_texts`` and the extractors consume.  PaddleOCR's
+document-level orientation and unwarping models are not run; the service
+orients cards itself before OCR.
+
+Models are looked up as ``<model_dir>/<model name>/inference.onnx``, next to
+the ``inference.yml`` that ``paddlex --paddle2onnx`` copies over (the
+recognition character dictionary is read from it).  With
+``precision="int8"`` the recognition model is read from
+``inference_int8.onnx`` instead, a dynamically quantised copy written by
+``python onnx_backend.py quantize <model dir>``.
+
+Usage
+-----
+    paddlex --paddle2onnx --paddle_model_dir ~/.paddlex/official_models/PP-OCRv5_server_det \\
+            --onnx_model_dir models/onnx/PP-OCRv5_server_det
+
+    python onnx_backend.py quantize models/onnx/latin_PP-OCRv5_mobile_rec
+
+    ocr = OnnxOCRBackend.from_settings(dict(lang="id"), "models/onnx")
+    ocr.predict(image)[0]["rec_texts"]
+"""
+
+import os
+import sys
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Models PaddleOCR(lang='id') resolves to when no names are given
+DEFAULT_DET_MODEL      = "PP-OCRv5_server_det"
+DEFAULT_REC_MODEL      = "latin_PP-OCRv5_mobile_rec"
+DEFAULT_TEXTLINE_MODEL = "PP-LCNet_x1_0_textline_ori"
+
+_IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+_IMAGENET_STD  = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+
+def _session(path: str, threads: int = 0):
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    if threads:
+        options.intra_op_num_threads = threads
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+MODEL_FILES = {"fp32": "inference.onnx", "int8": "inference_int8.onnx"}
+
+
+def _model_path(model_dir: str, name: str, precision: str = "fp32") -> str:
+    path = os.path.join(model_dir, name, MODEL_FILES[precision])
+    if not os.path.isfile(path):
+        hint = ("quantise it with python onnx_backend.py quantize" if precision == "int8"
+                else "export it with paddlex --paddle2onnx")
+        raise FileNotFoundError(f"ONNX model {path} not found; {hint}")
+    return path
+
+
+def quantize_int8(model_dir: str) -> str:
+    """
+    Dynamic INT8 quantisation of ``<model_dir>/inference.onnx`` (weights of
+    MatMul / Conv to int8, activations quantised at run time).
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    source = os.path.join(model_dir, MODEL_FILES["fp32"])
+    target = os.path.join(model_dir, MODEL_FILES["int8"])
+    quantize_dynamic(source, target, weight_type=QuantType.QInt8)
+    return target
+
+
+def load_character_dict(model_dir: str) -> List[str]:
+    """CTC alphabet from ``inference.yml`` (or a plain ``dict.txt``), blank excluded."""
+    txt = os.path.join(model_dir, "dict.txt")
+    if os.path.isfile(txt):
+        with open(txt, encoding="utf-8") as f:
+            chars = [line.rstrip("\r\n") for line in f]
+    else:
+        import yaml
+        with open(os.path.join(model_dir, "inference.yml"), encoding="utf-8") as f:
+            config = yaml.safe_load(f)
+        chars = [str(c) for c in config["PostProcess"]["character_dict"]]
+    # PP-OCR rec models append the space character after the dictionary
+    return chars + [" "]
+
+
+# ---------------------------------------------------------------------------
+# Detection (DB)
+# ---------------------------------------------------------------------------
+
+class DBDetector:
+    def __init__(
+        self,
+        model_path: str,
+        threads: int = 0,
+        limit_side_len: int = 64,
+        limit_type: str = "min",
+        max_side_limit: int = 4000,
+        thresh: float = 0.3,
+        box_thresh: float = 0.6,
+        unclip_ratio: float = 1.5,
+        max_candidates: int = 1000,
+        min_size: float = 3,
+    ):
+        self.session        = _session(model_path, threads)
+        self.input_name     = self.session.get_inputs()[0].name
+        self.limit_side_len = limit_side_len
+        self.limit_type     = limit_type
+        self.max_side_limit = max_side_limit
+        self.thresh         = thresh
+        self.box_thresh     = box_thresh
+        self.unclip_ratio   = unclip_ratio
+        self.max_candidates = max_candidates
+        self.min_size       = min_size
+
+    def __call__(self, image: np.ndarray) -> List[np.ndarray]:
+        tensor, (ratio_h, ratio_w) = self.preprocess(image)
+        prob = self.session.run(None, {self.input_name: tensor})[0][0, 0]
+        h, w = image.shape[:2]
+        return self.postprocess(prob, ratio_h, ratio_w, h, w)
+
+    # ------------------------------------------------------------------
+    def preprocess(self, image: np.ndarray) -> Tuple[np.ndarray, Tuple[float, float]]:
+        h, w  = image.shape[:2]
+        ratio = 1.0
+        if self.limit_type == "max" and max(h, w) > self.limit_side_len:
+            ratio = self.limit_side_len / max(h, w)
+        elif self.limit_type == "min" and min(h, w) < self.limit_side_len:
+            ratio = self.limit_side_len / min(h, w)
+        if max(h, w) * ratio > self.max_side_limit:
+            ratio = self.max_side_limit / max(h, w)
+        rh = max(32, int(round(h * ratio / 32)) * 32)
+        rw = max(32, int(round(w * ratio / 32)) * 32)
+        resized = cv2.resize(image, (rw, rh))
+
+        x = (resized.astype(np.float32) / 255.0 - _IMAGENET_MEAN) / _IMAGENET_STD
+        return x.transpose(2, 0, 1)[None], (rh / h, rw / w)
+
+    def postprocess(
+        self, prob: np.ndarray, ratio_h: float, ratio_w: float, h: int, w: int
+    ) -> List[np.ndarray]:
+        mask = (prob > self.thresh).astype(np.uint8)
+        contours, _ = cv2.findContours(mask, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+        boxes = []
+        for contour in contours[:self.max_candidates]:
+            rect = cv2.minAreaRect(contour)
+            if min(rect[1]) < self.min_size:
+                continue
+            if self._box_score(prob, cv2.boxPoints(rect)) < self.box_thresh:
+                continue
+            (cx, cy), (rw, rh), angle = self._unclip(rect)
+            if min(rw, rh) < self.min_size + 2:
+                continue
+            box = cv2.boxPoints(((cx, cy), (rw, rh), angle))
+            box[:, 0] = np.clip(np.round(box[:, 0] / ratio_w), 0, w - 1)
+            box[:, 1] = np.clip(np.round(box[:, 1] / ratio_h), 0, h - 1)
+            box = _order_points(box)
+            if np.linalg.norm(box[0] - box[1]) <= 3 or np.linalg.norm(box[0] - box[3]) <= 3:
+                continue
+            boxes.append(box.astype(np.int16))
+        return _sort_boxes(boxes)
+
+    @staticmethod
+    def _box_score(prob: np.ndarray, box: np.ndarray) -> float:
+        """Mean probability inside the box ("fast" DB box score)."""
+        h, w = prob.shape
+        x0 = int(np.clip(np.floor(box[:, 0].min()), 0, w - 1))
+        x1 = int(np.clip(np.ceil(box[:, 0].max()), 0, w - 1))
+        y0 = int(np.clip(np.floor(box[:, 1].min()), 0, h - 1))
+        y1 = int(np.clip(np.ceil(box[:, 1].max()), 0, h - 1))
+        local = np.zeros((y1 - y0 + 1, x1 - x0 + 1), dtype=np.uint8)
+        cv2.fillPoly(local, [(box - (x0, y0)).astype(np.int32)], 1)
+        return float(cv2.mean(prob[y0:y1 + 1, x0:x1 + 1], local)[0])
+
+    def _unclip(self, rect):
+        """
+        DB unclip of a rectangle: offset every side by area * ratio /
+        perimeter, which is what the polygon offset reduces to once the
+        result is re-fitted with ``minAreaRect``.
+        """
+        (cx, cy), (rw, rh), angle = rect
+        distance = rw * rh * self.unclip_ratio / max(2 * (rw + rh), 1e-6)
+        return (cx, cy), (rw + 2 * distance, rh + 2 * distance), angle
+
+
+def _order_points(box: np.ndarray) -> np.ndarray:
+    """Clockwise from top-left."""
+    box   = box[np.argsort(box[:, 0])]
+    left  = box[:2][np.argsort(box[:2, 1])]
+    right = box[2:][np.argsort(box[2:, 1])]
+    return np.array([left[0], right[0], right[1], left[1]], dtype=np.float32)
+
+
+def _sort_boxes(boxes: List[np.ndarray]) -> List[np.ndarray]:
+    """Top-to-bottom, then left-to-right within a 10 px line tolerance."""
+    boxes = sorted(boxes, key=lambda b: (int(b[0][1]), int(b[0][0])))
+    for i in range(len(boxes) - 1):
+        for j in range(i, -1, -1):
+            if abs(int(boxes[j + 1][0][1]) - int(boxes[j][0][1])) < 10 and \
+                    boxes[j + 1][0][0] < boxes[j][0][0]:
+                boxes[j], boxes[j + 1] = boxes[j + 1], boxes[j]
+            else:
+                break
+    return boxes
+
+
+def crop_box(image: np.ndarray, box: np.ndarray) -> np.ndarray:
+    """Perspective crop of one quadrilateral; tall crops are turned upright."""
+    pts = box.astype(np.float32)
+    w   = int(max(np.linalg.norm(pts[0] - pts[1]), np.linalg.norm(pts[2] - pts[3])))
+    h   = int(max(np.linalg.norm(pts[0] - pts[3]), np.linalg.norm(pts[1] - pts[2])))
+    w, h = max(w, 1), max(h, 1)
+    dst  = np.float32([[0, 0], [w, 0], [w, h], [0, h]])
+    crop = cv2.warpPerspective(
+        image, cv2.getPerspectiveTransform(pts, dst), (w, h),
+        borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC,
+    )
+    if h / w >= 1.5:
+        crop = np.rot90(crop)
+    return crop
+
+
+# ---------------------------------------------------------------------------
+# Text-line orientation
+# ---------------------------------------------------------------------------
+
+class TextlineClassifier:
+    """PP-LCNet 0 / 180 degree classifier; returns crops turned upright."""
+
+    INPUT_SIZE = (160, 80)      # (w, h)
+
+    def __init__(self, model_path: str, threads: int = 0, batch_size: int = 6):
+        self.session    = _session(model_path, threads)
+        self.input_name = self.session.get_inputs()[0].name
+        self.batch_size = batch_size
+
+    def __call__(self, crops: List[np.ndarray]) -> List[np.ndarray]:
+        out = list(crops)
+        for start in range(0, len(crops), self.batch_size):
+            chunk  = crops[start:start + self.batch_size]
+            tensor = np.stack([
+                ((cv2.resize(c, self.INPUT_SIZE).astype(np.float32) / 255.0
+                  - _IMAGENET_MEAN) / _IMAGENET_STD).transpose(2, 0, 1)
+                for c in chunk
+            ])
+            labels = np.argmax(self.session.run(None, {self.input_name: tensor})[0], axis=1)
+            for k, label in enumerate(labels):
+                if label == 1:
+                    out[start + k] = cv2.rotate(chunk[k], cv2.ROTATE_180)
+        return out
+
+
+# ---------------------------------------------------------------------------
+# Recognition (CTC)
+# ---------------------------------------------------------------------------
+
+class CTCRecognizer:
+    HEIGHT    = 48
+    MIN_WIDTH = 320
+
+    def __init__(self, model_path: str, characters: Sequence[str], threads: int = 0,
+                 batch_size: int = 6):
+        self.session    = _session(model_path, threads)
+        self.input_name = self.session.get_inputs()[0].name
+        self.characters = ["blank"] + list(characters)
+        self.batch_size = batch_size
+
+    def __call__(self, crops: List[np.ndarray]) -> List[Tuple[str, float]]:
+        if not crops:
+            return []
+        # Similar aspect ratios share a batch so little width is padding
+        order   = np.argsort([c.shape[1] / max(c.shape[0], 1) for c in crops])
+        results: List[Optional[Tuple[str, float]]] = [None] * len(crops)
+        for start in range(0, len(crops), self.batch_size):
+            idx    = order[start:start + self.batch_size]
+            tensor = self.preprocess([crops[i] for i in idx])
+            probs  = self.session.run(None, {self.input_name: tensor})[0]
+            for i, decoded in zip(idx, self.decode(probs)):
+                results[i] = decoded
+        return results
+
+    def preprocess(self, crops: List[np.ndarray]) -> np.ndarray:
+        max_ratio = max(self.MIN_WIDTH / self.HEIGHT,
+                        max(c.shape[1] / max(c.shape[0], 1) for c in crops))
+        width  = int(np.ceil(self.HEIGHT * max_ratio))
+        tensor = np.zeros((len(crops), 3, self.HEIGHT, width), dtype=np.float32)
+        for k, crop in enumerate(crops):
+            h, w = crop.shape[:2]
+            rw   = min(width, int(np.ceil(self.HEIGHT * w / max(h, 1))))
+            x    = cv2.resize(crop, (max(rw, 1), self.HEIGHT)).astype(np.float32)
+            tensor[k, :, :, :x.shape[1]] = ((x / 255.0 - 0.5) / 0.5).transpose(2, 0, 1)
+        return tensor
+
+    def decode(self, probs: np.ndarray) -> List[Tuple[str, float]]:
+        """Greedy CTC: best class per step, repeats collapsed, blanks dropped."""
+        out = []
+        for seq in probs:
+            best  = seq.argmax(axis=1)
+            score = seq.max(axis=1)
+            keep  = best != 0
+            keep[1:] &= best[1:] != best[:-1]
+            chars = [self.characters[c] for c in best[keep] if c < len(self.characters)]
+            out.append(("".join(chars), float(score[keep].mean()) if keep.any() else 0.0))
+        return out
+
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+
+class OnnxOCRBackend:
+    """``predict`` with PaddleOCR's result shape on onnxruntime."""
+
+    def __init__(
+        self,
+        detector: DBDetector,
+        recognizer: CTCRecognizer,
+        textline: Optional[TextlineClassifier] = None,
+        use_textline_orientation: bool = True,
+    ):
+        self.detector   = detector
+        self.recognizer = recognizer
+        self.textline   = textline
+        self.use_textline_orientation = use_textline_orientation
+
+    @classmethod
+    def from_settings(
+        cls, settings: Dict[str, Any], model_dir: str, threads: int = 0, precision: str = "fp32"
+    ):
+        """Same settings dict as ``PaddleOCR(**settings)``; models from ``model_dir``."""
+        threads  = threads or settings.get("cpu_threads") or 0
+        batch    = settings.get("text_recognition_batch_size") or 6
+        det_name = settings.get("text_detection_model_name") or DEFAULT_DET_MODEL
+        rec_name = settings.get("text_recognition_model_name") or DEFAULT_REC_MODEL
+        use_tl   = settings.get("use_textline_orientation", True)
+        textline = None
+        if use_tl:
+            name     = settings.get("textline_orientation_model_name") or DEFAULT_TEXTLINE_MODEL
+            textline = TextlineClassifier(_model_path(model_dir, name), threads)
+        return cls(
+            DBDetector(_model_path(model_dir, det_name), threads,
+                       limit_side_len=settings.get("text_det_limit_side_len") or 64,
+                       limit_type=settings.get("text_det_limit_type") or "min"),
+            CTCRecognizer(_model_path(model_dir, rec_name, precision),
+                          load_character_dict(os.path.join(model_dir, rec_name)), threads,
+                          batch_size=batch),
+            textline,
+            use_tl,
+        )
+
+    def predict(self, input, use_textline_orientation: Optional[bool] = None, **kwargs):
+        if kwargs:
+            logger.debug("ONNX backend ignores predict options %s", sorted(kwargs))
+        use_tl = self.use_textline_orientation if use_textline_orientation is None \
+            else use_textline_orientation
+        images = input if isinstance(input, list) else [input]
+        return [self._predict_one(image, use_tl) for image in images]
+
+    def _predict_one(self, image: np.ndarray, use_tl: bool) -> Dict[str, Any]:
+        boxes = self.detector(image)
+        crops = [crop_box(image, box) for box in boxes]
+        if use_tl and self.textline is not None and crops:
+            crops = self.textline(crops)
+        recognised = self.recognizer(crops)
+        return {
+            "dt_polys":   boxes,
+            "rec_polys":  boxes,
+            "rec_texts":  [text for text, _ in recognised],
+            "rec_scores": [score for _, score in recognised],
+        }
+
+
+class OnnxRecognitionBackend:
+    """Recognition-only ``predict`` (``rec_text`` / ``rec_score`` per crop)."""
+
+    def __init__(self, recognizer: CTCRecognizer):
+        self.recognizer = recognizer
+
+    @classmethod
+    def from_settings(
+        cls, settings: Dict[str, Any], model_dir: str, threads: int = 0, precision: str = "fp32"
+    ):
+        name    = settings.get("model_name") or DEFAULT_REC_MODEL
+        threads = threads or settings.get("cpu_threads") or 0
+        return cls(CTCRecognizer(_model_path(model_dir, name, precision),
+                                 load_character_dict(os.path.join(model_dir, name)), threads))
+
+    def predict(self, input, **kwargs):
+        crops = input if isinstance(input, list) else [input]
+        return [{"rec_text": text, "rec_score": score} for text, score in self.recognizer(crops)]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "quantize":
+        print("usage: python onnx_backend.py quantize <model dir>")
+        sys.exit(1)
+    print(f"Wrote {quantize_int8(sys.argv[2])}")
@@ -0,0 +1,183 @@
+"""
+orientation.py
+--------------
+Card orientation (0 / 90 / 180 / 270°) from the ID photo's face.
+
+The search runs over a two-level pyramid of the grayscale image:
+
+  1. coarse (``coarse_side`` px, 320 by default): the likeliest rotation
+     first (0° for a landscape photo, 90° for a portrait one; 0° is also the
+     only one that needs no rotate).  A face whose cascade neighbour count
+     reaches ``confident_neighbors`` ends the search there;
+  2. otherwise the remaining rotations run concurrently (``detectMultiScale``
+     releases the GIL, each thread keeps its own cascade);
+  3. only when no rotation shows a face at the coarse level is the same
+     search repeated at ``fine_side`` (600 px, the former fixed size).
+
+The rotation with the strongest face (highest neighbour count) wins.  Its
+faces are re-detected at the fine level inside a window around each coarse
+box, so the returned boxes are as precise as a full fine pass.  Without any
+face, portrait photos are turned to landscape as before.
+
+The ``Orientation`` is computed once per request; every later stage (quick
+image, template KTP, smart SIM preprocessing) applies it instead of
+searching again.
+
+Usage
+-----
+    engine = OrientationEngine()
+    orientation = engine.detect(image)
+    oriented    = orientation.apply(image)
+    orientation.faces          # [(x, y, w, h), ...] in oriented pixels
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CASCADE_PATH = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+
+ROTATIONS = {
+    90:  cv2.ROTATE_90_CLOCKWISE,
+    180: cv2.ROTATE_180,
+    270: cv2.ROTATE_90_COUNTERCLOCKWISE,
+}
+
+Box = Tuple[float, float, float, float]
+
+
+def rotate_90(image: np.ndarray, angle: int) -> np.ndarray:
+    """Rotate clockwise by a multiple of 90°."""
+    return image if angle not in ROTATIONS else cv2.rotate(image, ROTATIONS[angle])
+
+
+@dataclass
+class Orientation:
+    angle: int = 0                                      # clockwise degrees to upright
+    faces: List[Box] = field(default_factory=list)      # oriented full-resolution (x, y, w, h)
+    path:  str = "none"                                 # early | search | fine | aspect | none
+
+    def apply(self, image: np.ndarray) -> np.ndarray:
+        return rotate_90(image, self.angle)
+
+
+@dataclass
+class _Hit:
+    angle:     int
+    faces:     np.ndarray
+    neighbors: np.ndarray
+
+    @property
+    def strength(self) -> int:
+        return int(self.neighbors.max()) if len(self.neighbors) else 0
+
+
+class OrientationEngine:
+    """Coarse-to-fine face search over the four right-angle rotations."""
+
+    def __init__(
+        self,
+        coarse_side: int = 320,
+        fine_side: int = 600,
+        confident_neighbors: Sequence[int] = (20, 40),
+        threads: int = 3,
+        cascade_path: str = CASCADE_PATH,
+    ):
+        self.coarse_side  = coarse_side
+        self.fine_side    = fine_side
+        # Per pyramid level: neighbour count that ends the search early
+        self.confident_neighbors = tuple(confident_neighbors)
+        self.cascade_path = cascade_path
+        self._local       = threading.local()
+        # Threads are created on first use, i.e. after any pre-fork.
+        self._pool = (
+            ThreadPoolExecutor(max_workers=threads, thread_name_prefix="orientation")
+            if threads > 1 else None
+        )
+
+    # ------------------------------------------------------------------
+    def _cascade(self) -> cv2.CascadeClassifier:
+        # CascadeClassifier is not safe to share between concurrent calls
+        cascade = getattr(self._local, "cascade", None)
+        if cascade is None:
+            cascade = self._local.cascade = cv2.CascadeClassifier(self.cascade_path)
+        return cascade
+
+    def _faces(self, gray: np.ndarray, min_size: int = 30) -> Tuple[np.ndarray, np.ndarray]:
+        faces, neighbors = self._cascade().detectMultiScale2(
+            gray, scaleFactor=1.1, minNeighbors=5, minSize=(min_size, min_size)
+        )
+        return np.asarray(faces).reshape(-1, 4), np.asarray(neighbors).reshape(-1)
+
+    def _hit(self, gray: np.ndarray, angle: int) -> _Hit:
+        faces, neighbors = self._faces(rotate_90(gray, angle))
+        return _Hit(angle, faces, neighbors)
+
+    def _map(self, fn, items):
+        if self._pool is None or len(items) < 2:
+            return [fn(item) for item in items]
+        return list(self._pool.map(fn, items))
+
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _angle_order(h: int, w: int) -> List[int]:
+        return [90, 270, 0, 180] if h > w else [0, 180, 90, 270]
+
+    def _search(self, gray: np.ndarray, order: List[int], confident: int) -> Tuple[Optional[_Hit], bool]:
+        """Strongest rotation at one pyramid level; ``True`` if it ended early."""
+        first = self._hit(gray, order[0])
+        if first.strength >= confident:
+            return first, True
+        hits = [first] + self._map(lambda angle: self._hit(gray, angle), order[1:])
+        best = max(hits, key=lambda hit: hit.strength)     # ties keep the likelier angle
+        return (best if best.strength else None), False
+
+    def _refine(self, fine: np.ndarray, coarse_faces: np.ndarray, ratio: float) -> List[Box]:
+        """Re-detect each coarse face at the fine level inside a window around it."""
+        h, w  = fine.shape[:2]
+        boxes = []
+        for face in coarse_faces:
+            x, y, fw, fh = (float(v) * ratio for v in face)
+            mx, my = fw * 0.5, fh * 0.5
+            x0, y0 = int(max(0, x - mx)), int(max(0, y - my))
+            x1, y1 = int(min(w, x + fw + mx)), int(min(h, y + fh + my))
+            faces, neighbors = self._faces(fine[y0:y1, x0:x1], min_size=max(30, int(fw * 0.6)))
+            if len(faces):
+                fx, fy, fw, fh = faces[int(np.argmax(neighbors))]
+                boxes.append((float(fx + x0), float(fy + y0), float(fw), float(fh)))
+            else:
+                boxes.append((x, y, fw, fh))
+        return boxes
+
+    # ------------------------------------------------------------------
+    def detect(self, image: np.ndarray) -> Orientation:
+        h, w = image.shape[:2]
+        fine_scale = self.fine_side / max(h, w)
+        fine_gray  = cv2.resize(image, None, fx=fine_scale, fy=fine_scale)
+        if fine_gray.ndim == 3:
+            fine_gray = cv2.cvtColor(fine_gray, cv2.COLOR_BGR2GRAY)
+        order = self._angle_order(h, w)
+
+        coarse_scale = self.coarse_side / max(h, w)
+        coarse_gray  = cv2.resize(fine_gray, None, fx=coarse_scale / fine_scale,
+                                  fy=coarse_scale / fine_scale, interpolation=cv2.INTER_AREA)
+        hit, early = self._search(coarse_gray, order, self.confident_neighbors[0])
+        if hit is not None:
+            boxes = self._refine(rotate_90(fine_gray, hit.angle), hit.faces, fine_scale / coarse_scale)
+            path  = "early" if early else "search"
+        else:
+            hit, _ = self._search(fine_gray, order, self.confident_neighbors[1])
+            if hit is None:
+                # Identity cards are landscape — rotate portrait images
+                return Orientation(90, [], "aspect") if h > w else Orientation(0, [], "none")
+            boxes = [tuple(float(v) for v in face) for face in hit.faces]
+            path  = "fine"
+
+        return Orientation(hit.angle, [tuple(v / fine_scale for v in box) for box in boxes], path)
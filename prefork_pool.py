@@ -0,0 +1,284 @@
+"""
+prefork_pool.py
+---------------
+Pre-fork multi-process serving for ``DocumentProcessor``.
+
+The parent process builds one ``DocumentProcessor`` (PaddleOCR weights,
+Haar cascades, fuzzy-match tables) and then forks N workers.  Every worker
+inherits the loaded models copy-on-write, so resident memory grows far less
+than N independent processes would, while Python post-processing runs on N
+GILs instead of one.
+
+The pool exposes the same ``process_array`` / ``process_image`` /
+``process_images`` methods as ``DocumentProcessor`` and dispatches each call
+to an idle worker, so callers can use either interchangeably.
+
+Notes
+-----
+* Workers must be forked before the parent starts any other thread
+  (job workers, archive writer, waitress); create the pool first.  For the
+  same reason a worker that dies is not re-forked (the child could inherit
+  locks held by those threads): its slot is retired and the pool reports
+  itself ``degraded`` until the service is restarted.
+* Paddle's inference threads are created lazily on the first prediction, so
+  warm-up inference runs inside every worker (``warm_up``), not in the parent.
+* ``RequestContext`` arguments (``ctx=`` / ``contexts=``) are filled in by
+  the worker and copied back into the caller's objects, so per-request
+  metrics work the same in both modes.
+"""
+
+import os
+import time
+import queue
+import signal
+import logging
+import threading
+import traceback
+import multiprocessing
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Keyword arguments the worker mutates and the parent copies back
+_CONTEXT_KWARGS = ("ctx", "contexts")
+
+
+# ---------------------------------------------------------------------------
+# Worker side
+# ---------------------------------------------------------------------------
+
+def _worker_main(processor, conn, parent_end) -> None:
+    """Serve ``(method, args, kwargs)`` calls from the parent until EOF."""
+    parent_end.close()
+    # Ctrl-C is handled by the parent, which tears the workers down.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    while True:
+        try:
+            method, args, kwargs = conn.recv()
+        except (EOFError, OSError):
+            break
+        try:
+            result = getattr(processor, method)(*args, **kwargs)
+            echoed = {k: kwargs[k] for k in _CONTEXT_KWARGS if kwargs.get(k) is not None}
+            conn.send((True, result, echoed))
+        except Exception as e:
+            traceback.print_exc()
+            conn.send((False, f"{type(e).__name__}: {e}", {}))
+
+
+# ---------------------------------------------------------------------------
+# Parent side
+# ---------------------------------------------------------------------------
+
+class _WorkerHandle:
+    def __init__(self, slot: int, process, conn):
+        self.slot       = slot
+        self.process    = process
+        self.conn       = conn
+        self.requests   = 0
+        self.busy_since = None        # monotonic start of the current call
+        self.busy_total = 0.0         # seconds spent serving calls
+
+
+class PreforkPool:
+    """
+    Fixed set of forked workers sharing one pre-loaded ``DocumentProcessor``.
+
+    Calls are thread-safe: each one blocks until a worker is idle, sends the
+    arguments over that worker's pipe and waits for the reply.
+    """
+
+    def __init__(self, processor, num_workers: int):
+        if num_workers < 1:
+            raise ValueError("PreforkPool needs at least one worker")
+
+        self.processor   = processor
+        self.num_workers = num_workers
+        self.retired     = 0
+        self.started_at  = time.monotonic()
+
+        self._ctx     = multiprocessing.get_context("fork")
+        self._lock    = threading.Lock()
+        self._idle: "queue.Queue[_WorkerHandle]" = queue.Queue()
+        self._workers: List[_WorkerHandle] = []
+
+        for slot in range(num_workers):
+            handle = self._spawn(slot)
+            self._workers.append(handle)
+            self._idle.put(handle)
+
+        logger.info(
+            "PreforkPool started %d worker(s) from parent pid %d", num_workers, os.getpid()
+        )
+
+    # ------------------------------------------------------------------
+    # DocumentProcessor-compatible API
+    # ------------------------------------------------------------------
+
+    def process_array(self, image, **kwargs) -> Dict[str, Any]:
+        return self._call("process_array", image, **kwargs)
+
+    def process_image(self, image_path: str, **kwargs) -> Dict[str, Any]:
+        return self._call("process_image", image_path, **kwargs)
+
+    def process_images(self, images, **kwargs) -> List[Dict[str, Any]]:
+        return self._call("process_images", images, **kwargs)
+
+    @property
+    def degraded(self) -> bool:
+        """True once any worker has died and its slot was retired."""
+        return self.retired > 0
+
+    def warm_up(self, image_paths: List[str]) -> Dict[str, Any]:
+        """
+        Warm every worker in parallel.  All workers are reserved until each
+        has finished, so no request lands on a cold one.
+        """
+        start   = time.monotonic()
+        workers = [self._reserve() for _ in range(len(self._workers))]
+        reports: List[Any] = [None] * len(workers)
+
+        def run(i, worker):
+            try:
+                reports[i] = self._dispatch(worker, "warm_up", (image_paths,), {})
+            except Exception as e:
+                reports[i] = e
+
+        threads = [threading.Thread(target=run, args=(i, w)) for i, w in enumerate(workers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        failed = [r for r in reports if isinstance(r, Exception)]
+        if failed:
+            raise failed[0]
+        return {
+            "seconds":    round(time.monotonic() - start, 3),
+            "images":     reports[0]["images"],
+            "per_worker": [r["seconds"] for r in reports],
+        }
+
+    # ------------------------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            busy       = 0
+            busy_total = 0.0
+            per_worker = []
+            for w in self._workers:
+                running = (now - w.busy_since) if w.busy_since is not None else 0.0
+                busy_total += w.busy_total + running
+                busy += w.busy_since is not None
+                per_worker.append({
+                    "slot":     w.slot,
+                    "pid":      w.process.pid,
+                    "alive":    w.process.is_alive(),
+                    "busy":     w.busy_since is not None,
+                    "requests": w.requests,
+                })
+
+            live = len(self._workers)
+
+        elapsed = max(now - self.started_at, 1e-9)
+        return {
+            "mode":        "prefork",
+            "workers":     live,
+            "busy":        busy,
+            "idle":        live - busy,
+            "utilisation": round(busy_total / (elapsed * self.num_workers), 4),
+            "retired":     self.retired,
+            "degraded":    self.degraded,
+            "per_worker":  per_worker,
+        }
+
+    def close(self) -> None:
+        for w in self._workers:
+            try:
+                w.conn.close()
+            except OSError:
+                pass
+        for w in self._workers:
+            w.process.join(timeout=5)
+            if w.process.is_alive():
+                w.process.terminate()
+
+    # ------------------------------------------------------------------
+    def _spawn(self, slot: int) -> _WorkerHandle:
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(self.processor, child_conn, parent_conn),
+            name=f"ocr-worker-{slot}",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        return _WorkerHandle(slot, process, parent_conn)
+
+    def _reserve(self) -> _WorkerHandle:
+        """Block until a worker is idle; RuntimeError once none are left."""
+        worker = self._idle.get()
+        if worker is None:
+            # Sentinel from the last retirement: pass it on to other waiters
+            self._idle.put(None)
+            raise RuntimeError("No OCR worker processes left")
+        return worker
+
+    def _call(self, method: str, *args, **kwargs):
+        return self._dispatch(self._reserve(), method, args, kwargs)
+
+    def _dispatch(self, worker: _WorkerHandle, method: str, args, kwargs):
+        """Run one call on an already-reserved worker and release it afterwards."""
+        with self._lock:
+            worker.busy_since = time.monotonic()
+        alive = True
+        try:
+            worker.conn.send((method, args, kwargs))
+            ok, payload, echoed = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            logger.error("Worker %d (pid %s) died: %s; retiring its slot.",
+                         worker.slot, worker.process.pid, e)
+            alive = False
+            raise RuntimeError(f"OCR worker process died: {e}") from e
+        finally:
+            with self._lock:
+                worker.busy_total += time.monotonic() - (worker.busy_since or time.monotonic())
+                worker.busy_since  = None
+                worker.requests   += 1
+            if alive:
+                self._idle.put(worker)
+            else:
+                self._retire(worker)
+
+        if not ok:
+            raise RuntimeError(payload)
+        self._copy_back(kwargs, echoed)
+        return payload
+
+    @staticmethod
+    def _copy_back(sent: Dict[str, Any], echoed: Dict[str, Any]) -> None:
+        """Update the caller's context objects with the worker's copies."""
+        if "ctx" in echoed:
+            sent["ctx"].__dict__.update(echoed["ctx"].__dict__)
+        if "contexts" in echoed:
+            for mine, theirs in zip(sent["contexts"], echoed["contexts"]):
+                mine.__dict__.update(theirs.__dict__)
+
+    def _retire(self, dead: _WorkerHandle) -> None:
+        try:
+            dead.conn.close()
+        except OSError:
+            pass
+        if dead.process.is_alive():
+            dead.process.terminate()
+        dead.process.join(timeout=5)
+
+        with self._lock:
+            self._workers.remove(dead)
+            self.retired += 1
+            remaining = len(self._workers)
+        logger.error("PreforkPool degraded: %d of %d worker(s) left.", remaining, self.num_workers)
+        if remaining == 0:
+            self._idle.put(None)
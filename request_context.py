@@ -0,0 +1,130 @@
+"""
+request_context.py
+------------------
+Per-request bookkeeping carried through the ``DocumentProcessor`` pipeline.
+
+A ``RequestContext`` is created by the caller (app.py, the job queue, the
+batch endpoint), handed to ``process_array`` / ``process_images`` and filled
+in by the pipeline: per-stage wall-clock timings, the number of OCR calls,
+the document type and SIM path taken, and the error class if any.  It is a
+plain picklable object so pre-fork workers can send it back to the parent;
+the per-request OCR memo and derived-image store stay behind in the worker.
+
+An optional ``deadline`` (``time.monotonic()`` seconds, shared by forked
+workers) lets optional stages check the remaining budget against the
+``StageCostModel`` estimates and record themselves in ``skipped_stages``
+when they would overrun.
+
+Usage
+-----
+    ctx = RequestContext(request_id="abc")
+    with ctx.stage("orientation"):
+        ...
+    ctx.timings        # {"orientation": 0.041, ...}
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class RequestContext:
+    request_id:  str = ""
+    timings:     Dict[str, float] = field(default_factory=dict)   # stage → seconds
+    ocr_calls:   int = 0
+    doc_type:    Optional[str] = None     # KTP | SIM | UNKNOWN
+    sim_path:    Optional[str] = None     # std | smart | smart_rejected | smart_failed | smart_skipped
+    cache:       Optional[str] = None     # exact | miss
+    classifier:  Optional[str] = None     # confident layout label | ambiguous
+    speculation: Optional[str] = None     # used | cancelled (speculative smart SIM work)
+    error_class: Optional[str] = None
+    deadline:    Optional[float] = None   # time.monotonic() by which the answer is due
+    skipped_stages: List[str] = field(default_factory=list)
+    ocr_calls_avoided: int = 0             # OCR inputs answered from the memo
+    ktp_path:    Optional[str] = None     # template | template_rejected | full
+    ocr_tier:    Optional[str] = None     # fast | heavy (tiered engines only)
+    ocr_conf:    Optional[float] = None   # mean OCR confidence of the returned extraction
+    completeness: Optional[float] = None  # 0..1 completeness of the returned extraction
+    upright:     bool = False             # rotation known: face found or client hint
+    textline_skipped:   int = 0           # OCR passes answered without the text-line classifier
+    textline_fallbacks: int = 0           # classifier-free passes re-run with it (poor conf)
+    orientation: Optional[Any] = None     # orientation.Orientation, decided once per request
+    decode_scale: Optional[int] = None    # upload decoded at 1/n (ingest.Ingestor): 1, 2, 4, 8
+    full_decode: bool = False             # smart SIM path decoded the upload at full size
+    face_boxes:  List[Any] = field(default_factory=list, repr=False)   # oriented (x, y, w, h)
+    ocr_memo:    Dict[str, Any] = field(default_factory=dict, repr=False)
+    artifacts:   Optional[Any] = field(default=None, repr=False)   # image_artifacts.ImageArtifacts
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["ocr_memo"]  = {}
+        state["artifacts"] = None
+        return state
+
+    def merge(self, other: "RequestContext") -> None:
+        """Fold work recorded on ``other`` (a background worker's private context) into this one."""
+        for name, seconds in other.timings.items():
+            self.add_time(name, seconds)
+        self.ocr_calls          += other.ocr_calls
+        self.ocr_calls_avoided  += other.ocr_calls_avoided
+        self.textline_skipped   += other.textline_skipped
+        self.textline_fallbacks += other.textline_fallbacks
+        self.full_decode         = self.full_decode or other.full_decode
+        self.ocr_memo.update(other.ocr_memo)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name: str, seconds: float) -> None:
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    # ------------------------------------------------------------------
+    def remaining(self) -> float:
+        """Seconds left before the deadline (infinite without one)."""
+        if self.deadline is None:
+            return float("inf")
+        return self.deadline - time.monotonic()
+
+    def can_afford(self, seconds: float) -> bool:
+        return self.remaining() >= seconds
+
+    def skip(self, stage: str) -> None:
+        if stage not in self.skipped_stages:
+            self.skipped_stages.append(stage)
+
+
+# ---------------------------------------------------------------------------
+# Stage cost estimates
+# ---------------------------------------------------------------------------
+
+class StageCostModel:
+    """EWMA of observed seconds per stage, used for deadline decisions."""
+
+    def __init__(self, defaults: Dict[str, float], alpha: float = 0.2):
+        self.alpha  = alpha
+        self._costs = dict(defaults)
+        self._lock  = threading.Lock()
+
+    def estimate(self, *stages: str) -> float:
+        """Expected seconds for running ``stages`` back to back."""
+        with self._lock:
+            return sum(self._costs.get(stage, 0.0) for stage in stages)
+
+    def observe(self, timings: Dict[str, float]) -> None:
+        """Fold a finished request's timings into the stages being tracked."""
+        with self._lock:
+            for stage, seconds in timings.items():
+                if stage in self._costs:
+                    self._costs[stage] += self.alpha * (seconds - self._costs[stage])
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {stage: round(cost, 3) for stage, cost in self._costs.items()}
@@ -0,0 +1,126 @@
+"""
+result_cache.py
+---------------
+Result cache for repeated submissions of the same card.
+
+Entries are keyed by a digest of the uploaded bytes, so only byte-identical
+resubmissions (double taps, network retries, re-uploads of the same file)
+are answered from the cache.  Similar-looking uploads are never matched:
+every KTP and SIM shares a printed template, and a perceptual hash cannot
+tell two people's cards apart reliably enough to serve one card's result
+for another.
+
+Entries expire after ``ttl`` seconds and the least recently used entry is
+evicted once ``max_entries`` is reached.
+
+Usage
+-----
+    cache = ResultCache(max_entries=512, ttl=300)
+    hit   = cache.get_exact(digest)
+    cache.put(digest, result)
+"""
+
+import copy
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------------
+# Hashing helpers
+# ---------------------------------------------------------------------------
+
+def content_digest(data: bytes) -> str:
+    """Exact-match key for encoded upload bytes."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def array_digest(image: np.ndarray) -> str:
+    """Exact-match key for a decoded array (used when no upload bytes exist)."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(image.shape).encode())
+    h.update(np.ascontiguousarray(image).data)
+    return h.hexdigest()
+
+
+def sampled_digest(image: np.ndarray, step: int = 4) -> str:
+    """
+    Cheap fingerprint of a decoded array: shape, dtype and every ``step``-th
+    pixel on a grid.  Meant for telling apart the handful of derived images
+    within one request, not as a cache key across requests.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{image.shape}{image.dtype}".encode())
+    h.update(np.ascontiguousarray(image[::step, ::step]).data)
+    return h.hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Cache
+# ---------------------------------------------------------------------------
+
+@dataclass
+class _Entry:
+    digest:     str
+    result:     Dict[str, Any]
+    expires_at: float
+
+
+class ResultCache:
+    """Thread-safe TTL + LRU cache of pipeline results, keyed by exact digest."""
+
+    def __init__(self, max_entries: int = 512, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl         = ttl
+
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock    = threading.Lock()
+        # Misses are counted per request (``ocr_result_cache_lookups_total``),
+        # since a request may look up the same digest in the server and in
+        # the processor.
+        self._counts  = {"exact_hits": 0, "evictions": 0, "expired": 0}
+
+    # ------------------------------------------------------------------
+    def get_exact(self, digest: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._live(digest)
+            if entry is None:
+                return None
+            self._entries.move_to_end(digest)
+            self._counts["exact_hits"] += 1
+            return copy.deepcopy(entry.result)
+
+    def put(self, digest: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries.pop(digest, None)
+            self._entries[digest] = _Entry(
+                digest, copy.deepcopy(result), time.monotonic() + self.ttl
+            )
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counts["evictions"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            out = dict(self._counts)
+            out["entries"] = len(self._entries)
+        return out
+
+    # ------------------------------------------------------------------
+    def _live(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < time.monotonic():
+            del self._entries[key]
+            self._counts["expired"] += 1
+            return None
+        return entry
@@ -0,0 +1,63 @@
+"""Batch heavy-tier escalation with a cache hit earlier in the chunk."""
+
+import numpy as np
+import pytest
+
+import document_processor
+from document_processor import DocumentProcessor
+from request_context import RequestContext
+from result_cache import ResultCache
+
+KTP_TEXTS = ["PROVINSI JAWA BARAT", "KARTU TANDA PENDUDUK", "NIK : 3201123456789001"]
+
+
+class FakeEngine:
+    """OCR engine whose confidence follows the image brightness (heavy tier: always high)."""
+
+    def __init__(self, role):
+        self.role  = role
+        self.calls = 0
+
+    def _result(self, image):
+        conf  = 0.95 if self.role == "ocr_heavy" or image.mean() > 127 else 0.40
+        polys = [np.array([[10, 10 + 40 * i], [300, 10 + 40 * i], [300, 40 + 40 * i], [10, 40 + 40 * i]])
+                 for i in range(len(KTP_TEXTS))]
+        return {"dt_polys": polys, "rec_texts": list(KTP_TEXTS), "rec_scores": [conf] * len(KTP_TEXTS)}
+
+    def predict(self, input, **kwargs):
+        images = input if isinstance(input, list) else [input]
+        self.calls += 1
+        return [self._result(image) for image in images]
+
+
+@pytest.fixture
+def processor(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    engines = {}
+
+    def create_backend(role, settings, **options):
+        engines[role] = FakeEngine(role)
+        return engines[role]
+
+    monkeypatch.setattr(document_processor, "create_backend", create_backend)
+    processor = DocumentProcessor(result_cache=ResultCache(), ocr_tiers=True, tier_min_completeness=0.0)
+    processor.engines = engines
+    return processor
+
+
+def _card(seed, low, high):
+    rng = np.random.default_rng(seed)
+    return rng.integers(low, high, size=(630, 1000, 3), dtype=np.uint8)
+
+
+def test_cache_hit_does_not_stop_escalation_of_later_items(processor):
+    clear, poor = _card(0, 150, 256), _card(1, 0, 100)
+    assert processor.process_images([clear])[0]["ocr_tier"] == "fast"
+
+    contexts = [RequestContext(), RequestContext()]
+    results  = processor.process_images([clear, poor], contexts=contexts)
+
+    assert contexts[0].cache == "exact"
+    assert contexts[1].ocr_tier == "heavy"
+    assert results[1]["ocr_tier"] == "heavy"
+    assert processor.engines["ocr_heavy"].calls > 0